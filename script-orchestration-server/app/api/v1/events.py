@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+import logging
+
+from app.services.event_engine import publish_event
+from app.schemas.script import EventPublish, MessageResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/", response_model=MessageResponse)
+async def publish(event: EventPublish):
+    """发布事件，由事件触发引擎合并后执行匹配的脚本"""
+    try:
+        message_id = await publish_event(event.type, event.data, event.source)
+        return MessageResponse(message="事件已发布", data={"message_id": message_id})
+    except Exception as e:
+        logger.error(f"发布事件失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"发布事件失败: {str(e)}")
@@ -1,15 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Header, Response, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.services.script_service import ScriptService
+from app.services.log_stream import log_broker, parse_event_id
+from app.services.execution_queue import execution_queue, QueueFullError
+from app.services.distributed_queue import distributed_queue
+from app.services.catalog_transfer import export_records, import_records
+from app.core.config import settings
+from app.utils.pagination import next_cursor
+from app.utils.compression import gzip_stream
+from app.utils.http_range import parse_range_header, accepts_gzip, RangeNotSatisfiable
 from app.schemas.script import (
     ScriptCreate, ScriptUpdate, ScriptResponse,
-    ScriptExecutionCreate, ScriptExecutionResponse,
+    ScriptExecutionCreate, ScriptExecutionResponse, ScriptExecutionSummary, ScriptBatchExecutionCreate, ScriptBatchResponse,
     ScriptTemplateCreate, ScriptTemplateUpdate, ScriptTemplateResponse,
-    MessageResponse, PaginatedResponse, ScriptStatistics,
+    MessageResponse, PaginatedResponse, ScriptStatistics, ExecutionQueueStats, ResultCacheStats,
+    CatalogImportResult, ScriptResourceUsage,
     ScriptStatus, ExecutionStatus
 )
 
@@ -18,10 +28,35 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # 依赖注入
-def get_script_service(db: Session = Depends(get_db)) -> ScriptService:
+def get_script_service(db: AsyncSession = Depends(get_db)) -> ScriptService:
     """获取脚本服务实例"""
     return ScriptService(db)
 
+# 分页辅助
+def build_page(
+    items: list,
+    total: Optional[int],
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    ranked: bool = False
+) -> dict:
+    """组装分页响应，游标分页时不计算页码，按相关度排序时不返回游标"""
+    return {
+        "items": items,
+        "total": total,
+        "page": None if cursor else (skip // limit) + 1,
+        "size": limit,
+        "pages": None if total is None else (total + limit - 1) // limit,
+        "next_cursor": None if ranked else next_cursor(items, limit),
+    }
+
+def set_next_cursor(response: Response, items: list, limit: int):
+    """通过响应头返回下一页游标"""
+    cursor = next_cursor(items, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
 # 脚本管理接口
 @router.post("/", response_model=ScriptResponse)
 async def create_script(
@@ -30,7 +65,7 @@ async def create_script(
 ):
     """创建脚本"""
     try:
-        script = script_service.create_script(script_data, created_by="system")
+        script = await script_service.create_script(script_data, created_by="system")
         return script
     except Exception as e:
         logger.error(f"创建脚本失败: {str(e)}")
@@ -43,47 +78,75 @@ async def get_scripts(
     status: Optional[ScriptStatus] = None,
     category: Optional[str] = None,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
     script_service: ScriptService = Depends(get_script_service)
 ):
-    """获取脚本列表"""
+    """获取脚本列表
+
+    传入上一页返回的 next_cursor 按游标分页（忽略skip）；
+    search 检索名称、描述和分类，结果按相关度排序并使用skip分页；
+    count 指定总数统计方式: exact / estimated / none。
+    """
     try:
-        scripts = script_service.get_scripts(
+        scripts = await script_service.get_scripts(
             skip=skip, 
             limit=limit, 
             status=status, 
             category=category, 
-            search=search
+            search=search,
+            cursor=cursor
         )
         
         # 获取总数
-        total = script_service.get_scripts_count(
+        total = await script_service.get_scripts_count(
             status=status,
             category=category,
-            search=search
+            search=search,
+            count_mode=count
         )
         
-        # 计算分页信息
-        page = (skip // limit) + 1
-        pages = (total + limit - 1) // limit
-        
-        return PaginatedResponse[ScriptResponse](
-            items=scripts,
-            total=total,
-            page=page,
-            size=limit,
-            pages=pages
-        )
+        return build_page(scripts, total, skip, limit, cursor, ranked=bool(search))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取脚本列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取脚本列表失败")
 
+# 导入导出接口（NDJSON，需在 /{script_id} 之前注册）
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+@router.get("/export")
+async def export_scripts(
+    status: Optional[ScriptStatus] = None,
+    category: Optional[str] = None
+):
+    """流式导出脚本（NDJSON，每行一个脚本）"""
+    return StreamingResponse(
+        export_records("scripts", {"status": status, "category": category}),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": "attachment; filename=scripts.ndjson"}
+    )
+
+@router.post("/import", response_model=CatalogImportResult)
+async def import_scripts(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """流式导入脚本（NDJSON），按 (name, version) 新建或更新，返回逐行错误"""
+    try:
+        return await import_records(db, "scripts", request.stream(), created_by="import")
+    except Exception as e:
+        logger.error(f"导入脚本失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{script_id}", response_model=ScriptResponse)
 async def get_script(
     script_id: int,
     script_service: ScriptService = Depends(get_script_service)
 ):
     """获取脚本详情"""
-    script = script_service.get_script(script_id)
+    script = await script_service.get_script(script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
     return script
@@ -96,7 +159,7 @@ async def update_script(
 ):
     """更新脚本"""
     try:
-        script = script_service.update_script(script_id, script_data)
+        script = await script_service.update_script(script_id, script_data)
         if not script:
             raise HTTPException(status_code=404, detail="脚本不存在")
         return script
@@ -104,6 +167,44 @@ async def update_script(
         logger.error(f"更新脚本失败: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# 结果缓存接口（需在 /{script_id} 之前注册）
+@router.get("/cache/stats", response_model=ResultCacheStats)
+async def get_result_cache_stats(
+    script_id: Optional[int] = Query(None),
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """获取结果缓存统计"""
+    try:
+        return await script_service.get_result_cache_stats(script_id)
+    except Exception as e:
+        logger.error(f"获取结果缓存统计失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="获取结果缓存统计失败")
+
+@router.delete("/cache", response_model=MessageResponse)
+async def clear_result_cache(
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """清空全部结果缓存"""
+    try:
+        removed = await script_service.clear_result_cache()
+        return MessageResponse(message="结果缓存已清空", data={"removed": removed})
+    except Exception as e:
+        logger.error(f"清空结果缓存失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="清空结果缓存失败")
+
+@router.delete("/{script_id}/cache", response_model=MessageResponse)
+async def clear_script_result_cache(
+    script_id: int,
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """清除脚本的结果缓存"""
+    try:
+        removed = await script_service.clear_result_cache(script_id)
+        return MessageResponse(message="脚本结果缓存已清除", data={"removed": removed})
+    except Exception as e:
+        logger.error(f"清除脚本结果缓存失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="清除脚本结果缓存失败")
+
 @router.delete("/{script_id}", response_model=MessageResponse)
 async def delete_script(
     script_id: int,
@@ -111,7 +212,7 @@ async def delete_script(
 ):
     """删除脚本"""
     try:
-        success = script_service.delete_script(script_id)
+        success = await script_service.delete_script(script_id)
         if not success:
             raise HTTPException(status_code=404, detail="脚本不存在")
         return MessageResponse(message="脚本删除成功")
@@ -136,52 +237,102 @@ async def execute_script(
             input_parameters=execution_data.get("input_parameters", {}),
             environment_vars=execution_data.get("environment_vars", {}),
             triggered_by=execution_data.get("triggered_by", "api"),
-            trigger_source="api"
+            trigger_source="api",
+            priority=execution_data.get("priority"),
+            use_cache=execution_data.get("use_cache", True)
         )
         
         execution = await script_service.execute_script(exec_request, triggered_by="api")
         return execution
+    except QueueFullError as e:
+        logger.warning(f"执行队列已满，拒绝执行: {script_id}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"执行脚本失败: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/{script_id}/executions", response_model=List[ScriptExecutionResponse])
+@router.post("/{script_id}/batch", response_model=ScriptBatchResponse)
+async def execute_script_batch(
+    script_id: int,
+    batch_data: ScriptBatchExecutionCreate,
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """批量执行脚本（每组 input_parameters 生成一个执行），返回批次进度"""
+    try:
+        return await script_service.execute_batch(script_id, batch_data, triggered_by="api")
+    except Exception as e:
+        logger.error(f"批量执行脚本失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{script_id}/executions", response_model=List[ScriptExecutionSummary])
 async def get_script_executions(
     script_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[ExecutionStatus] = None,
+    cursor: Optional[str] = None,
+    response: Response = None,
     script_service: ScriptService = Depends(get_script_service)
 ):
-    """获取脚本执行记录"""
+    """获取脚本执行记录摘要（不含输出），下一页游标通过 X-Next-Cursor 响应头返回"""
     try:
-        executions = script_service.get_executions(
+        executions = await script_service.get_executions(
             script_id=script_id,
             status=status,
             skip=skip,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
+        set_next_cursor(response, executions, limit)
         return executions
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取执行记录失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取执行记录失败")
 
 # 执行管理接口
-@router.get("/executions/", response_model=List[ScriptExecutionResponse])
+@router.get("/queue/stats", response_model=ExecutionQueueStats)
+async def get_queue_stats():
+    """获取执行队列统计（排队深度、运行数、等待时间）"""
+    stats = execution_queue.stats()
+    if settings.EXECUTION_MODE == "distributed":
+        try:
+            stats["distributed"] = await distributed_queue.stats()
+        except Exception as e:
+            logger.error(f"获取分布式队列统计失败: {str(e)}")
+            raise HTTPException(status_code=503, detail="获取分布式队列统计失败")
+    return stats
+
+@router.get("/executions/", response_model=List[ScriptExecutionSummary])
 async def get_all_executions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[ExecutionStatus] = None,
+    cursor: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    retry_of: Optional[str] = None,
+    response: Response = None,
     script_service: ScriptService = Depends(get_script_service)
 ):
-    """获取所有执行记录"""
+    """获取所有执行记录摘要（不含输出），下一页游标通过 X-Next-Cursor 响应头返回；retry_of 查询某次执行的所有重试"""
     try:
-        executions = script_service.get_executions(
+        executions = await script_service.get_executions(
             status=status,
             skip=skip,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            batch_id=batch_id,
+            retry_of=retry_of
         )
+        set_next_cursor(response, executions, limit)
         return executions
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取执行记录失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取执行记录失败")
@@ -192,11 +343,104 @@ async def get_execution(
     script_service: ScriptService = Depends(get_script_service)
 ):
     """获取执行记录详情"""
-    execution = script_service.get_execution(execution_id)
+    execution = await script_service.get_execution(execution_id)
     if not execution:
         raise HTTPException(status_code=404, detail="执行记录不存在")
     return execution
 
+@router.get("/executions/{execution_id}/stream")
+async def stream_execution_output(
+    execution_id: str,
+    stdout_offset: int = Query(0, ge=0),
+    stderr_offset: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None)
+):
+    """实时推送执行输出(SSE)，支持从字节偏移续传，以status事件结束"""
+    # 推送期间不占用请求级数据库会话
+    async with SessionLocal() as db:
+        execution = await ScriptService(db).get_execution(execution_id, with_output=False)
+        if not execution:
+            raise HTTPException(status_code=404, detail="执行记录不存在")
+        final_status = ScriptService.get_execution_status_event(execution)
+    
+    offsets = {"stdout": stdout_offset, "stderr": stderr_offset}
+    if last_event_id:
+        try:
+            offsets = parse_event_id(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的Last-Event-ID")
+    
+    async def load_status():
+        async with SessionLocal() as db:
+            current = await ScriptService(db).get_execution(execution_id, with_output=False)
+            return ScriptService.get_execution_status_event(current) if current else None
+    
+    return StreamingResponse(
+        log_broker.stream(execution_id, offsets, load_status, final_status),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/executions/{execution_id}/output")
+async def get_execution_output(
+    execution_id: str,
+    stream: str = Query("stdout", pattern="^(stdout|stderr)$"),
+    offset: int = Query(0, ge=0, description="起始字节偏移"),
+    length: Optional[int] = Query(None, ge=1, description="读取字节数，默认到末尾"),
+    head: Optional[int] = Query(None, ge=1, description="只返回前N行"),
+    tail: Optional[int] = Query(None, ge=1, description="只返回最后N行"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    按字节范围或行读取执行输出（text/plain），从存储分块读取，不加载完整输出。
+    支持 Range 请求头(206)、offset/length、head/tail 行数；非 Range 请求在客户端接受时gzip压缩。
+    """
+    if head is not None and tail is not None:
+        raise HTTPException(status_code=400, detail="head和tail不能同时指定")
+    
+    async with SessionLocal() as db:
+        reader = await ScriptService(db).get_output_reader(execution_id, stream)
+    if reader is None:
+        raise HTTPException(status_code=404, detail="执行记录不存在")
+    
+    size = reader.size
+    headers = {"Accept-Ranges": "bytes", "X-Output-Size": str(size), "Cache-Control": "no-cache"}
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="请求范围无效", headers={"Content-Range": f"bytes */{size}"})
+    
+    status_code = 200
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    elif tail is not None:
+        start, end = await reader.tail_offset(tail), size
+    elif head is not None:
+        start, end = 0, await reader.head_end(head)
+    else:
+        start = min(offset, size)
+        end = size if length is None else min(size, start + length)
+    headers["X-Output-Offset"] = str(start)
+    
+    content = reader.iter_range(start, end)
+    # 范围响应的Content-Range针对原始内容，不压缩
+    if status_code == 200 and accepts_gzip(accept_encoding):
+        content = gzip_stream(content)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    else:
+        headers["Content-Length"] = str(end - start)
+    
+    return StreamingResponse(
+        content,
+        status_code=status_code,
+        media_type="text/plain; charset=utf-8",
+        headers=headers
+    )
+
 @router.post("/executions/{execution_id}/cancel", response_model=MessageResponse)
 async def cancel_execution(
     execution_id: str,
@@ -204,7 +448,7 @@ async def cancel_execution(
 ):
     """取消脚本执行"""
     try:
-        success = script_service.cancel_execution(execution_id)
+        success = await script_service.cancel_execution(execution_id)
         if not success:
             raise HTTPException(status_code=404, detail="执行记录不存在或无法取消")
         return MessageResponse(message="执行已取消")
@@ -212,6 +456,35 @@ async def cancel_execution(
         logger.error(f"取消执行失败: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# 批量执行接口
+@router.get("/batches/{batch_id}", response_model=ScriptBatchResponse)
+async def get_batch(
+    batch_id: str,
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """获取批量执行进度（执行明细通过 /executions/?batch_id= 查询）"""
+    batch = await script_service.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="批次不存在")
+    return batch
+
+@router.post("/batches/{batch_id}/cancel", response_model=MessageResponse)
+async def cancel_batch(
+    batch_id: str,
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """取消批量执行中所有未结束的执行"""
+    try:
+        success = await script_service.cancel_batch(batch_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="批次不存在或没有可取消的执行")
+        return MessageResponse(message="批量执行已取消")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"取消批量执行失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 # 脚本模板接口
 @router.post("/templates/", response_model=ScriptTemplateResponse)
 async def create_template(
@@ -220,12 +493,33 @@ async def create_template(
 ):
     """创建脚本模板"""
     try:
-        template = script_service.create_template(template_data, created_by="system")
+        template = await script_service.create_template(template_data, created_by="system")
         return template
     except Exception as e:
         logger.error(f"创建脚本模板失败: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/templates/export")
+async def export_templates(category: Optional[str] = None):
+    """流式导出脚本模板（NDJSON，每行一个模板）"""
+    return StreamingResponse(
+        export_records("templates", {"category": category}),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": "attachment; filename=templates.ndjson"}
+    )
+
+@router.post("/templates/import", response_model=CatalogImportResult)
+async def import_templates(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """流式导入脚本模板（NDJSON），按 name 新建或更新，返回逐行错误"""
+    try:
+        return await import_records(db, "templates", request.stream(), created_by="import")
+    except Exception as e:
+        logger.error(f"导入模板失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/templates/", response_model=PaginatedResponse[ScriptTemplateResponse])
 async def get_templates(
     skip: int = Query(0, ge=0),
@@ -233,36 +527,32 @@ async def get_templates(
     category: Optional[str] = None,
     is_public: bool = True,
     search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
     script_service: ScriptService = Depends(get_script_service)
 ):
-    """获取脚本模板列表"""
+    """获取脚本模板列表（分页参数同脚本列表）"""
     try:
-        templates = script_service.get_templates(
+        templates = await script_service.get_templates(
             skip=skip,
             limit=limit,
             category=category,
             is_public=is_public,
-            search=search
+            search=search,
+            cursor=cursor
         )
         
         # 获取总数
-        total = script_service.get_templates_count(
+        total = await script_service.get_templates_count(
             category=category,
             is_public=is_public,
-            search=search
+            search=search,
+            count_mode=count
         )
         
-        # 计算分页信息
-        pages = (total + limit - 1) // limit if limit > 0 else 1
-        current_page = (skip // limit) + 1 if limit > 0 else 1
-        
-        return PaginatedResponse[ScriptTemplateResponse](
-            items=templates,
-            total=total,
-            page=current_page,
-            size=limit,
-            pages=pages
-        )
+        return build_page(templates, total, skip, limit, cursor, ranked=bool(search))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取脚本模板失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取脚本模板失败")
@@ -270,16 +560,32 @@ async def get_templates(
 # 统计接口
 @router.get("/statistics/overview")
 async def get_statistics(
+    window: Optional[str] = Query(None, pattern="^(1h|24h|7d)$"),
+    script_id: Optional[int] = None,
     script_service: ScriptService = Depends(get_script_service)
 ):
-    """获取脚本统计信息"""
+    """获取脚本统计信息，可按时间窗口(1h/24h/7d)和脚本筛选"""
     try:
-        stats = script_service.get_statistics()
+        stats = await script_service.get_statistics(window=window, script_id=script_id)
         return stats
     except Exception as e:
         logger.error(f"获取统计信息失败: {str(e)}")
         raise HTTPException(status_code=500, detail="获取统计信息失败")
 
+@router.get("/statistics/resources", response_model=List[ScriptResourceUsage])
+async def get_resource_ranking(
+    window: Optional[str] = Query(None, pattern="^(1h|24h|7d)$"),
+    order_by: str = Query("cpu", pattern="^(cpu|rss|io|executions)$"),
+    limit: int = Query(10, ge=1, le=100),
+    script_service: ScriptService = Depends(get_script_service)
+):
+    """按CPU时间/内存峰值/块I/O/执行次数排序的脚本资源使用排行"""
+    try:
+        return await script_service.get_resource_ranking(window=window, order_by=order_by, limit=limit)
+    except Exception as e:
+        logger.error(f"获取资源使用排行失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="获取资源使用排行失败")
+
 # 健康检查接口
 @router.get("/health")
 async def health_check():
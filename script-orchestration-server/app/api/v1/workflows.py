@@ -0,0 +1,151 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import logging
+
+from app.core.database import get_db
+from app.services.workflow_service import WorkflowService, WorkflowValidationError
+from app.schemas.script import (
+    WorkflowNodeCreate, WorkflowNodeResponse,
+    WorkflowEdgeCreate, WorkflowEdgeResponse,
+    WorkflowDefinition, WorkflowRunCreate, WorkflowRunResponse,
+    MessageResponse, ExecutionStatus
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 依赖注入
+def get_workflow_service(db: AsyncSession = Depends(get_db)) -> WorkflowService:
+    """获取工作流服务实例"""
+    return WorkflowService(db)
+
+# 工作流定义接口
+@router.post("/nodes", response_model=WorkflowNodeResponse)
+async def create_node(
+    node_data: WorkflowNodeCreate,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """创建工作流节点"""
+    try:
+        return await workflow_service.create_node(node_data)
+    except Exception as e:
+        logger.error(f"创建工作流节点失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/nodes/{node_id}", response_model=MessageResponse)
+async def delete_node(
+    node_id: int,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """删除工作流节点（同时删除相关连接）"""
+    try:
+        success = await workflow_service.delete_node(node_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="节点不存在")
+        return MessageResponse(message="节点删除成功")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"删除工作流节点失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="删除工作流节点失败")
+
+@router.post("/edges", response_model=WorkflowEdgeResponse)
+async def create_edge(
+    edge_data: WorkflowEdgeCreate,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """创建工作流连接"""
+    try:
+        return await workflow_service.create_edge(edge_data)
+    except Exception as e:
+        logger.error(f"创建工作流连接失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/edges/{edge_id}", response_model=MessageResponse)
+async def delete_edge(
+    edge_id: int,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """删除工作流连接"""
+    try:
+        success = await workflow_service.delete_edge(edge_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="连接不存在")
+        return MessageResponse(message="连接删除成功")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"删除工作流连接失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="删除工作流连接失败")
+
+# 工作流运行接口
+@router.get("/runs/{run_id}", response_model=WorkflowRunResponse)
+async def get_run(
+    run_id: str,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """获取工作流运行详情（含各节点状态）"""
+    run = await workflow_service.get_run(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="运行记录不存在")
+    return run
+
+@router.post("/runs/{run_id}/cancel", response_model=MessageResponse)
+async def cancel_run(
+    run_id: str,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """取消工作流运行"""
+    try:
+        success = await workflow_service.cancel_run(run_id)
+        if not success:
+            raise HTTPException(status_code=404, detail="运行记录不存在或无法取消")
+        return MessageResponse(message="工作流运行已取消")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"取消工作流运行失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{workflow_id}", response_model=WorkflowDefinition)
+async def get_workflow(
+    workflow_id: str,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """获取工作流定义（节点和连接）"""
+    workflow = await workflow_service.get_workflow(workflow_id)
+    if not workflow:
+        raise HTTPException(status_code=404, detail="工作流不存在")
+    return workflow
+
+@router.post("/{workflow_id}/runs", response_model=WorkflowRunResponse)
+async def start_workflow(
+    workflow_id: str,
+    run_data: WorkflowRunCreate = WorkflowRunCreate(),
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """启动工作流运行"""
+    try:
+        return await workflow_service.start_workflow(workflow_id, run_data, triggered_by="api")
+    except WorkflowValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"启动工作流失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{workflow_id}/runs", response_model=List[WorkflowRunResponse])
+async def get_runs(
+    workflow_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[ExecutionStatus] = None,
+    workflow_service: WorkflowService = Depends(get_workflow_service)
+):
+    """获取工作流运行记录"""
+    try:
+        return await workflow_service.get_runs(workflow_id, status=status, skip=skip, limit=limit)
+    except Exception as e:
+        logger.error(f"获取工作流运行记录失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="获取工作流运行记录失败")
@@ -35,7 +35,115 @@ class Settings(BaseSettings):
     # 脚本执行配置
     SCRIPT_TIMEOUT: int = int(os.getenv("SCRIPT_TIMEOUT", "300"))  # 5分钟
     MAX_CONCURRENT_SCRIPTS: int = int(os.getenv("MAX_CONCURRENT_SCRIPTS", "10"))
+    EXECUTION_QUEUE_MAX_DEPTH: int = int(os.getenv("EXECUTION_QUEUE_MAX_DEPTH", "1000"))
+    
+    # 执行模式: local(API进程内执行) / distributed(写入Redis Stream，由worker.py工作进程执行)
+    EXECUTION_MODE: str = os.getenv("EXECUTION_MODE", "local")
+    EXECUTION_STREAM: str = os.getenv("EXECUTION_STREAM", "vss:executions:queue")
+    EXECUTION_CONSUMER_GROUP: str = os.getenv("EXECUTION_CONSUMER_GROUP", "vss-workers")
+    # 分布式模式按执行优先级分流的阈值（逗号分隔）：优先级不低于阈值的执行写入 <EXECUTION_STREAM>:p<阈值>，
+    # 工作进程先拉取高优先级的Stream
+    EXECUTION_STREAM_PRIORITY_LEVELS: str = os.getenv("EXECUTION_STREAM_PRIORITY_LEVELS", "10,50")
+    # 工作进程心跳超过该秒数未续期的执行会被其他工作进程认领；超过最大投递次数后标记为失败
+    WORKER_VISIBILITY_TIMEOUT: int = int(os.getenv("WORKER_VISIBILITY_TIMEOUT", "60"))
+    WORKER_MAX_DELIVERIES: int = int(os.getenv("WORKER_MAX_DELIVERIES", "3"))
+    WORKER_SHUTDOWN_TIMEOUT: int = int(os.getenv("WORKER_SHUTDOWN_TIMEOUT", "30"))
+    
+    # 工作流节点等待执行结束时查询执行状态的间隔(秒)
+    WORKFLOW_POLL_INTERVAL: float = float(os.getenv("WORKFLOW_POLL_INTERVAL", "1.0"))
+    # 工作流运行引擎心跳超过该秒数未更新时，运行被标记为失败（引擎所在进程已退出）
+    WORKFLOW_HEARTBEAT_TIMEOUT: int = int(os.getenv("WORKFLOW_HEARTBEAT_TIMEOUT", "60"))
+    
+    # 批量执行: 单批最多参数组数、每批默认同时执行数、补充执行的检查间隔(秒)、提交主节点锁有效期(秒)
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "5"))
+    BATCH_POLL_INTERVAL: float = float(os.getenv("BATCH_POLL_INTERVAL", "1.0"))
+    BATCH_LEADER_TTL: int = int(os.getenv("BATCH_LEADER_TTL", "15"))
+    
+    # 失败重试: 退避上限(秒)、抖动比例、每个脚本在窗口(秒)内最多创建的重试数、到期重试的兜底检查间隔(秒)
+    RETRY_MAX_DELAY: int = int(os.getenv("RETRY_MAX_DELAY", "3600"))
+    RETRY_JITTER: float = float(os.getenv("RETRY_JITTER", "0.2"))
+    RETRY_BUDGET: int = int(os.getenv("RETRY_BUDGET", "20"))
+    RETRY_BUDGET_WINDOW: int = int(os.getenv("RETRY_BUDGET_WINDOW", "600"))
+    RETRY_POLL_INTERVAL: float = float(os.getenv("RETRY_POLL_INTERVAL", "30"))
+    
+    # 定时(cron)触发引擎: 是否启用、默认时区、主节点锁有效期(秒)、脚本变更同步间隔(秒)、
+    # 错过触发的宽限时间(秒)、一次补触发的最多次数、每个事务最多创建的执行数
+    CRON_ENABLED: bool = os.getenv("CRON_ENABLED", "true").lower() == "true"
+    CRON_TIMEZONE: str = os.getenv("CRON_TIMEZONE", "Asia/Shanghai")
+    CRON_LEADER_TTL: int = int(os.getenv("CRON_LEADER_TTL", "15"))
+    CRON_SYNC_INTERVAL: float = float(os.getenv("CRON_SYNC_INTERVAL", "30"))
+    CRON_MISFIRE_GRACE: int = int(os.getenv("CRON_MISFIRE_GRACE", "60"))
+    CRON_MISFIRE_MAX_RUNS: int = int(os.getenv("CRON_MISFIRE_MAX_RUNS", "10"))
+    CRON_FIRE_BATCH_SIZE: int = int(os.getenv("CRON_FIRE_BATCH_SIZE", "500"))
+    
+    # 事件触发引擎: 是否启用、事件流、消费者组、事件流最大长度(发布时近似裁剪)、每次读取的事件数、
+    # 主节点锁有效期(秒)、脚本变更同步间隔(秒)，以及脚本未配置时的防抖时间(秒)、最长合并等待(秒)、每批最多事件数
+    EVENT_TRIGGERS_ENABLED: bool = os.getenv("EVENT_TRIGGERS_ENABLED", "true").lower() == "true"
+    EVENT_STREAM: str = os.getenv("EVENT_STREAM", "vss:events")
+    EVENT_CONSUMER_GROUP: str = os.getenv("EVENT_CONSUMER_GROUP", "vss-event-triggers")
+    EVENT_STREAM_MAXLEN: int = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+    EVENT_READ_COUNT: int = int(os.getenv("EVENT_READ_COUNT", "500"))
+    EVENT_LEADER_TTL: int = int(os.getenv("EVENT_LEADER_TTL", "15"))
+    EVENT_SYNC_INTERVAL: float = float(os.getenv("EVENT_SYNC_INTERVAL", "30"))
+    EVENT_DEBOUNCE: float = float(os.getenv("EVENT_DEBOUNCE", "5"))
+    EVENT_MAX_WAIT: float = float(os.getenv("EVENT_MAX_WAIT", "60"))
+    EVENT_MAX_BATCH: int = int(os.getenv("EVENT_MAX_BATCH", "1000"))
+    
+    # 脚本/模板NDJSON导入导出每批读写的记录数
+    CATALOG_TRANSFER_BATCH_SIZE: int = int(os.getenv("CATALOG_TRANSFER_BATCH_SIZE", "500"))
+    
+    # 指标: 事件循环延迟采样间隔(秒，0 表示不采样)；工作进程指标HTTP端口(0 表示不启动)
+    METRICS_LOOP_LAG_INTERVAL: float = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    
     SCRIPT_STORAGE_PATH: str = os.getenv("SCRIPT_STORAGE_PATH", "/app/scripts")
+    SCRIPT_CACHE_MAX_AGE_DAYS: int = int(os.getenv("SCRIPT_CACHE_MAX_AGE_DAYS", "7"))
+    
+    # 执行记录保留天数，超过后按脚本和天压缩归档到 SCRIPT_STORAGE_PATH/archive（0 表示不归档）
+    # 优先级: Script.config.retention_days > 分类保留天数(如 "ai=7,ops=30") > 默认值
+    EXECUTION_RETENTION_DAYS: int = int(os.getenv("EXECUTION_RETENTION_DAYS", "0"))
+    EXECUTION_RETENTION_BY_CATEGORY: str = os.getenv("EXECUTION_RETENTION_BY_CATEGORY", "")
+    
+    # 脚本结果缓存（Script.config.cache_ttl > 0 的脚本）最多保留的条目数，由每小时的清理任务淘汰超出部分
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+    
+    # 脚本/模板检索是否索引脚本内容（默认只索引名称、描述和分类）
+    SEARCH_INCLUDE_CONTENT: bool = os.getenv("SEARCH_INCLUDE_CONTENT", "false").lower() == "true"
+    
+    # 输出采集配置：每个输出流在内存中最多保留的字节数（保留开头和结尾），以及落盘分块大小/间隔
+    SCRIPT_OUTPUT_MEMORY_LIMIT: int = int(os.getenv("SCRIPT_OUTPUT_MEMORY_LIMIT", str(256 * 1024)))
+    SCRIPT_OUTPUT_FLUSH_BYTES: int = int(os.getenv("SCRIPT_OUTPUT_FLUSH_BYTES", str(64 * 1024)))
+    SCRIPT_OUTPUT_FLUSH_INTERVAL: float = float(os.getenv("SCRIPT_OUTPUT_FLUSH_INTERVAL", "1.0"))
+    
+    # 执行输出实时推送：有观看者的执行在内存中保留的最近输出字节数，以及是否通过Redis跨副本分发
+    LOG_STREAM_BUFFER_BYTES: int = int(os.getenv("LOG_STREAM_BUFFER_BYTES", str(1024 * 1024)))
+    LOG_STREAM_REDIS_ENABLED: bool = os.getenv("LOG_STREAM_REDIS_ENABLED", "true").lower() == "true"
+    
+    # 执行取消：SIGTERM后等待进程组退出的时间(秒)，超时后SIGKILL；是否通过Redis把取消转发给其他副本/工作进程
+    EXECUTION_CANCEL_GRACE_SECONDS: float = float(os.getenv("EXECUTION_CANCEL_GRACE_SECONDS", "10"))
+    EXECUTION_CONTROL_REDIS_ENABLED: bool = os.getenv("EXECUTION_CONTROL_REDIS_ENABLED", "true").lower() == "true"
+    
+    # 执行后端配置: subprocess(每次启动新解释器) / forkserver(预加载zygote进程fork)
+    SCRIPT_EXECUTION_BACKEND: str = os.getenv("SCRIPT_EXECUTION_BACKEND", "subprocess")
+    FORKSERVER_PRELOAD_MODULES: str = os.getenv(
+        "FORKSERVER_PRELOAD_MODULES",
+        "os,sys,json,re,time,datetime,logging,platform,requests,psutil"
+    )
+    
+    # 脚本进程资源档案: 自定义档案(JSON，与内置 default/background/restricted 合并)，
+    # 以及按执行优先级选择档案（格式 "-100=background,10=interactive"，优先级不低于阈值时使用）
+    RESOURCE_PROFILES: str = os.getenv("RESOURCE_PROFILES", "")
+    RESOURCE_PROFILE_BY_PRIORITY: str = os.getenv("RESOURCE_PROFILE_BY_PRIORITY", "")
+    
+    # 函数式脚本常驻进程池配置（Script.config.execution_mode = "function"）
+    FUNCTION_POOL_SIZE: int = int(os.getenv("FUNCTION_POOL_SIZE", "2"))
+    FUNCTION_WORKER_MAX_RUNS: int = int(os.getenv("FUNCTION_WORKER_MAX_RUNS", "1000"))
+    FUNCTION_WORKER_MAX_MEMORY_MB: int = int(os.getenv("FUNCTION_WORKER_MAX_MEMORY_MB", "256"))
+    # 工作进程空闲超过该秒数后关闭（0 表示不回收）
+    FUNCTION_WORKER_IDLE_TIMEOUT: int = int(os.getenv("FUNCTION_WORKER_IDLE_TIMEOUT", "300"))
+    # 所有函数式脚本的常驻工作进程总数上限
+    FUNCTION_WORKERS_MAX_TOTAL: int = int(os.getenv("FUNCTION_WORKERS_MAX_TOTAL", "16"))
     
     # 外部服务配置 - 从环境变量获取
     BACKEND_SERVICE_URL: str = os.getenv("BACKEND_SERVICE_URL", "http://backend:3002")
@@ -1,37 +1,100 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy import Enum, inspect
 from .config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_MAX_OVERFLOW,
-    pool_timeout=settings.DB_POOL_TIMEOUT,
-    pool_recycle=settings.DB_POOL_RECYCLE,
+# 同步驱动到异步驱动的映射
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """把数据库连接串转换为异步驱动连接串"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and url.drivername != ASYNC_DRIVERS[backend]:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+DATABASE_URL = get_async_database_url(settings.DATABASE_URL)
+
+# 连接池配置（SQLite异步驱动不使用连接池）
+pool_options = {} if make_url(DATABASE_URL).get_backend_name() == "sqlite" else {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+
+# 创建异步数据库引擎
+engine = create_async_engine(
+    DATABASE_URL,
     pool_pre_ping=True,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **pool_options
 )
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 创建会话工厂；提交后不过期对象，避免在异步上下文中触发隐式加载
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # 创建基础模型类
 Base = declarative_base()
 
+def create_missing_columns(connection):
+    """为已存在的表补充模型中新增的可空列或带服务端默认值的非空列（create_all 不会修改已有表）"""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            definition = f"{column.name} {column.type.compile(dialect=connection.dialect)}"
+            if not column.nullable:
+                if column.server_default is None:
+                    logger.warning(f"无法自动添加非空列: {table.name}.{column.name}")
+                    continue
+                definition += f" NOT NULL DEFAULT {column.server_default.arg}"
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+            logger.info(f"已添加列: {table.name}.{column.name}")
+
+def create_missing_enum_values(connection):
+    """为PostgreSQL原生枚举类型补充模型中新增的取值"""
+    if connection.dialect.name != "postgresql":
+        return
+    done = set()
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, Enum) or not column.type.native_enum or column.type.name in done:
+                continue
+            done.add(column.type.name)
+            for value in column.type.enums:
+                connection.exec_driver_sql(f"ALTER TYPE {column.type.name} ADD VALUE IF NOT EXISTS '{value}'")
+
+def create_missing_indexes(connection):
+    """为已存在的表补建模型中新增的索引（create_all 不会修改已有表）"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
 # 数据库依赖
-def get_db():
+async def get_db():
     """获取数据库会话"""
-    db = SessionLocal()
-    try:
-        yield db
-    except Exception as e:
-        logger.error(f"数据库操作错误: {str(e)}")
-        db.rollback()
-        raise
-    finally:
-        db.close()
\ No newline at end of file
+    async with SessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"数据库操作错误: {str(e)}")
+            await db.rollback()
+            raise
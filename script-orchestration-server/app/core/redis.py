@@ -0,0 +1,21 @@
+import redis.asyncio as aioredis
+from .config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_redis: aioredis.Redis = None
+
+def get_redis() -> aioredis.Redis:
+    """获取Redis异步客户端"""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(settings.REDIS_URL)
+    return _redis
+
+async def close_redis():
+    """关闭Redis连接"""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
@@ -1,19 +1,15 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
+from redis.connection import parse_url
 from .config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-# 配置作业存储
+# 配置作业存储（只保存少量维护作业；脚本的定时触发由 app.services.cron_engine 负责）
 jobstores = {
-    'default': RedisJobStore(
-        host='vss-redis',
-        port=6379,
-        db=2,
-        password=None
-    )
+    'default': RedisJobStore(**parse_url(settings.REDIS_URL))
 }
 
 # 配置执行器
@@ -0,0 +1 @@
+# 数据模型包
\ No newline at end of file
@@ -0,0 +1,262 @@
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, JSON, ForeignKey, Enum, Index, UniqueConstraint, LargeBinary
+from sqlalchemy.orm import relationship, deferred
+from datetime import datetime
+
+from app.core.database import Base
+from app.schemas.script import ScriptStatus, ExecutionStatus, TriggerType
+from app.utils.compression import decompress_text
+
+class Script(Base):
+    """脚本模型"""
+    __tablename__ = "scripts"
+    __table_args__ = (
+        # 列表分页按 (created_at, id) 倒序，并支持状态/分类筛选
+        Index("ix_scripts_created_at_id", "created_at", "id"),
+        Index("ix_scripts_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_scripts_category_created_at_id", "category", "created_at", "id"),
+        # 导入时按 (name, version) 匹配已有脚本
+        Index("ix_scripts_name_version", "name", "version"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    description = Column(Text)
+    category = Column(String(100), default="general", index=True)
+    content = Column(Text, nullable=False)
+    language = Column(String(50), default="python")
+    version = Column(String(20), default="1.0.0")
+    config = Column(JSON, default=dict)
+    parameters = Column(JSON, default=dict)
+    environment = Column(JSON, default=dict)
+    status = Column(Enum(ScriptStatus), default=ScriptStatus.DRAFT, index=True)
+    is_template = Column(Boolean, default=False)
+    timeout = Column(Integer, default=300)
+    max_retries = Column(Integer, default=3)
+    retry_delay = Column(Integer, default=60)
+    trigger_type = Column(Enum(TriggerType), default=TriggerType.MANUAL)
+    trigger_config = Column(JSON, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, onupdate=datetime.utcnow)
+    created_by = Column(String(100))
+
+    executions = relationship(
+        "ScriptExecution",
+        back_populates="script",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+class ScriptExecution(Base):
+    """脚本执行记录模型"""
+    __tablename__ = "script_executions"
+    __table_args__ = (
+        Index("ix_script_executions_created_at_id", "created_at", "id"),
+        Index("ix_script_executions_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_script_executions_script_id_created_at_id", "script_id", "created_at", "id"),
+        Index("ix_script_executions_script_id_status_created_at_id", "script_id", "status", "created_at", "id"),
+        Index("ix_script_executions_batch_id_id", "batch_id", "id"),
+        Index("ix_script_executions_retry_of_id", "retry_of", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    script_id = Column(Integer, ForeignKey("scripts.id", ondelete="CASCADE"), nullable=False, index=True)
+    execution_id = Column(String(36), unique=True, nullable=False, index=True)
+    status = Column(Enum(ExecutionStatus), default=ExecutionStatus.PENDING, index=True)
+    input_parameters = Column(JSON, default=dict)
+    environment_vars = Column(JSON, default=dict)
+    # 旧版本直接保存在执行表中的输出，新执行的输出压缩保存在 execution_outputs
+    legacy_output = deferred(Column("output", Text))
+    legacy_error_message = deferred(Column("error_message", Text))
+    output_bytes = Column(BigInteger)
+    error_bytes = Column(BigInteger)
+    exit_code = Column(Integer)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    duration = Column(Integer)
+    duration_ms = Column(BigInteger)
+    # 脚本进程的资源使用（wait4 rusage），未实际运行的执行为空
+    cpu_user_ms = Column(BigInteger)
+    cpu_system_ms = Column(BigInteger)
+    max_rss_kb = Column(BigInteger)
+    io_read_blocks = Column(BigInteger)
+    io_write_blocks = Column(BigInteger)
+    ctx_switches_voluntary = Column(BigInteger)
+    ctx_switches_involuntary = Column(BigInteger)
+    # 执行时应用的资源档案（见 app.services.resource_limits）
+    resource_profile = Column(JSON)
+    triggered_by = Column(String(100))
+    trigger_source = Column(String(50), default="manual")
+    # 服务端默认值使启动迁移补列时为已有记录填充0
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    cached_from = Column(String(36))
+    batch_id = Column(String(36))
+    # 批量执行: 批次并发上限、提交到执行队列的时间（尚未提交时为空）
+    batch_concurrency = Column(Integer)
+    queued_at = Column(DateTime)
+    # 失败重试: 最初执行的 execution_id、第几次重试（最初执行为0）、等待中的重试到期时间（已提交后为空）
+    retry_of = Column(String(36))
+    attempt = Column(Integer, default=0)
+    retry_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    script = relationship("Script", back_populates="executions")
+    # 输出只在详情查询中显式加载（见 app.services.execution_output）
+    output_record = relationship("ExecutionOutput", uselist=False, lazy="raise", passive_deletes=True)
+
+    def _stored_text(self, field: str, legacy_field: str):
+        record = self.__dict__.get("output_record")
+        if record is not None and getattr(record, field) is not None:
+            return decompress_text(getattr(record, field))
+        return self.__dict__.get(legacy_field)
+
+    @property
+    def output(self):
+        """执行输出，未加载输出时为None"""
+        return self._stored_text("output", "legacy_output")
+
+    @property
+    def error_message(self):
+        """错误信息，未加载输出时为None"""
+        return self._stored_text("error_message", "legacy_error_message")
+
+class ExecutionOutput(Base):
+    """执行输出模型（gzip压缩，与执行记录一对一）"""
+    __tablename__ = "execution_outputs"
+
+    id = Column(Integer, ForeignKey("script_executions.id", ondelete="CASCADE"), primary_key=True)
+    output = Column(LargeBinary)
+    error_message = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ScriptTemplate(Base):
+    """脚本模板模型"""
+    __tablename__ = "script_templates"
+    __table_args__ = (
+        Index("ix_script_templates_is_public_created_at_id", "is_public", "created_at", "id"),
+        Index("ix_script_templates_category_created_at_id", "category", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False, index=True)
+    description = Column(Text)
+    category = Column(String(100), default="general", index=True)
+    template_content = Column(Text, nullable=False)
+    language = Column(String(50), default="python")
+    default_parameters = Column(JSON, default=dict)
+    required_parameters = Column(JSON, default=list)
+    parameter_schema = Column(JSON, default=dict)
+    is_public = Column(Boolean, default=True)
+    is_featured = Column(Boolean, default=False)
+    usage_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, onupdate=datetime.utcnow)
+    created_by = Column(String(100))
+
+class WorkflowNode(Base):
+    """工作流节点模型"""
+    __tablename__ = "workflow_nodes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    workflow_id = Column(String(100), nullable=False, index=True)
+    node_id = Column(String(100), nullable=False)
+    node_type = Column(String(50), nullable=False)
+    name = Column(String(255), nullable=False)
+    description = Column(Text)
+    config = Column(JSON, default=dict)
+    position = Column(JSON, default=dict)
+    script_id = Column(Integer, ForeignKey("scripts.id", ondelete="SET NULL"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, onupdate=datetime.utcnow)
+
+class WorkflowEdge(Base):
+    """工作流连接模型"""
+    __tablename__ = "workflow_edges"
+
+    id = Column(Integer, primary_key=True, index=True)
+    workflow_id = Column(String(100), nullable=False, index=True)
+    source_node_id = Column(String(100), nullable=False)
+    target_node_id = Column(String(100), nullable=False)
+    condition = Column(JSON, default=dict)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WorkflowRun(Base):
+    """工作流运行记录模型"""
+    __tablename__ = "workflow_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String(36), unique=True, nullable=False, index=True)
+    workflow_id = Column(String(100), nullable=False, index=True)
+    status = Column(Enum(ExecutionStatus), default=ExecutionStatus.PENDING, index=True)
+    input_parameters = Column(JSON, default=dict)
+    node_states = Column(JSON, default=dict)
+    error_message = Column(Text)
+    start_time = Column(DateTime)
+    end_time = Column(DateTime)
+    duration = Column(Integer)
+    triggered_by = Column(String(100))
+    # 运行引擎的心跳时间，超时未更新的运行视为引擎已中断
+    heartbeat_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ExecutionStatsRollup(Base):
+    """执行统计汇总模型（按小时/天分桶，script_id=0 表示全局）"""
+    __tablename__ = "execution_stats_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "script_id", "bucket_start", name="uq_execution_stats_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(8), nullable=False)
+    script_id = Column(Integer, nullable=False, default=0)
+    bucket_start = Column(DateTime, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    success = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(BigInteger, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    duration_ms_sum = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # 有资源统计的执行数、CPU时间(用户+系统)、块I/O次数(读+写)之和，以及内存峰值
+    resource_count = Column(Integer, nullable=False, default=0, server_default="0")
+    cpu_ms_sum = Column(BigInteger, nullable=False, default=0, server_default="0")
+    io_blocks_sum = Column(BigInteger, nullable=False, default=0, server_default="0")
+    max_rss_kb = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ScriptResultCache(Base):
+    """脚本结果缓存模型"""
+    __tablename__ = "script_result_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), unique=True, nullable=False, index=True)
+    script_id = Column(Integer, ForeignKey("scripts.id", ondelete="CASCADE"), nullable=False, index=True)
+    source_execution_id = Column(String(36), nullable=False)
+    output = Column(Text)
+    error_message = Column(Text)
+    exit_code = Column(Integer)
+    output_bytes = Column(BigInteger)
+    error_bytes = Column(BigInteger)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class ExecutionArchive(Base):
+    """执行记录归档模型（一个脚本一天的已结束执行压缩为一个文件）"""
+    __tablename__ = "execution_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    script_id = Column(Integer, nullable=False, index=True)
+    day = Column(DateTime, nullable=False, index=True)
+    path = Column(String(500), nullable=False)
+    execution_count = Column(Integer, default=0)
+    size_bytes = Column(BigInteger, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedExecution(Base):
+    """已归档执行索引（execution_id -> 归档文件）"""
+    __tablename__ = "archived_executions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    execution_id = Column(String(36), unique=True, nullable=False, index=True)
+    archive_id = Column(Integer, ForeignKey("execution_archives.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -20,6 +20,19 @@ class ExecutionStatus(str, Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
     TIMEOUT = "timeout"
+    # 超出资源限制（内存/CPU时间/打开文件数）
+    OOM = "oom"
+    CPU_LIMIT = "cpu_limit"
+    FILE_LIMIT = "file_limit"
+
+# 视为失败的执行状态
+FAILED_STATUSES = [
+    ExecutionStatus.FAILED,
+    ExecutionStatus.TIMEOUT,
+    ExecutionStatus.OOM,
+    ExecutionStatus.CPU_LIMIT,
+    ExecutionStatus.FILE_LIMIT,
+]
 
 class TriggerType(str, Enum):
     """触发器类型枚举"""
@@ -80,6 +93,10 @@ class ScriptResponse(ScriptBase):
     class Config:
         from_attributes = True
 
+class ScriptExportRecord(ScriptBase):
+    """脚本导入导出记录模式（NDJSON每行一条）"""
+    status: ScriptStatus = ScriptStatus.DRAFT
+
 # 脚本执行相关模式
 class ScriptExecutionCreate(BaseModel):
     """创建脚本执行模式"""
@@ -88,28 +105,92 @@ class ScriptExecutionCreate(BaseModel):
     environment_vars: Dict[str, Any] = Field(default_factory=dict)
     triggered_by: Optional[str] = None
     trigger_source: str = "manual"
+    priority: Optional[int] = Field(None, ge=0, le=100)
+    use_cache: bool = True
+
+class ScriptBatchExecutionCreate(BaseModel):
+    """批量执行脚本模式（同一脚本、多组输入参数）"""
+    input_parameters: List[Dict[str, Any]] = Field(..., min_length=1)
+    environment_vars: Dict[str, Any] = Field(default_factory=dict)
+    triggered_by: Optional[str] = None
+    priority: Optional[int] = Field(None, ge=0, le=100)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=100)
+    use_cache: bool = True
 
-class ScriptExecutionResponse(BaseModel):
-    """脚本执行响应模式"""
+class ScriptExecutionSummary(BaseModel):
+    """脚本执行摘要模式（列表接口使用，不含输出）"""
     id: int
     script_id: int
     execution_id: str
     status: ExecutionStatus
     input_parameters: Dict[str, Any]
     environment_vars: Dict[str, Any]
-    output: Optional[str]
-    error_message: Optional[str]
+    output_bytes: Optional[int] = None
+    error_bytes: Optional[int] = None
     exit_code: Optional[int]
     start_time: Optional[datetime]
     end_time: Optional[datetime]
     duration: Optional[int]
+    duration_ms: Optional[int] = None
+    cpu_user_ms: Optional[int] = None
+    cpu_system_ms: Optional[int] = None
+    max_rss_kb: Optional[int] = None
+    io_read_blocks: Optional[int] = None
+    io_write_blocks: Optional[int] = None
+    ctx_switches_voluntary: Optional[int] = None
+    ctx_switches_involuntary: Optional[int] = None
+    resource_profile: Optional[Dict[str, Any]] = None
     triggered_by: Optional[str]
     trigger_source: str
+    priority: Optional[int] = None
+    cached_from: Optional[str] = None
+    batch_id: Optional[str] = None
+    retry_of: Optional[str] = None
+    attempt: Optional[int] = None
+    retry_at: Optional[datetime] = None
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class ScriptExecutionResponse(ScriptExecutionSummary):
+    """脚本执行响应模式（含输出，详情接口使用）"""
+    output: Optional[str] = None
+    error_message: Optional[str] = None
+
+class ExecutionQueueStats(BaseModel):
+    """执行队列统计模式"""
+    depth: int
+    running: int
+    max_concurrency: int
+    max_depth: int
+    total_submitted: int
+    total_rejected: int
+    total_completed: int
+    avg_runtime: float
+    wait_time: Dict[str, Any]
+    distributed: Optional[Dict[str, Any]] = None
+
+class ScriptBatchResponse(BaseModel):
+    """批量执行进度模式"""
+    batch_id: str
+    script_id: int
+    status: ExecutionStatus
+    total: int
+    pending: int
+    running: int
+    success: int
+    failed: int
+    cancelled: int
+    progress: float
+
+class ResultCacheStats(BaseModel):
+    """结果缓存统计模式"""
+    entries: int
+    hits: int
+    output_bytes: int
+    max_entries: int
+
 # 脚本模板相关模式
 class ScriptTemplateBase(BaseModel):
     """脚本模板基础模式"""
@@ -192,10 +273,56 @@ class WorkflowEdgeResponse(WorkflowEdgeBase):
     id: int
     workflow_id: str
     created_at: datetime
-    
+
+    class Config:
+        from_attributes = True
+
+class WorkflowDefinition(BaseModel):
+    """工作流定义模式"""
+    workflow_id: str
+    nodes: List[WorkflowNodeResponse]
+    edges: List[WorkflowEdgeResponse]
+
+class WorkflowRunCreate(BaseModel):
+    """启动工作流运行模式"""
+    input_parameters: Dict[str, Any] = Field(default_factory=dict)
+    triggered_by: Optional[str] = None
+    priority: Optional[int] = Field(None, ge=0, le=100)
+
+class WorkflowRunResponse(BaseModel):
+    """工作流运行响应模式"""
+    id: int
+    run_id: str
+    workflow_id: str
+    status: ExecutionStatus
+    input_parameters: Dict[str, Any]
+    node_states: Dict[str, Any]
+    error_message: Optional[str]
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    duration: Optional[int]
+    triggered_by: Optional[str]
+    created_at: datetime
+
     class Config:
         from_attributes = True
 
+# 导入导出相关模式
+class CatalogImportResult(BaseModel):
+    """NDJSON导入结果模式"""
+    total: int
+    created: int
+    updated: int
+    failed: int
+    errors: List[Dict[str, Any]]
+
+# 事件触发相关模式
+class EventPublish(BaseModel):
+    """发布事件模式"""
+    type: str = Field(..., min_length=1, max_length=200)
+    data: Dict[str, Any] = Field(default_factory=dict)
+    source: Optional[str] = Field(None, max_length=200)
+
 # 通用响应模式
 class MessageResponse(BaseModel):
     """消息响应模式"""
@@ -206,10 +333,11 @@ class MessageResponse(BaseModel):
 class PaginatedResponse(BaseModel, Generic[T]):
     """分页响应模式"""
     items: List[T]
-    total: int
-    page: int
+    total: Optional[int]
+    page: Optional[int]
     size: int
-    pages: int
+    pages: Optional[int]
+    next_cursor: Optional[str] = None
 
 # 统计相关模式
 class ScriptStatistics(BaseModel):
@@ -217,6 +345,25 @@ class ScriptStatistics(BaseModel):
     total_scripts: int
     active_scripts: int
     total_executions: int
+    finished_executions: int = 0
+    active_executions: int = 0
+    success_executions: int = 0
+    failed_executions: int = 0
+    cancelled_executions: int = 0
     success_rate: float
     avg_execution_time: float
-    recent_executions: List[ScriptExecutionResponse]
\ No newline at end of file
+    window: Optional[str] = None
+    since: Optional[datetime] = None
+    timeline: List[Dict[str, Any]] = Field(default_factory=list)
+    recent_executions: List[ScriptExecutionSummary]
+
+class ScriptResourceUsage(BaseModel):
+    """脚本资源使用排行项"""
+    script_id: int
+    script_name: Optional[str] = None
+    executions: int
+    measured_executions: int
+    cpu_ms: int
+    avg_cpu_ms: float
+    io_blocks: int
+    max_rss_kb: int
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+批量执行的补充提交
+
+批量执行的记录一次性写入，由 BatchFeeder 按批次并发上限(batch_concurrency)逐步提交到执行队列。
+提交进度保存在数据库中（已提交到执行队列的记录 queued_at 不为空），服务重启或部署后
+未提交的记录继续提交；单轮提交出错只记录日志，下一轮重试。
+
+多副本时只在持有主节点锁的副本上提交，批次并发上限在所有副本间有效。接受批量请求的副本
+为主节点时立即提交，否则由主节点在 BATCH_POLL_INTERVAL 内提交。本地执行模式下执行队列在
+主节点进程内，主节点切换后把上一个主节点已提交但尚未开始的记录重新提交（执行开始时以条件更新
+认领，不会重复运行）。
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import case, func, or_, select, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import ScriptExecution, ExecutionStatus
+from app.services.execution_queue import QueueFullError
+from app.services.leader_lock import LeaderLock
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "vss:batches:leader"
+
+
+class BatchFeeder:
+    """按并发上限提交批量执行中的待执行记录"""
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._leader = LeaderLock(LEADER_KEY, settings.BATCH_LEADER_TTL, "批量执行")
+        self._leading = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._leader.is_leader:
+            try:
+                await self._leader.release()
+            except Exception as e:
+                logger.warning(f"释放批量执行主节点锁失败: {str(e)}")
+        self._leading = False
+
+    def wakeup(self) -> None:
+        """有新的批次时立即提交（本副本为主节点时）"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self.poll_interval
+            try:
+                if await self._leader.hold():
+                    if not self._leading and settings.EXECUTION_MODE != "distributed":
+                        await self._requeue_local()
+                    self._leading = True
+                    delay = await self._feed()
+                else:
+                    self._leading = False
+                    delay = max(delay, settings.BATCH_LEADER_TTL / 3)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"提交批量执行失败: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _requeue_local(self) -> None:
+        """本地执行模式下，上一个主节点进程内排队的记录随进程丢失，重新提交"""
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(ScriptExecution)
+                .where(
+                    ScriptExecution.batch_id.isnot(None),
+                    ScriptExecution.status == ExecutionStatus.PENDING,
+                    ScriptExecution.queued_at.isnot(None)
+                )
+                .values(queued_at=None)
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.info(f"重新提交 {result.rowcount} 个已排队但未开始的批量执行")
+
+    async def _feed(self) -> float:
+        """提交所有批次中可以开始的记录，返回下一轮的等待秒数"""
+        # 避免循环导入
+        from app.services.script_service import ScriptService
+
+        async with SessionLocal() as db:
+            active = or_(ScriptExecution.status == ExecutionStatus.RUNNING, ScriptExecution.queued_at.isnot(None))
+            batches = (await db.execute(
+                select(
+                    ScriptExecution.batch_id,
+                    func.max(ScriptExecution.batch_concurrency),
+                    func.sum(case((active, 1), else_=0)),
+                    func.sum(case((active, 0), else_=1))
+                )
+                .where(
+                    ScriptExecution.batch_id.isnot(None),
+                    ScriptExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING])
+                )
+                .group_by(ScriptExecution.batch_id)
+            )).all()
+
+            service = ScriptService(db)
+            for batch_id, concurrency, running, waiting in batches:
+                free = (concurrency or settings.BATCH_MAX_CONCURRENCY) - running
+                if not waiting or free <= 0:
+                    continue
+                candidates = select(ScriptExecution.id).where(
+                    ScriptExecution.batch_id == batch_id,
+                    ScriptExecution.status == ExecutionStatus.PENDING,
+                    ScriptExecution.queued_at.is_(None)
+                ).order_by(ScriptExecution.id).limit(free)
+                # 条件更新认领，已取消的记录不再提交
+                executions = (await db.scalars(
+                    update(ScriptExecution)
+                    .where(
+                        ScriptExecution.id.in_(candidates.scalar_subquery()),
+                        ScriptExecution.status == ExecutionStatus.PENDING,
+                        ScriptExecution.queued_at.is_(None)
+                    )
+                    .values(queued_at=datetime.utcnow())
+                    .returning(ScriptExecution)
+                )).all()
+                await db.commit()
+
+                executions = sorted(executions, key=lambda item: item.id)
+                for index, execution in enumerate(executions):
+                    try:
+                        await service.submit_execution(execution)
+                    except QueueFullError as e:
+                        # 队列已满，未提交的记录退回等待
+                        await db.execute(
+                            update(ScriptExecution)
+                            .where(ScriptExecution.id.in_([item.id for item in executions[index:]]))
+                            .values(queued_at=None)
+                        )
+                        await db.commit()
+                        return max(self.poll_interval, e.retry_after)
+                    except Exception as e:
+                        # 分发失败的执行已被标记为失败
+                        logger.error(f"提交批量执行失败: {execution.execution_id} - {str(e)}")
+        return self.poll_interval
+
+
+batch_feeder = BatchFeeder(settings.BATCH_POLL_INTERVAL)
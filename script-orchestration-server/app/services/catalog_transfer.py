@@ -0,0 +1,210 @@
+"""
+脚本/模板目录的批量导入导出（NDJSON，每行一个JSON对象）
+
+导出使用服务端游标分批读取，逐批写出响应，不把全部记录载入内存。
+导入逐行校验（脚本的定时/事件触发配置与创建脚本时的校验相同），按批查询已有记录后分别批量插入和批量更新：
+脚本按 (name, version) 匹配，模板按 name 匹配。批量写入失败时逐行重试，
+以便把错误定位到具体行。
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptTemplate
+from app.schemas.script import ScriptExportRecord, ScriptTemplateCreate, TriggerType
+from app.services.cron_engine import parse_cron_config
+from app.services.event_engine import parse_event_config
+from app.services.result_cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TransferSpec:
+    """一类记录的导入导出配置"""
+
+    def __init__(self, model, schema, key: Tuple[str, ...], validate: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.model = model
+        self.schema = schema
+        self.key = key
+        self.validate = validate
+        self.fields = list(schema.model_fields)
+
+    def key_of(self, values: Dict[str, Any]) -> tuple:
+        return tuple(values[name] for name in self.key)
+
+    def key_condition(self, keys: List[tuple]):
+        columns = [getattr(self.model, name) for name in self.key]
+        if len(columns) == 1:
+            return columns[0].in_([key[0] for key in keys])
+        return tuple_(*columns).in_(keys)
+
+
+def validate_script_trigger(values: Dict[str, Any]) -> None:
+    """校验定时/事件触发配置，配置无效时抛出 ValueError"""
+    if values.get("trigger_type") == TriggerType.CRON:
+        parse_cron_config(values.get("trigger_config"))
+    elif values.get("trigger_type") == TriggerType.EVENT:
+        parse_event_config(values.get("trigger_config"))
+
+
+TRANSFER_SPECS = {
+    "scripts": TransferSpec(Script, ScriptExportRecord, ("name", "version"), validate_script_trigger),
+    "templates": TransferSpec(ScriptTemplate, ScriptTemplateCreate, ("name",)),
+}
+
+
+async def export_records(kind: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """按 id 顺序逐批导出NDJSON，使用独立的数据库会话（响应期间保持）"""
+    spec = TRANSFER_SPECS[kind]
+    query = select(*[getattr(spec.model, name) for name in spec.fields]).order_by(spec.model.id)
+    for name, value in (filters or {}).items():
+        if value is not None:
+            query = query.where(getattr(spec.model, name) == value)
+
+    async with SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.CATALOG_TRANSFER_BATCH_SIZE))
+        async for rows in result.mappings().partitions():
+            yield "".join(
+                json.dumps(dict(row), ensure_ascii=False, default=str) + "\n"
+                for row in rows
+            )
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """把请求体数据块切分为行"""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+class CatalogImporter:
+    """单次NDJSON导入"""
+
+    def __init__(self, db: AsyncSession, kind: str, created_by: Optional[str] = None):
+        self.db = db
+        self.spec = TRANSFER_SPECS[kind]
+        self.created_by = created_by
+        self.batch: Dict[tuple, Tuple[int, Dict[str, Any]]] = {}
+        self.result: Dict[str, Any] = {"total": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+
+    async def run(self, lines: AsyncIterator[bytes]) -> Dict[str, Any]:
+        line_no = 0
+        async for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            self.result["total"] += 1
+            try:
+                values = self.spec.schema.model_validate_json(line).dict()
+            except ValidationError as e:
+                self._fail(line_no, "; ".join(
+                    f"{'.'.join(str(loc) for loc in error['loc']) or 'line'}: {error['msg']}"
+                    for error in e.errors()
+                ))
+                continue
+            if self.spec.validate is not None:
+                try:
+                    self.spec.validate(values)
+                except ValueError as e:
+                    self._fail(line_no, str(e))
+                    continue
+
+            key = self.spec.key_of(values)
+            # 同一批次中出现重复键时先写入当前批次，保证后出现的行覆盖先出现的行
+            if key in self.batch or len(self.batch) >= settings.CATALOG_TRANSFER_BATCH_SIZE:
+                await self._flush()
+            self.batch[key] = (line_no, values)
+
+        await self._flush()
+        return self.result
+
+    def _fail(self, line_no: int, error: str) -> None:
+        self.result["failed"] += 1
+        self.result["errors"].append({"line": line_no, "error": error})
+
+    async def _flush(self) -> None:
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, {}
+        model = self.spec.model
+
+        existing = await self._existing_ids(list(batch))
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for key, (line_no, values) in batch.items():
+            if key in existing:
+                updates.append((line_no, {"id": existing[key], **values, "updated_at": now}))
+            else:
+                inserts.append((line_no, {**values, "created_by": self.created_by}))
+
+        try:
+            if inserts:
+                await self.db.execute(insert(model), [values for _, values in inserts])
+            if updates:
+                await self.db.execute(update(model), [values for _, values in updates])
+            await self.db.commit()
+            self.result["created"] += len(inserts)
+            self.result["updated"] += len(updates)
+        except Exception as e:
+            await self.db.rollback()
+            logger.warning(f"批量导入失败，逐行重试: {str(e)}")
+            await self._write_one_by_one(inserts, updates)
+
+        await self._after_update([values["id"] for _, values in updates])
+
+    async def _existing_ids(self, keys: List[tuple]) -> Dict[tuple, int]:
+        """已有记录 键 -> id，键重复时取最新的记录"""
+        columns = [getattr(self.spec.model, name) for name in self.spec.key]
+        rows = await self.db.execute(
+            select(self.spec.model.id, *columns)
+            .where(self.spec.key_condition(keys))
+            .order_by(self.spec.model.id)
+        )
+        return {tuple(row[1:]): row[0] for row in rows.all()}
+
+    async def _write_one_by_one(self, inserts: List[tuple], updates: List[tuple]) -> None:
+        for statement, rows, counter in (
+            (insert(self.spec.model), inserts, "created"),
+            (update(self.spec.model), updates, "updated"),
+        ):
+            for line_no, values in rows:
+                try:
+                    await self.db.execute(statement, [values])
+                    await self.db.commit()
+                    self.result[counter] += 1
+                except Exception as e:
+                    await self.db.rollback()
+                    self._fail(line_no, str(e).splitlines()[0])
+
+    async def _after_update(self, ids: List[int]) -> None:
+        # 脚本内容可能已变化，清理这些脚本的结果缓存
+        if ids and self.spec.model is Script:
+            await result_cache.invalidate_scripts(self.db, ids)
+
+
+async def import_records(
+    db: AsyncSession,
+    kind: str,
+    chunks: AsyncIterator[bytes],
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """从NDJSON数据块导入记录，返回统计和逐行错误"""
+    result = await CatalogImporter(db, kind, created_by).run(iter_lines(chunks))
+    logger.info(
+        f"导入{kind}: 共 {result['total']} 行, 新建 {result['created']}, "
+        f"更新 {result['updated']}, 失败 {result['failed']}"
+    )
+    return result
@@ -0,0 +1,230 @@
+"""
+带资源统计的脚本子进程
+
+asyncio.subprocess 创建的子进程由事件循环的子进程监视器以 waitpid 回收，无法获得 rusage。
+这里用 subprocess.Popen 创建进程，由专用线程调用 os.wait4 回收并记录资源使用，
+接口与 asyncio.subprocess.Process 保持一致。
+
+exec 时内核会把创建进程（服务进程）的内存峰值计入子进程的 ru_maxrss，
+因此内存峰值改为在进程运行期间采样 /proc/<pid>/status 的 VmHWM（exec后的新映像），
+无法采样时才使用 ru_maxrss。
+
+资源统计字段与 ScriptExecution 上的同名列对应。
+"""
+
+import asyncio
+import logging
+import os
+import resource
+import select
+import signal
+import subprocess
+import threading
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.resource_limits import apply_limits, has_limits
+
+logger = logging.getLogger(__name__)
+
+# 执行记录上保存的资源统计字段
+RESOURCE_FIELDS = (
+    "cpu_user_ms",
+    "cpu_system_ms",
+    "max_rss_kb",
+    "io_read_blocks",
+    "io_write_blocks",
+    "ctx_switches_voluntary",
+    "ctx_switches_involuntary",
+)
+
+# VmHWM 采样间隔：从最小值开始倍增到最大值，短时进程也能采到样本
+RSS_SAMPLE_MIN_INTERVAL = 0.005
+RSS_SAMPLE_MAX_INTERVAL = 0.1
+
+
+def rusage_to_dict(usage: resource.struct_rusage) -> Dict[str, int]:
+    """把 struct_rusage 转换为资源统计字段（max_rss_kb 在Linux上单位为KB）"""
+    return {
+        "cpu_user_ms": int(usage.ru_utime * 1000),
+        "cpu_system_ms": int(usage.ru_stime * 1000),
+        "max_rss_kb": usage.ru_maxrss,
+        "io_read_blocks": usage.ru_inblock,
+        "io_write_blocks": usage.ru_oublock,
+        "ctx_switches_voluntary": usage.ru_nvcsw,
+        "ctx_switches_involuntary": usage.ru_nivcsw,
+    }
+
+
+def rusage_delta(before: resource.struct_rusage, after: resource.struct_rusage) -> Dict[str, int]:
+    """同一进程两次采样之间的资源使用；max_rss_kb 为进程的内存峰值"""
+    start, end = rusage_to_dict(before), rusage_to_dict(after)
+    delta = {name: end[name] - start[name] for name in RESOURCE_FIELDS}
+    delta["max_rss_kb"] = end["max_rss_kb"]
+    return delta
+
+
+def _read_peak_rss_kb(pid: int) -> Optional[int]:
+    """进程当前映像的内存峰值(KB)，进程已退出时返回None"""
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _wait_sampling_rss(pid: int) -> Optional[int]:
+    """等待进程退出（不回收），期间采样内存峰值；不支持pidfd时立即返回None"""
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+    peak = None
+    interval = RSS_SAMPLE_MIN_INTERVAL
+    try:
+        while True:
+            sample = _read_peak_rss_kb(pid)
+            if sample is not None:
+                peak = max(peak or 0, sample)
+            if select.select([pidfd], [], [], interval)[0]:
+                return peak
+            interval = min(interval * 2, RSS_SAMPLE_MAX_INTERVAL)
+    finally:
+        os.close(pidfd)
+
+
+async def _open_pipe_reader(pipe) -> Tuple[asyncio.StreamReader, asyncio.ReadTransport]:
+    """把管道读端包装为StreamReader，同时返回管道transport以便关闭"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.connect_read_pipe(lambda: protocol, pipe)
+    return reader, transport
+
+
+class ChildProcess:
+    """由 os.wait4 回收的子进程，退出后 rusage 为资源统计字段"""
+
+    def __init__(
+        self,
+        popen: subprocess.Popen,
+        stdout: asyncio.StreamReader,
+        stderr: asyncio.StreamReader,
+        pipes: List[asyncio.ReadTransport]
+    ):
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self._pipes = pipes
+        self.returncode: Optional[int] = None
+        self.rusage: Optional[Dict[str, Any]] = None
+        # 进程退出前保持Popen引用，避免其析构时加入 subprocess._active 被其他Popen回收
+        self._popen = popen
+        loop = asyncio.get_running_loop()
+        self._exited = loop.create_future()
+        threading.Thread(target=self._reap, args=(loop,), name=f"wait4-{self.pid}", daemon=True).start()
+
+    def _reap(self, loop: asyncio.AbstractEventLoop) -> None:
+        peak_rss_kb = _wait_sampling_rss(self.pid)
+        try:
+            _, status, usage = os.wait4(self.pid, 0)
+            returncode, rusage = os.waitstatus_to_exitcode(status), rusage_to_dict(usage)
+            if peak_rss_kb:
+                rusage["max_rss_kb"] = peak_rss_kb
+        except ChildProcessError:
+            # 已被其他地方回收，无法获得真实退出码
+            returncode, rusage = -signal.SIGKILL, None
+        try:
+            loop.call_soon_threadsafe(self._set_exited, returncode, rusage)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def _set_exited(self, returncode: int, rusage: Optional[Dict[str, Any]]) -> None:
+        self.returncode = returncode
+        self.rusage = rusage
+        self._popen.returncode = returncode
+        if not self._exited.done():
+            self._exited.set_result(returncode)
+
+    async def wait(self) -> int:
+        """等待进程退出并返回退出码"""
+        return await asyncio.shield(self._exited)
+
+    def send_signal(self, sig: int) -> None:
+        if self.returncode is not None:
+            return
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def close_pipes(self) -> None:
+        """关闭输出管道（进程组内残留的进程可能仍持有写端，管道不会自行结束）"""
+        for pipe in self._pipes:
+            pipe.close()
+
+    async def communicate(self):
+        """读取全部输出并等待进程退出"""
+        stdout, stderr, _ = await asyncio.gather(self.stdout.read(), self.stderr.read(), self.wait())
+        return stdout, stderr
+
+
+def _apply_limits_before_exec(limits: Dict[str, Any], report_fd: int) -> None:
+    """preexec_fn：应用资源档案，未能设置的调度优先级写入 report_fd 由父进程记录"""
+    failures = apply_limits(limits)
+    if failures:
+        os.write(report_fd, "; ".join(failures).encode("utf-8"))
+
+
+async def create_child_process(
+    *args: str,
+    env: Dict[str, Any],
+    limits: Optional[Dict[str, Any]] = None
+) -> ChildProcess:
+    """
+    启动子进程，stdout/stderr 为管道；子进程为新进程组的组长，取消时可终止整个进程组。
+    limits 为资源档案，在子进程exec之前应用，脚本从启动起就受限制；应用失败时启动失败。
+    preexec_fn 使 subprocess 无法使用 vfork，只在档案确有限制时设置
+    """
+    preexec_fn = None
+    report_r = report_w = None
+    if has_limits(limits):
+        # 管道两端均为 close-on-exec，Popen 返回时子进程的写端已随exec关闭
+        report_r, report_w = os.pipe()
+        preexec_fn = partial(_apply_limits_before_exec, limits, report_w)
+    try:
+        popen = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+            preexec_fn=preexec_fn
+        )
+    finally:
+        if report_w is not None:
+            os.close(report_w)
+    if report_r is not None:
+        try:
+            failures = os.read(report_r, 4096)
+        finally:
+            os.close(report_r)
+        if failures:
+            logger.warning(f"设置进程调度优先级失败: {failures.decode('utf-8', errors='replace')}")
+    try:
+        stdout, stdout_pipe = await _open_pipe_reader(popen.stdout)
+        stderr, stderr_pipe = await _open_pipe_reader(popen.stderr)
+    except BaseException:
+        popen.kill()
+        raise
+    return ChildProcess(popen, stdout, stderr, [stdout_pipe, stderr_pipe])
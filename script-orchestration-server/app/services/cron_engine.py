@@ -0,0 +1,401 @@
+"""
+定时(cron)触发引擎
+
+trigger_type 为 cron 且状态为 active 的脚本按 trigger_config 定时执行:
+
+    {
+        "cron": "*/5 * * * *",          # 标准5字段crontab表达式
+        "timezone": "Asia/Shanghai",    # 默认 CRON_TIMEZONE
+        "overlap": "skip",              # 上次定时执行未结束时: skip(跳过) / queue(照常排队) / replace(取消上次)
+        "misfire": "run_once",          # 错过触发时: run_once(补一次) / skip(跳过) / run_all(逐次补，最多 CRON_MISFIRE_MAX_RUNS 次)
+        "misfire_grace": 60,            # 晚于计划时间不超过该秒数不算错过，默认 CRON_MISFIRE_GRACE
+        "input_parameters": {}
+    }
+
+所有脚本的下次触发时间保存在内存最小堆中，主循环只在堆顶到期时唤醒。同一时刻到期的脚本
+合并处理：一次查询检查重叠，批量插入执行记录，本地队列直接提交，分布式队列通过一次管道写入。
+下次触发时间以 script_id -> 时间戳 的形式保存在一个Redis哈希中，每轮只写入变化的字段，
+主节点切换或重启后据此判断错过的触发。
+
+多个副本通过Redis锁选出一个主节点运行引擎，其他副本等待锁过期后接管。
+脚本的增删改由主节点按 CRON_SYNC_INTERVAL 从数据库同步，本进程内的修改立即生效。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import func, insert, select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.script import Script, ScriptExecution, ScriptStatus, ExecutionStatus
+from app.schemas.script import TriggerType
+from app.services.distributed_queue import distributed_queue
+from app.services.execution_queue import execution_queue
+from app.services.leader_lock import LeaderLock
+from app.services.metrics import observe_cron_fires, set_cron_jobs
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "vss:cron:next_fire"
+LEADER_KEY = "vss:cron:leader"
+
+OVERLAP_POLICIES = ("skip", "queue", "replace")
+MISFIRE_POLICIES = ("run_once", "skip", "run_all")
+
+# 检查重叠时每条查询包含的脚本数
+OVERLAP_QUERY_CHUNK = 500
+
+
+def parse_cron_config(trigger_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """校验并补全定时触发配置，配置无效时抛出 ValueError"""
+    config = dict(trigger_config or {})
+    if not config.get("cron"):
+        raise ValueError("定时触发脚本必须在 trigger_config.cron 中指定crontab表达式")
+    try:
+        timezone = ZoneInfo(config.get("timezone") or settings.CRON_TIMEZONE)
+    except Exception:
+        raise ValueError(f"无效的时区: {config.get('timezone')}")
+    try:
+        trigger = CronTrigger.from_crontab(config["cron"], timezone=timezone)
+    except ValueError as e:
+        raise ValueError(f"无效的crontab表达式: {config['cron']} ({str(e)})")
+    overlap = config.get("overlap", "skip")
+    if overlap not in OVERLAP_POLICIES:
+        raise ValueError(f"overlap 必须为 {' / '.join(OVERLAP_POLICIES)}")
+    misfire = config.get("misfire", "run_once")
+    if misfire not in MISFIRE_POLICIES:
+        raise ValueError(f"misfire 必须为 {' / '.join(MISFIRE_POLICIES)}")
+    return {
+        "trigger": trigger,
+        "timezone": timezone,
+        "overlap": overlap,
+        "misfire": misfire,
+        "misfire_grace": int(config.get("misfire_grace", settings.CRON_MISFIRE_GRACE)),
+        "input_parameters": config.get("input_parameters") or {},
+    }
+
+
+class _CronJob:
+    """一个定时脚本"""
+
+    __slots__ = (
+        "script_id", "version", "trigger", "timezone", "overlap", "misfire",
+        "misfire_grace", "input_parameters", "priority", "next_fire",
+    )
+
+    def __init__(self, script_id: int, version: int, config: Dict[str, Any], priority: int):
+        self.script_id = script_id
+        self.version = version
+        self.trigger = config["trigger"]
+        self.timezone = config["timezone"]
+        self.overlap = config["overlap"]
+        self.misfire = config["misfire"]
+        self.misfire_grace = config["misfire_grace"]
+        self.input_parameters = config["input_parameters"]
+        self.priority = priority
+        self.next_fire: Optional[float] = None
+
+    def next_after(self, timestamp: float) -> Optional[float]:
+        """严格晚于 timestamp 的下次触发时间"""
+        moment = datetime.fromtimestamp(timestamp, self.timezone)
+        next_time = self.trigger.get_next_fire_time(moment, moment + timedelta(seconds=1))
+        return next_time.timestamp() if next_time else None
+
+    def first_fire(self, now: float) -> Optional[float]:
+        next_time = self.trigger.get_next_fire_time(None, datetime.fromtimestamp(now, self.timezone))
+        return next_time.timestamp() if next_time else None
+
+    def due_runs(self, scheduled: float, now: float) -> Tuple[int, int]:
+        """计划在 scheduled 的触发到期时，按错过策略返回 (应执行次数, 错过而跳过的次数)，并推进 next_fire"""
+        fires = [scheduled]
+        next_fire = self.next_after(scheduled)
+        while next_fire is not None and next_fire <= now:
+            if len(fires) >= settings.CRON_MISFIRE_MAX_RUNS:
+                next_fire = self.next_after(now)
+                break
+            fires.append(next_fire)
+            next_fire = self.next_after(next_fire)
+        self.next_fire = next_fire
+
+        on_time = now - fires[-1] <= self.misfire_grace
+        if len(fires) == 1 and on_time:
+            runs = 1
+        elif self.misfire == "run_all":
+            runs = len(fires)
+        elif self.misfire == "run_once" or on_time:
+            runs = 1
+        else:
+            runs = 0
+        return runs, len(fires) - runs
+
+
+class CronEngine:
+    """定时触发引擎（仅在持有主节点锁的副本上运行）"""
+
+    def __init__(self):
+        self._leader = LeaderLock(LEADER_KEY, settings.CRON_LEADER_TTL, "定时触发")
+        self._jobs: Dict[int, _CronJob] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._versions = itertools.count()
+        self._dirty: Dict[int, float] = {}
+        self._removed: Set[int] = set()
+        self._last_sync: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.is_leader
+
+    def start(self) -> None:
+        if settings.CRON_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.is_leader:
+            try:
+                await self._persist()
+                await self._leader.release()
+            except Exception as e:
+                logger.warning(f"释放定时触发主节点锁失败: {str(e)}")
+        self._reset()
+
+    # 作业表 -----------------------------------------------------------------
+
+    def _reset(self) -> None:
+        self._jobs.clear()
+        self._heap.clear()
+        self._dirty.clear()
+        self._removed.clear()
+        self._last_sync = None
+        set_cron_jobs(0)
+
+    def _schedule(self, job: _CronJob) -> None:
+        self._jobs[job.script_id] = job
+        self._removed.discard(job.script_id)
+        if job.next_fire is None:
+            self._remove(job.script_id)
+            return
+        heapq.heappush(self._heap, (job.next_fire, job.script_id, job.version))
+        self._dirty[job.script_id] = job.next_fire
+
+    def _remove(self, script_id: int) -> None:
+        # 堆中的旧条目在出堆时按版本丢弃
+        if self._jobs.pop(script_id, None) is not None:
+            self._dirty.pop(script_id, None)
+            self._removed.add(script_id)
+
+    def _load(self, script: Script, now: float, persisted: Optional[float] = None) -> None:
+        """按脚本当前配置（重新）登记定时作业"""
+        if script.trigger_type != TriggerType.CRON or script.status != ScriptStatus.ACTIVE:
+            self._remove(script.id)
+            return
+        try:
+            config = parse_cron_config(script.trigger_config)
+        except ValueError as e:
+            logger.error(f"脚本定时配置无效，已忽略: {script.name} (ID: {script.id}) - {str(e)}")
+            self._remove(script.id)
+            return
+        job = _CronJob(script.id, next(self._versions), config, int((script.config or {}).get("priority", 0)))
+        # 错过的触发从保存的时间开始按错过策略处理
+        job.next_fire = persisted if persisted is not None and persisted <= now else job.first_fire(now)
+        self._schedule(job)
+
+    def update_script(self, script: Script) -> None:
+        """本进程修改脚本后立即更新作业（非主节点时由主节点定期同步）"""
+        if self.is_leader:
+            self._load(script, time.time())
+            set_cron_jobs(len(self._jobs))
+            self._wakeup.set()
+
+    def remove_script(self, script_id: int) -> None:
+        if self.is_leader:
+            self._remove(script_id)
+            set_cron_jobs(len(self._jobs))
+
+    async def _sync(self) -> None:
+        """从数据库同步定时脚本：首次全量加载，之后只加载变更的脚本"""
+        started = datetime.utcnow()
+        now = time.time()
+        async with SessionLocal() as db:
+            active_ids = set((await db.scalars(
+                select(Script.id).where(Script.trigger_type == TriggerType.CRON, Script.status == ScriptStatus.ACTIVE)
+            )).all())
+            query = select(Script)
+            if self._last_sync is None:
+                query = query.where(Script.trigger_type == TriggerType.CRON, Script.status == ScriptStatus.ACTIVE)
+            else:
+                query = query.where(func.coalesce(Script.updated_at, Script.created_at) >= self._last_sync)
+            scripts = (await db.scalars(query)).all()
+
+        persisted: Dict[int, float] = {}
+        if self._last_sync is None:
+            state = await get_redis().hgetall(STATE_KEY)
+            persisted = {int(script_id): float(value) for script_id, value in state.items()}
+            self._removed.update(set(persisted) - active_ids)
+
+        for script_id in set(self._jobs) - active_ids:
+            self._remove(script_id)
+        for script in scripts:
+            self._load(script, now, persisted.get(script.id))
+        # 与上次同步有重叠，避免漏掉同步期间提交的修改
+        self._last_sync = started - timedelta(seconds=1)
+        set_cron_jobs(len(self._jobs))
+
+    async def _persist(self) -> None:
+        """写入变化的下次触发时间"""
+        if not self._dirty and not self._removed:
+            return
+        async with get_redis().pipeline(transaction=False) as pipe:
+            if self._dirty:
+                pipe.hset(STATE_KEY, mapping={str(k): int(v) for k, v in self._dirty.items()})
+            if self._removed:
+                pipe.hdel(STATE_KEY, *[str(k) for k in self._removed])
+            await pipe.execute()
+        self._dirty.clear()
+        self._removed.clear()
+
+    async def _hold_leadership(self) -> bool:
+        if await self._leader.hold():
+            return True
+        if self._jobs or self._last_sync is not None:
+            # 失去主节点锁，由新的主节点接管
+            self._reset()
+        return False
+
+    # 主循环 -----------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not await self._hold_leadership():
+                    await asyncio.sleep(settings.CRON_LEADER_TTL / 3)
+                    continue
+                if (
+                    self._last_sync is None
+                    or (datetime.utcnow() - self._last_sync).total_seconds() >= settings.CRON_SYNC_INTERVAL
+                ):
+                    await self._sync()
+                await self._fire_due()
+                await self._persist()
+                await self._sleep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"定时触发引擎异常: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _sleep(self) -> None:
+        """睡眠到堆顶到期、需要续期锁或同步，或有作业变更"""
+        timeout = min(settings.CRON_LEADER_TTL / 3, settings.CRON_SYNC_INTERVAL)
+        if self._heap:
+            timeout = min(timeout, self._heap[0][0] - time.time())
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _fire_due(self) -> None:
+        now = time.time()
+        due: List[Tuple[_CronJob, int]] = []
+        while self._heap and self._heap[0][0] <= now:
+            scheduled, script_id, version = heapq.heappop(self._heap)
+            job = self._jobs.get(script_id)
+            if job is None or job.version != version:
+                continue
+            runs, missed = job.due_runs(scheduled, now)
+            observe_cron_fires("skipped_misfire", missed)
+            if missed:
+                logger.warning(f"脚本错过 {missed} 次定时触发: 脚本 {script_id}")
+            self._schedule(job)
+            if runs:
+                due.append((job, runs))
+        if due:
+            await self._fire(due)
+
+    async def _fire(self, due: List[Tuple[_CronJob, int]]) -> None:
+        """为到期的脚本批量创建并提交执行"""
+        # 避免循环导入
+        from app.services.script_service import ScriptService
+
+        async with SessionLocal() as db:
+            service = ScriptService(db)
+            checked = [job.script_id for job, _ in due if job.overlap != "queue"]
+            active: Dict[int, List[str]] = {}
+            for start in range(0, len(checked), OVERLAP_QUERY_CHUNK):
+                rows = await db.execute(
+                    select(ScriptExecution.script_id, ScriptExecution.execution_id).where(
+                        ScriptExecution.script_id.in_(checked[start:start + OVERLAP_QUERY_CHUNK]),
+                        ScriptExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING]),
+                        ScriptExecution.trigger_source == "cron"
+                    )
+                )
+                for script_id, execution_id in rows.all():
+                    active.setdefault(script_id, []).append(execution_id)
+
+            rows = []
+            for job, runs in due:
+                running = active.get(job.script_id)
+                if running and job.overlap == "skip":
+                    observe_cron_fires("skipped_overlap", runs)
+                    continue
+                if running and job.overlap == "replace":
+                    for execution_id in running:
+                        await service.cancel_execution(execution_id)
+                if job.overlap != "queue":
+                    # 同一轮的多次补触发之间同样不能重叠
+                    runs = 1
+                rows.extend(
+                    {
+                        "script_id": job.script_id,
+                        "execution_id": str(uuid.uuid4()),
+                        "input_parameters": job.input_parameters,
+                        "environment_vars": {},
+                        "triggered_by": "cron",
+                        "trigger_source": "cron",
+                        "priority": job.priority,
+                        "status": ExecutionStatus.PENDING,
+                    }
+                    for _ in range(runs)
+                )
+
+            capacity = (
+                await distributed_queue.capacity()
+                if settings.EXECUTION_MODE == "distributed"
+                else execution_queue.capacity
+            )
+            if len(rows) > capacity:
+                logger.warning(f"执行队列已满，丢弃 {len(rows) - capacity} 次定时触发")
+                observe_cron_fires("rejected", len(rows) - capacity)
+                rows = rows[:capacity]
+
+            for start in range(0, len(rows), settings.CRON_FIRE_BATCH_SIZE):
+                created = (await db.execute(
+                    insert(ScriptExecution).returning(ScriptExecution.id, ScriptExecution.priority),
+                    rows[start:start + settings.CRON_FIRE_BATCH_SIZE]
+                )).all()
+                await db.commit()
+                await service.submit_executions([(row.id, row.priority) for row in created])
+                observe_cron_fires("fired", len(created))
+
+
+cron_engine = CronEngine()
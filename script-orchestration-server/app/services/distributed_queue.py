@@ -0,0 +1,333 @@
+"""
+分布式执行队列
+
+分布式模式下API只负责把执行写入Redis Stream，由独立的工作进程(worker.py)
+通过消费者组拉取并执行。工作进程定期为处理中的消息续期；
+崩溃的工作进程持有的消息在超过可见性超时后由其他工作进程认领重新执行。
+
+Stream 按先进先出投递，执行优先级通过分流实现：按 EXECUTION_STREAM_PRIORITY_LEVELS 的阈值
+把执行写入不同的Stream（优先级低于最小阈值的执行写入 EXECUTION_STREAM 本身），
+工作进程有空闲槽位时按优先级从高到低依次拉取，同一Stream内仍按写入顺序。
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.execution_queue import ExecutionQueue, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# 队列已满时建议客户端的重试间隔(秒)
+RETRY_AFTER_SECONDS = 5
+
+ExecutionCallback = Callable[[int], Awaitable[Any]]
+
+
+def parse_priority_levels(value: str) -> List[int]:
+    """解析优先级分流阈值，格式: "10,50" """
+    return sorted({int(item) for item in value.split(",") if item.strip()})
+
+
+class DistributedExecutionQueue:
+    """基于Redis Stream的执行队列，每个优先级档位一个Stream"""
+
+    def __init__(self, stream: str, group: str, max_depth: int, priority_levels: List[int]):
+        self.stream = stream
+        self.group = group
+        self.max_depth = max_depth
+        # (阈值, Stream)，按优先级从高到低；最低档为 EXECUTION_STREAM 本身
+        self.levels: List[Tuple[int, str]] = [
+            (level, f"{stream}:p{level}") for level in sorted(priority_levels, reverse=True) if level > 0
+        ]
+        self.levels.append((0, stream))
+        self.streams = [name for _, name in self.levels]
+
+    def stream_for(self, priority: int) -> str:
+        """执行优先级对应的Stream"""
+        for level, name in self.levels:
+            if (priority or 0) >= level:
+                return name
+        return self.stream
+
+    async def ensure_group(self) -> None:
+        """创建消费者组（已存在时忽略）"""
+        for name in self.streams:
+            try:
+                await get_redis().xgroup_create(name, self.group, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def _depths(self) -> List[int]:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for name in self.streams:
+                pipe.xlen(name)
+            return await pipe.execute()
+
+    async def check_capacity(self) -> None:
+        """检查队列容量，队列已满时抛出 QueueFullError"""
+        depth = sum(await self._depths())
+        if depth >= self.max_depth:
+            raise QueueFullError(depth, RETRY_AFTER_SECONDS)
+
+    async def capacity(self) -> int:
+        """还能写入的执行数"""
+        return max(0, self.max_depth - sum(await self._depths()))
+
+    async def enqueue(self, execution_id: int, priority: int = 0) -> str:
+        """写入执行任务"""
+        message_id = await get_redis().xadd(
+            self.stream_for(priority), {"execution_id": execution_id, "priority": priority}
+        )
+        return message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id
+
+    async def enqueue_many(self, executions: List[Tuple[int, int]]) -> None:
+        """通过一次管道批量写入执行任务，executions 每项为 (执行ID, 优先级)"""
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for execution_id, priority in executions:
+                pipe.xadd(self.stream_for(priority), {"execution_id": execution_id, "priority": priority})
+            await pipe.execute()
+
+    async def stats(self) -> Dict[str, Any]:
+        """队列统计信息"""
+        redis = get_redis()
+        depths = await self._depths()
+        stats = {
+            "stream": self.stream,
+            "depth": sum(depths),
+            "streams": dict(zip(self.streams, depths)),
+            "pending": 0,
+            "consumers": []
+        }
+        for name in self.streams:
+            try:
+                for group in await redis.xinfo_groups(name):
+                    if group["name"].decode("utf-8") == self.group:
+                        stats["pending"] += group["pending"]
+                stats["consumers"].extend(
+                    {
+                        "stream": name,
+                        "name": consumer["name"].decode("utf-8"),
+                        "pending": consumer["pending"],
+                        "idle_ms": consumer["idle"],
+                    }
+                    for consumer in await redis.xinfo_consumers(name, self.group)
+                )
+            except ResponseError:
+                pass
+        return stats
+
+
+class ExecutionWorker:
+    """分布式执行工作进程的消费循环"""
+
+    def __init__(
+        self,
+        queue: DistributedExecutionQueue,
+        runner: ExecutionCallback,
+        recover: ExecutionCallback,
+        abandon: ExecutionCallback,
+        max_concurrency: int,
+        consumer_name: Optional[str] = None
+    ):
+        self.queue = queue
+        self.runner = runner
+        self.recover = recover
+        self.abandon = abandon
+        self.max_concurrency = max_concurrency
+        self.consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        # 阻塞拉取时每个Stream最多各返回一条，可能略多于空闲槽位，多出的在本地按优先级等待
+        self.local_queue = ExecutionQueue(
+            max_concurrency=max_concurrency,
+            max_depth=max_concurrency + len(queue.streams)
+        )
+        # (Stream, 消息ID) -> 执行ID
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        self._slot_freed = asyncio.Event()
+        self._stopping = False
+
+    @property
+    def free_slots(self) -> int:
+        return self.max_concurrency - len(self._inflight)
+
+    async def run(self) -> None:
+        """消费执行任务直到 stop() 被调用"""
+        await self.queue.ensure_group()
+        logger.info(f"执行工作进程已启动: {self.consumer_name} (并发: {self.max_concurrency})")
+        maintenance = asyncio.create_task(self._maintenance_loop())
+        try:
+            await self._read_loop()
+        finally:
+            maintenance.cancel()
+
+    async def stop(self, timeout: float) -> None:
+        """停止拉取新任务，等待处理中的执行完成"""
+        self._stopping = True
+        self._slot_freed.set()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self._inflight and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.5)
+        if self._inflight:
+            logger.warning(f"工作进程退出时仍有 {len(self._inflight)} 个执行未完成，将由其他工作进程认领")
+
+    async def _read_loop(self) -> None:
+        while not self._stopping:
+            if self.free_slots <= 0:
+                self._slot_freed.clear()
+                await self._slot_freed.wait()
+                continue
+            try:
+                if not await self._read_by_priority():
+                    # 所有Stream均为空时阻塞等待任意Stream的新任务
+                    await self._read({name: ">" for name in self.queue.streams}, count=1, block=5000)
+            except Exception as e:
+                logger.error(f"拉取执行任务失败: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def _read_by_priority(self) -> int:
+        """按优先级从高到低拉取，直到填满空闲槽位，返回拉取的任务数"""
+        started = 0
+        for name in self.queue.streams:
+            if self.free_slots <= 0:
+                break
+            started += await self._read({name: ">"}, count=self.free_slots)
+        return started
+
+    async def _read(self, streams: Dict[str, str], count: int, block: Optional[int] = None) -> int:
+        response = await get_redis().xreadgroup(
+            self.queue.group,
+            self.consumer_name,
+            streams,
+            count=count,
+            block=block
+        )
+        started = 0
+        for stream, messages in response or []:
+            stream = stream.decode("utf-8") if isinstance(stream, bytes) else stream
+            for message_id, fields in messages:
+                self._start(stream, message_id, fields)
+                started += 1
+        return started
+
+    def _start(self, stream: str, message_id, fields) -> None:
+        message_id = message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id
+        execution_id = int(fields[b"execution_id"])
+        priority = int(fields.get(b"priority", 0))
+        key = (stream, message_id)
+        self._inflight[key] = execution_id
+        self.local_queue.submit(execution_id, priority, lambda: self._process(key, execution_id))
+
+    async def _process(self, key: Tuple[str, str], execution_id: int) -> None:
+        try:
+            await self.runner(execution_id)
+        finally:
+            await self._acknowledge(key)
+
+    async def _acknowledge(self, key: Tuple[str, str]) -> None:
+        stream, message_id = key
+        redis = get_redis()
+        try:
+            await redis.xack(stream, self.queue.group, message_id)
+            await redis.xdel(stream, message_id)
+        except Exception as e:
+            logger.error(f"确认执行任务失败: {message_id} - {str(e)}")
+        finally:
+            self._inflight.pop(key, None)
+            self._slot_freed.set()
+
+    async def _maintenance_loop(self) -> None:
+        """为处理中的消息续期，并认领超时未确认的消息"""
+        interval = max(1, settings.WORKER_VISIBILITY_TIMEOUT // 3)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._heartbeat()
+                if not self._stopping:
+                    await self._reclaim()
+            except Exception as e:
+                logger.error(f"执行任务维护失败: {str(e)}")
+
+    async def _heartbeat(self) -> None:
+        by_stream: Dict[str, List[str]] = {}
+        for stream, message_id in self._inflight:
+            by_stream.setdefault(stream, []).append(message_id)
+        for stream, message_ids in by_stream.items():
+            # min_idle_time=0 的XCLAIM会重置消息空闲时间
+            await get_redis().xclaim(
+                stream,
+                self.queue.group,
+                self.consumer_name,
+                min_idle_time=0,
+                message_ids=message_ids,
+                justid=True
+            )
+
+    async def _reclaim(self) -> None:
+        for stream in self.queue.streams:
+            if self.free_slots <= 0:
+                return
+            await self._reclaim_stream(stream, self.free_slots)
+
+    async def _reclaim_stream(self, stream: str, free: int) -> None:
+        redis = get_redis()
+        visibility_ms = settings.WORKER_VISIBILITY_TIMEOUT * 1000
+        pending: List[Dict[str, Any]] = await redis.xpending_range(
+            stream,
+            self.queue.group,
+            min="-",
+            max="+",
+            count=free,
+            idle=visibility_ms
+        )
+        for entry in pending:
+            message_id = entry["message_id"]
+            message_id = message_id.decode("utf-8") if isinstance(message_id, bytes) else message_id
+            key = (stream, message_id)
+            if key in self._inflight:
+                continue
+
+            claimed = await redis.xclaim(
+                stream,
+                self.queue.group,
+                self.consumer_name,
+                min_idle_time=visibility_ms,
+                message_ids=[message_id]
+            )
+            if not claimed:
+                continue
+
+            _, fields = claimed[0]
+            if not fields:
+                # 消息体已被删除
+                await redis.xack(stream, self.queue.group, message_id)
+                continue
+
+            execution_id = int(fields[b"execution_id"])
+            if entry["times_delivered"] >= settings.WORKER_MAX_DELIVERIES:
+                logger.error(f"执行多次认领后仍未完成，放弃执行: {execution_id}")
+                await self.abandon(execution_id)
+                self._inflight[key] = execution_id
+                await self._acknowledge(key)
+                continue
+
+            logger.warning(
+                f"认领超时未确认的执行: {execution_id} "
+                f"(原消费者: {entry['consumer'].decode('utf-8') if isinstance(entry['consumer'], bytes) else entry['consumer']})"
+            )
+            await self.recover(execution_id)
+            self._start(stream, message_id, fields)
+
+
+distributed_queue = DistributedExecutionQueue(
+    stream=settings.EXECUTION_STREAM,
+    group=settings.EXECUTION_CONSUMER_GROUP,
+    max_depth=settings.EXECUTION_QUEUE_MAX_DEPTH,
+    priority_levels=parse_priority_levels(settings.EXECUTION_STREAM_PRIORITY_LEVELS)
+)
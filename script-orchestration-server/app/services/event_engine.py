@@ -0,0 +1,567 @@
+"""
+事件触发引擎
+
+trigger_type 为 event 且状态为 active 的脚本在收到匹配的事件时执行。事件由视频分析流水线等
+生产者写入Redis Stream(EVENT_STREAM)，也可以通过 POST /api/v1/events/ 发布，每条消息的字段:
+
+    type    事件类型，如 camera.offline / object.detected
+    data    事件内容(JSON对象)
+    source  事件来源(可选)
+
+脚本的 trigger_config:
+
+    {
+        "event_types": ["camera.offline", "object.*"],  # 事件类型，支持 * ? [] 通配符
+        "filter": {"camera_id": "cam-01", "object.label": ["person", "car"]},
+                                  # 按 data 字段过滤(可选)，点号表示嵌套字段，列表表示取值之一
+        "debounce": 5,            # 最后一个事件后静默该秒数再执行，默认 EVENT_DEBOUNCE
+        "max_wait": 60,           # 批次第一个事件后最多等待该秒数，默认 EVENT_MAX_WAIT
+        "max_batch": 1000,        # 批次达到该事件数时立即执行，默认 EVENT_MAX_BATCH
+        "input_parameters": {}
+    }
+
+同一脚本在窗口内匹配的事件合并为一次执行：事件列表按到达顺序放在输入参数 events 中
+（每项包含 id / type / data / source / timestamp），事件数放在 event_count 中。
+
+引擎通过消费者组读取事件流，只在持有主节点锁的副本上运行，同一脚本的事件只在一个副本上合并。
+事件在包含它的批次都已创建执行后才确认(XACK)；主节点切换或重启后，新的主节点认领消费者组中
+未确认的事件重新合并，事件至少触发一次。执行队列已满时暂停读取事件，已到期的批次延后提交。
+"""
+
+import asyncio
+import fnmatch
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from redis.exceptions import ResponseError
+from sqlalchemy import func, insert, select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.redis import get_redis
+from app.models.script import Script, ScriptExecution, ScriptStatus, ExecutionStatus
+from app.schemas.script import TriggerType
+from app.services.distributed_queue import distributed_queue
+from app.services.execution_queue import execution_queue
+from app.services.leader_lock import LeaderLock
+from app.services.metrics import observe_trigger_events, observe_event_fires, observe_event_batches, set_event_triggers
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "vss:events:leader"
+
+# 执行队列已满时延后提交批次的秒数
+DEFER_SECONDS = 5
+# 每条插入语句最多创建的执行数
+INSERT_CHUNK = 500
+
+
+def parse_event_config(trigger_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """校验并补全事件触发配置，配置无效时抛出 ValueError"""
+    config = dict(trigger_config or {})
+    event_types = config.get("event_types")
+    if isinstance(event_types, str):
+        event_types = [event_types]
+    if not event_types or not all(isinstance(event_type, str) and event_type for event_type in event_types):
+        raise ValueError("事件触发脚本必须在 trigger_config.event_types 中指定事件类型")
+    event_filter = config.get("filter") or {}
+    if not isinstance(event_filter, dict):
+        raise ValueError("filter 必须为对象")
+    input_parameters = config.get("input_parameters") or {}
+    if not isinstance(input_parameters, dict):
+        raise ValueError("input_parameters 必须为对象")
+    try:
+        debounce = float(config.get("debounce", settings.EVENT_DEBOUNCE))
+        max_wait = float(config.get("max_wait", settings.EVENT_MAX_WAIT))
+        max_batch = int(config.get("max_batch", settings.EVENT_MAX_BATCH))
+    except (TypeError, ValueError):
+        raise ValueError("debounce / max_wait / max_batch 必须为数字")
+    if debounce < 0 or max_wait < 0 or max_batch < 1:
+        raise ValueError("debounce / max_wait 不能为负数，max_batch 至少为1")
+    return {
+        "event_types": list(dict.fromkeys(event_types)),
+        "filter": [
+            (tuple(path.split(".")), values if isinstance(values, list) else [values])
+            for path, values in event_filter.items()
+        ],
+        "debounce": debounce,
+        "max_wait": max_wait,
+        "max_batch": max_batch,
+        "input_parameters": input_parameters,
+    }
+
+
+def _is_pattern(event_type: str) -> bool:
+    return any(char in event_type for char in "*?[")
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _parse_event(message_id: str, fields: Optional[Dict[bytes, bytes]]) -> Optional[Dict[str, Any]]:
+    """把事件流消息转换为传给脚本的事件，格式无效时返回None"""
+    if not fields or b"type" not in fields:
+        return None
+    try:
+        data = json.loads(fields.get(b"data", b"{}"))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return {
+        "id": message_id,
+        "type": _decode(fields[b"type"]),
+        "data": data,
+        "source": _decode(fields[b"source"]) if b"source" in fields else None,
+        "timestamp": datetime.utcfromtimestamp(int(message_id.split("-")[0]) / 1000).isoformat(),
+    }
+
+
+def _next_id(message_id: str) -> str:
+    """事件流中紧随 message_id 之后的ID"""
+    ms, seq = message_id.split("-")
+    return f"{ms}-{int(seq) + 1}"
+
+
+async def publish_event(event_type: str, data: Dict[str, Any], source: Optional[str] = None) -> str:
+    """向事件流写入事件，返回消息ID；事件流按 EVENT_STREAM_MAXLEN 近似裁剪"""
+    fields = {"type": event_type, "data": json.dumps(data, ensure_ascii=False)}
+    if source:
+        fields["source"] = source
+    message_id = await get_redis().xadd(
+        settings.EVENT_STREAM, fields, maxlen=settings.EVENT_STREAM_MAXLEN, approximate=True
+    )
+    return _decode(message_id)
+
+
+class _EventTrigger:
+    """一个事件触发脚本"""
+
+    __slots__ = ("script_id", "event_types", "filter", "debounce", "max_wait", "max_batch", "input_parameters", "priority")
+
+    def __init__(self, script_id: int, config: Dict[str, Any], priority: int):
+        self.script_id = script_id
+        self.event_types = config["event_types"]
+        self.filter = config["filter"]
+        self.debounce = config["debounce"]
+        self.max_wait = config["max_wait"]
+        self.max_batch = config["max_batch"]
+        self.input_parameters = config["input_parameters"]
+        self.priority = priority
+
+    def matches(self, data: Dict[str, Any]) -> bool:
+        for path, values in self.filter:
+            value = data
+            for key in path:
+                if not isinstance(value, dict) or key not in value:
+                    return False
+                value = value[key]
+            if value not in values:
+                return False
+        return True
+
+
+class _Batch:
+    """一个脚本正在合并的事件"""
+
+    __slots__ = ("id", "trigger", "events", "first_at", "last_at")
+
+    def __init__(self, batch_id: int, trigger: _EventTrigger, now: float):
+        self.id = batch_id
+        self.trigger = trigger
+        self.events: List[Dict[str, Any]] = []
+        self.first_at = now
+        self.last_at = now
+
+    @property
+    def deadline(self) -> float:
+        return min(self.last_at + self.trigger.debounce, self.first_at + self.trigger.max_wait)
+
+    @property
+    def full(self) -> bool:
+        return len(self.events) >= self.trigger.max_batch
+
+
+class EventEngine:
+    """事件触发引擎（仅在持有主节点锁的副本上运行）"""
+
+    def __init__(self):
+        self.stream = settings.EVENT_STREAM
+        self.group = settings.EVENT_CONSUMER_GROUP
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self._leader = LeaderLock(LEADER_KEY, settings.EVENT_LEADER_TTL, "事件触发")
+        self._triggers: Dict[int, _EventTrigger] = {}
+        # 事件类型 -> 脚本ID；带通配符的事件类型逐个匹配
+        self._by_type: Dict[str, Set[int]] = {}
+        self._patterns: Dict[int, List[str]] = {}
+        # 合并中的批次及其到期时间（time.monotonic），堆中条目只是到期时间的下界
+        self._batches: Dict[int, _Batch] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._batch_ids = itertools.count()
+        # 已到期或已满、等待创建执行的批次
+        self._ready: List[_Batch] = []
+        # 事件所在的未提交批次数，归零后确认
+        self._refs: Dict[str, int] = {}
+        self._to_ack: List[str] = []
+        self._paused_until = 0.0
+        self._recovered = False
+        self._last_sync: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.is_leader
+
+    def start(self) -> None:
+        if settings.EVENT_TRIGGERS_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.is_leader:
+            # 合并中的事件保持未确认，由下一个主节点认领
+            try:
+                await self._ack()
+                await self._leader.release()
+            except Exception as e:
+                logger.warning(f"释放事件触发主节点锁失败: {str(e)}")
+        self._reset()
+
+    # 脚本表 -----------------------------------------------------------------
+
+    def _reset(self) -> None:
+        self._triggers.clear()
+        self._by_type.clear()
+        self._patterns.clear()
+        self._batches.clear()
+        self._heap.clear()
+        self._ready.clear()
+        self._refs.clear()
+        self._to_ack.clear()
+        self._paused_until = 0.0
+        self._recovered = False
+        self._last_sync = None
+        set_event_triggers(0)
+
+    def _register(self, trigger: _EventTrigger) -> None:
+        self._unregister(trigger.script_id)
+        self._triggers[trigger.script_id] = trigger
+        for event_type in trigger.event_types:
+            if _is_pattern(event_type):
+                self._patterns.setdefault(trigger.script_id, []).append(event_type)
+            else:
+                self._by_type.setdefault(event_type, set()).add(trigger.script_id)
+        # 合并中的批次按新配置到期
+        batch = self._batches.get(trigger.script_id)
+        if batch is not None:
+            batch.trigger = trigger
+
+    def _unregister(self, script_id: int) -> None:
+        # 合并中的批次在到期时丢弃
+        trigger = self._triggers.pop(script_id, None)
+        if trigger is None:
+            return
+        for event_type in trigger.event_types:
+            script_ids = self._by_type.get(event_type)
+            if script_ids is not None:
+                script_ids.discard(script_id)
+                if not script_ids:
+                    del self._by_type[event_type]
+        self._patterns.pop(script_id, None)
+
+    def _load(self, script: Script) -> None:
+        """按脚本当前配置（重新）登记事件触发"""
+        if script.trigger_type != TriggerType.EVENT or script.status != ScriptStatus.ACTIVE:
+            self._unregister(script.id)
+            return
+        try:
+            config = parse_event_config(script.trigger_config)
+        except ValueError as e:
+            logger.error(f"脚本事件触发配置无效，已忽略: {script.name} (ID: {script.id}) - {str(e)}")
+            self._unregister(script.id)
+            return
+        self._register(_EventTrigger(script.id, config, int((script.config or {}).get("priority", 0))))
+
+    def update_script(self, script: Script) -> None:
+        """本进程修改脚本后立即更新事件触发（非主节点时由主节点定期同步）"""
+        if self.is_leader:
+            self._load(script)
+            set_event_triggers(len(self._triggers))
+
+    def remove_script(self, script_id: int) -> None:
+        if self.is_leader:
+            self._unregister(script_id)
+            set_event_triggers(len(self._triggers))
+
+    async def _sync(self) -> None:
+        """从数据库同步事件触发脚本：首次全量加载，之后只加载变更的脚本"""
+        started = datetime.utcnow()
+        async with SessionLocal() as db:
+            active_ids = set((await db.scalars(
+                select(Script.id).where(Script.trigger_type == TriggerType.EVENT, Script.status == ScriptStatus.ACTIVE)
+            )).all())
+            query = select(Script)
+            if self._last_sync is None:
+                query = query.where(Script.trigger_type == TriggerType.EVENT, Script.status == ScriptStatus.ACTIVE)
+            else:
+                query = query.where(func.coalesce(Script.updated_at, Script.created_at) >= self._last_sync)
+            scripts = (await db.scalars(query)).all()
+
+        for script_id in set(self._triggers) - active_ids:
+            self._unregister(script_id)
+        for script in scripts:
+            self._load(script)
+        # 与上次同步有重叠，避免漏掉同步期间提交的修改
+        self._last_sync = started - timedelta(seconds=1)
+        set_event_triggers(len(self._triggers))
+
+    # 事件 -------------------------------------------------------------------
+
+    async def _ensure_group(self) -> None:
+        """创建消费者组（已存在时忽略），新建的组只消费此后写入的事件"""
+        try:
+            await get_redis().xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _recover(self) -> None:
+        """认领消费者组中未确认的事件（上一个主节点合并中的事件）并重新合并"""
+        redis = get_redis()
+        start = "-"
+        while True:
+            pending = await redis.xpending_range(
+                self.stream, self.group, min=start, max="+", count=settings.EVENT_READ_COUNT
+            )
+            if not pending:
+                break
+            message_ids = [_decode(entry["message_id"]) for entry in pending]
+            claimed = await redis.xclaim(
+                self.stream, self.group, self.consumer_name, min_idle_time=0, message_ids=message_ids
+            )
+            self._dispatch(claimed, time.monotonic())
+            start = _next_id(message_ids[-1])
+        if self._refs:
+            logger.info(f"认领 {len(self._refs)} 个未确认的事件")
+
+    async def _read(self, timeout: float) -> None:
+        response = await get_redis().xreadgroup(
+            self.group,
+            self.consumer_name,
+            {self.stream: ">"},
+            count=settings.EVENT_READ_COUNT,
+            block=max(1, int(timeout * 1000))
+        )
+        now = time.monotonic()
+        for _, messages in response or []:
+            self._dispatch(messages, now)
+
+    def _dispatch(self, messages, now: float) -> None:
+        """把事件加入匹配脚本的批次，无需触发的事件直接确认"""
+        for message_id, fields in messages:
+            message_id = _decode(message_id)
+            event = _parse_event(message_id, fields)
+            if event is None:
+                logger.warning(f"忽略格式无效的事件: {message_id}")
+                observe_trigger_events("invalid")
+                self._to_ack.append(message_id)
+                continue
+
+            matched = 0
+            for script_id in self._match(event["type"]):
+                trigger = self._triggers[script_id]
+                if trigger.matches(event["data"]):
+                    self._add(trigger, event, now)
+                    matched += 1
+            if matched:
+                self._refs[message_id] = self._refs.get(message_id, 0) + matched
+                observe_trigger_events("matched")
+            else:
+                observe_trigger_events("unmatched")
+                self._to_ack.append(message_id)
+
+    def _match(self, event_type: str) -> Set[int]:
+        script_ids = set(self._by_type.get(event_type, ()))
+        for script_id, patterns in self._patterns.items():
+            if any(fnmatch.fnmatchcase(event_type, pattern) for pattern in patterns):
+                script_ids.add(script_id)
+        return script_ids
+
+    def _add(self, trigger: _EventTrigger, event: Dict[str, Any], now: float) -> None:
+        batch = self._batches.get(trigger.script_id)
+        if batch is None:
+            batch = self._batches[trigger.script_id] = _Batch(next(self._batch_ids), trigger, now)
+            heapq.heappush(self._heap, (batch.deadline, trigger.script_id, batch.id))
+        batch.events.append(event)
+        batch.last_at = now
+        if batch.full:
+            # 已满的批次立即提交，后续事件进入新批次
+            del self._batches[trigger.script_id]
+            self._ready.append(batch)
+
+    def _release(self, batch: _Batch) -> None:
+        """批次已提交或丢弃，确认不再被其他批次引用的事件"""
+        for event in batch.events:
+            message_id = event["id"]
+            remaining = self._refs.get(message_id, 1) - 1
+            if remaining > 0:
+                self._refs[message_id] = remaining
+            else:
+                self._refs.pop(message_id, None)
+                self._to_ack.append(message_id)
+
+    async def _ack(self) -> None:
+        if self._to_ack:
+            await get_redis().xack(self.stream, self.group, *self._to_ack)
+            self._to_ack.clear()
+
+    # 主循环 -----------------------------------------------------------------
+
+    async def _hold_leadership(self) -> bool:
+        if await self._leader.hold():
+            return True
+        if self._recovered or self._last_sync is not None:
+            # 失去主节点锁，未确认的事件由新的主节点认领
+            self._reset()
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not await self._hold_leadership():
+                    await asyncio.sleep(settings.EVENT_LEADER_TTL / 3)
+                    continue
+                if not self._recovered:
+                    await self._ensure_group()
+                    await self._sync()
+                    await self._recover()
+                    self._recovered = True
+                elif (datetime.utcnow() - self._last_sync).total_seconds() >= settings.EVENT_SYNC_INTERVAL:
+                    await self._sync()
+                await self._fire_due()
+                await self._ack()
+
+                timeout = self._next_timeout()
+                if time.monotonic() < self._paused_until:
+                    await asyncio.sleep(timeout)
+                else:
+                    await self._read(timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"事件触发引擎异常: {str(e)}")
+                await asyncio.sleep(1)
+
+    def _next_timeout(self) -> float:
+        """等待到最早的批次到期、需要续期锁或同步，或暂停结束"""
+        now = time.monotonic()
+        timeout = min(settings.EVENT_LEADER_TTL / 3, settings.EVENT_SYNC_INTERVAL)
+        if now < self._paused_until:
+            return max(0.0, min(timeout, self._paused_until - now))
+        if self._ready:
+            return 0.0
+        if self._heap:
+            timeout = min(timeout, self._heap[0][0] - now)
+        return max(0.0, timeout)
+
+    async def _fire_due(self) -> None:
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, script_id, batch_id = heapq.heappop(self._heap)
+            batch = self._batches.get(script_id)
+            if batch is None or batch.id != batch_id:
+                continue
+            if batch.deadline > now:
+                # 防抖期间又收到事件，推迟到期
+                heapq.heappush(self._heap, (batch.deadline, script_id, batch_id))
+                continue
+            del self._batches[script_id]
+            self._ready.append(batch)
+        if self._ready and now >= self._paused_until:
+            ready, self._ready = self._ready, []
+            await self._fire(ready)
+
+    def _defer(self, batches: List[_Batch]) -> None:
+        """执行队列已满或创建执行失败时延后提交，期间暂停读取事件"""
+        self._ready = batches + self._ready
+        self._paused_until = time.monotonic() + DEFER_SECONDS
+        observe_event_fires("deferred", len(batches))
+
+    async def _fire(self, ready: List[_Batch]) -> None:
+        """为到期的批次批量创建并提交执行"""
+        # 避免循环导入
+        from app.services.script_service import ScriptService
+
+        batches = []
+        for batch in ready:
+            if self._triggers.get(batch.trigger.script_id) is None:
+                # 脚本已停用或删除
+                self._release(batch)
+            else:
+                batches.append(batch)
+
+        capacity = (
+            await distributed_queue.capacity()
+            if settings.EXECUTION_MODE == "distributed"
+            else execution_queue.capacity
+        )
+        if len(batches) > capacity:
+            logger.warning(f"执行队列已满，{len(batches) - capacity} 个事件批次延后 {DEFER_SECONDS} 秒提交")
+            self._defer(batches[capacity:])
+            batches = batches[:capacity]
+
+        async with SessionLocal() as db:
+            service = ScriptService(db)
+            for start in range(0, len(batches), INSERT_CHUNK):
+                chunk = batches[start:start + INSERT_CHUNK]
+                try:
+                    created = (await db.execute(
+                        insert(ScriptExecution).returning(ScriptExecution.id, ScriptExecution.priority),
+                        [
+                            {
+                                "script_id": batch.trigger.script_id,
+                                "execution_id": str(uuid.uuid4()),
+                                "input_parameters": {
+                                    **batch.trigger.input_parameters,
+                                    "events": batch.events,
+                                    "event_count": len(batch.events),
+                                },
+                                "environment_vars": {},
+                                "triggered_by": "event",
+                                "trigger_source": "event",
+                                "priority": batch.trigger.priority,
+                                "status": ExecutionStatus.PENDING,
+                            }
+                            for batch in chunk
+                        ]
+                    )).all()
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"创建事件触发执行失败，{DEFER_SECONDS} 秒后重试: {str(e)}")
+                    self._defer(batches[start:])
+                    return
+                await service.submit_executions([(row.id, row.priority) for row in created])
+                for batch in chunk:
+                    self._release(batch)
+                observe_event_fires("fired", len(chunk))
+                observe_event_batches(len(batch.events) for batch in chunk)
+
+
+event_engine = EventEngine()
@@ -0,0 +1,314 @@
+"""
+执行记录保留与归档
+
+script_executions 按 (脚本, 创建日期) 轮转：超过保留天数的已结束执行按脚本和天
+写入 SCRIPT_STORAGE_PATH/archive 下的 gzip 压缩 NDJSON 文件，再按主键批量删除。
+归档文件在 execution_archives 中登记，archived_executions 记录 execution_id 到归档文件的映射，
+因此归档后的执行仍可通过 execution_id 查询。执行统计读取汇总表，不受归档影响。
+
+保留天数: Script.config.retention_days > EXECUTION_RETENTION_BY_CATEGORY > EXECUTION_RETENTION_DAYS，
+0 表示不归档。
+
+执行输出日志文件（SCRIPT_STORAGE_PATH/logs）与执行记录的保留期一致：归档后随执行记录删除，
+归档任务同时清理执行记录已不存在的日志文件（删除脚本、进程中断等遗留的文件）。
+
+手动执行一次归档:
+
+    python -m app.services.execution_archive run
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Enum, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ExecutionArchive, ArchivedExecution, ExecutionOutput
+from app.services.execution_logs import execution_log_store
+from app.services.execution_stats import FINISHED_STATUSES
+from app.utils.compression import decompress_text
+
+logger = logging.getLogger(__name__)
+
+# 每批读取/删除的执行数
+ARCHIVE_BATCH_SIZE = 500
+
+# 最后修改时间在该时长内的日志文件不清理，避免与刚创建的执行记录竞争
+ORPHAN_LOG_GRACE = timedelta(hours=1)
+
+ARCHIVE_ROOT = Path(settings.SCRIPT_STORAGE_PATH) / "archive" / "executions"
+
+EXECUTION_COLUMNS = list(ScriptExecution.__table__.columns)
+
+# 归档行按列名保存（output / error_message 为解压后的输出），还原时映射回模型属性名
+ATTRIBUTE_NAMES = {
+    column.name: ScriptExecution.__mapper__.get_property_by_column(column).key
+    for column in EXECUTION_COLUMNS
+}
+
+
+def parse_category_retention(value: str) -> Dict[str, int]:
+    """解析分类保留天数配置，格式: "ai=7,ops=30" """
+    retention = {}
+    for item in value.split(","):
+        if "=" in item:
+            category, days = item.split("=", 1)
+            retention[category.strip()] = int(days)
+    return retention
+
+
+CATEGORY_RETENTION = parse_category_retention(settings.EXECUTION_RETENTION_BY_CATEGORY)
+
+
+def get_retention_days(category: Optional[str], config: Optional[Dict[str, Any]]) -> int:
+    """脚本执行记录的保留天数，0 表示不归档"""
+    if (config or {}).get("retention_days") is not None:
+        return int(config["retention_days"])
+    return CATEGORY_RETENTION.get(category, settings.EXECUTION_RETENTION_DAYS)
+
+
+def _day_expression(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("day", ScriptExecution.created_at)
+    return func.date(ScriptExecution.created_at)
+
+
+def _serialize(row: Dict[str, Any]) -> str:
+    compressed = {"output": row.pop("compressed_output"), "error_message": row.pop("compressed_error")}
+    for name, value in compressed.items():
+        if value is not None:
+            row[name] = decompress_text(value)
+    return json.dumps(
+        {name: value.isoformat() if isinstance(value, datetime) else value for name, value in row.items()},
+        ensure_ascii=False,
+        default=str
+    )
+
+
+def _deserialize(line: str) -> ScriptExecution:
+    """把归档行还原为（不属于任何会话的）执行记录对象"""
+    values = json.loads(line)
+    for column in EXECUTION_COLUMNS:
+        value = values.get(column.name)
+        if value is None:
+            continue
+        if isinstance(column.type, DateTime):
+            values[column.name] = datetime.fromisoformat(value)
+        elif isinstance(column.type, Enum):
+            values[column.name] = column.type.enum_class(value)
+    return ScriptExecution(**{ATTRIBUTE_NAMES[name]: values.get(name) for name in ATTRIBUTE_NAMES})
+
+
+async def _expired_days(db: AsyncSession, script_ids: List[int], cutoff: datetime) -> List[Tuple[int, datetime]]:
+    """有早于 cutoff 的已结束执行的 (脚本, 日期)"""
+    day = _day_expression(db).label("day")
+    days = []
+    for start in range(0, len(script_ids), ARCHIVE_BATCH_SIZE):
+        rows = await db.execute(
+            select(ScriptExecution.script_id, day)
+            .where(
+                ScriptExecution.script_id.in_(script_ids[start:start + ARCHIVE_BATCH_SIZE]),
+                ScriptExecution.created_at < cutoff,
+                ScriptExecution.status.in_(FINISHED_STATUSES)
+            )
+            .distinct()
+        )
+        for script_id, value in rows.all():
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            days.append((script_id, value))
+    return sorted(days)
+
+
+def _open_archive(temp: Path):
+    temp.parent.mkdir(parents=True, exist_ok=True)
+    return gzip.open(temp, "wt", encoding="utf-8")
+
+
+def _close_archive(f, temp: Path, path: Path) -> int:
+    f.close()
+    os.replace(temp, path)
+    return path.stat().st_size
+
+
+async def archive_day(db: AsyncSession, script_id: int, day: datetime) -> int:
+    """归档一个脚本一天内的已结束执行，返回归档的执行数"""
+    conditions = [
+        ScriptExecution.script_id == script_id,
+        ScriptExecution.created_at >= day,
+        ScriptExecution.created_at < day + timedelta(days=1),
+        ScriptExecution.status.in_(FINISHED_STATUSES),
+    ]
+    result = await db.stream(
+        select(
+            *EXECUTION_COLUMNS,
+            ExecutionOutput.output.label("compressed_output"),
+            ExecutionOutput.error_message.label("compressed_error")
+        )
+        .outerjoin(ExecutionOutput, ExecutionOutput.id == ScriptExecution.id)
+        .where(*conditions)
+        .order_by(ScriptExecution.id)
+        .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+    )
+    # 每批行直接写入临时归档文件，内存中只保留主键；归档记录在读取结束后创建，文件随后改名
+    ids: List[int] = []
+    execution_ids: List[str] = []
+    directory = ARCHIVE_ROOT / f"{day:%Y/%m}"
+    temp = directory / f"{script_id}-{day:%Y%m%d}-{uuid.uuid4().hex}.tmp"
+    f = None
+    try:
+        async for rows in result.mappings().partitions():
+            if f is None:
+                f = await asyncio.to_thread(_open_archive, temp)
+            lines = []
+            for row in rows:
+                ids.append(row["id"])
+                execution_ids.append(row["execution_id"])
+                lines.append(_serialize(dict(row)) + "\n")
+            await asyncio.to_thread(f.writelines, lines)
+    except Exception:
+        if f is not None:
+            await asyncio.to_thread(f.close)
+            temp.unlink(missing_ok=True)
+        raise
+    if f is None:
+        return 0
+
+    archive = ExecutionArchive(script_id=script_id, day=day, path="", execution_count=len(ids))
+    try:
+        db.add(archive)
+        await db.flush()
+        path = directory / f"{script_id}-{day:%Y%m%d}-{archive.id}.ndjson.gz"
+        archive.path = str(path.relative_to(ARCHIVE_ROOT))
+        archive.size_bytes = await asyncio.to_thread(_close_archive, f, temp, path)
+    except Exception:
+        await db.rollback()
+        await asyncio.to_thread(f.close)
+        temp.unlink(missing_ok=True)
+        raise
+
+    try:
+        await db.execute(
+            insert(ArchivedExecution),
+            [{"execution_id": execution_id, "archive_id": archive.id} for execution_id in execution_ids]
+        )
+        # 只删除已写入归档的记录
+        for start in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+            chunk = ids[start:start + ARCHIVE_BATCH_SIZE]
+            await db.execute(delete(ExecutionOutput).where(ExecutionOutput.id.in_(chunk)))
+            await db.execute(
+                delete(ScriptExecution)
+                .where(ScriptExecution.id.in_(chunk))
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        path.unlink(missing_ok=True)
+        raise
+    # 归档提交后删除这些执行的输出日志文件，归档中保存的是数据库中的（可能已截断的）输出
+    await asyncio.to_thread(execution_log_store.remove, execution_ids)
+    return len(ids)
+
+
+async def archive_expired_executions(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """归档所有超过保留天数的执行，返回归档的执行数"""
+    now = now or datetime.utcnow()
+    scripts = (await db.execute(select(Script.id, Script.category, Script.config))).all()
+
+    by_retention: Dict[int, List[int]] = {}
+    for script_id, category, config in scripts:
+        days = get_retention_days(category, config)
+        if days > 0:
+            by_retention.setdefault(days, []).append(script_id)
+
+    archived = 0
+    for days, script_ids in by_retention.items():
+        cutoff = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        for script_id, day in await _expired_days(db, script_ids, cutoff):
+            try:
+                archived += await archive_day(db, script_id, day)
+            except Exception as e:
+                logger.error(f"归档执行记录失败: 脚本 {script_id} {day:%Y-%m-%d} - {str(e)}")
+    return archived
+
+
+def _read_archive(path: Path, execution_id: str) -> Optional[str]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if execution_id in line and json.loads(line).get("execution_id") == execution_id:
+                return line
+    return None
+
+
+async def load_archived_execution(db: AsyncSession, execution_id: str) -> Optional[ScriptExecution]:
+    """从归档文件读取已归档的执行，不存在时返回None"""
+    archive = await db.scalar(
+        select(ExecutionArchive)
+        .join(ArchivedExecution, ArchivedExecution.archive_id == ExecutionArchive.id)
+        .where(ArchivedExecution.execution_id == execution_id)
+    )
+    if archive is None:
+        return None
+    path = ARCHIVE_ROOT / archive.path
+    try:
+        line = await asyncio.to_thread(_read_archive, path, execution_id)
+    except FileNotFoundError:
+        logger.error(f"归档文件不存在: {path}")
+        return None
+    return _deserialize(line) if line else None
+
+
+async def purge_orphan_logs(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """删除执行记录已不存在的输出日志文件，返回删除的文件数"""
+    modified_before = ((now or datetime.utcnow()) - ORPHAN_LOG_GRACE - datetime(1970, 1, 1)).total_seconds()
+    execution_ids = await asyncio.to_thread(
+        lambda: list(execution_log_store.iter_execution_ids(modified_before))
+    )
+    removed = 0
+    for start in range(0, len(execution_ids), ARCHIVE_BATCH_SIZE):
+        chunk = execution_ids[start:start + ARCHIVE_BATCH_SIZE]
+        existing = set(await db.scalars(
+            select(ScriptExecution.execution_id).where(ScriptExecution.execution_id.in_(chunk))
+        ))
+        orphans = [execution_id for execution_id in chunk if execution_id not in existing]
+        if orphans:
+            removed += await asyncio.to_thread(execution_log_store.remove, orphans)
+    return removed
+
+
+async def run_retention():
+    """定时归档过期的执行记录，并清理没有执行记录的输出日志文件"""
+    async with SessionLocal() as db:
+        archived = await archive_expired_executions(db)
+        removed = await purge_orphan_logs(db)
+    if archived:
+        logger.info(f"归档过期执行记录: {archived} 条")
+    if removed:
+        logger.info(f"清理执行输出日志文件: {removed} 个")
+
+
+async def _main(command: str) -> None:
+    from app.core.database import engine
+
+    if command != "run":
+        raise SystemExit(f"未知命令: {command}")
+    try:
+        await run_retention()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "run"))
@@ -0,0 +1,187 @@
+"""
+运行中执行的登记与取消
+
+每个副本/工作进程登记本进程正在运行的执行（execution_id -> 脚本进程）。
+取消时向脚本进程所在的进程组发送SIGTERM，超过 EXECUTION_CANCEL_GRACE_SECONDS
+仍未退出则SIGKILL整个进程组；进程的终止和回收在后台完成，执行任务立即结束并释放并发槽位。
+
+执行不在本进程运行时，取消请求通过Redis频道转发，由运行该执行的副本或工作进程处理。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+from typing import Any, Awaitable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+CONTROL_CHANNEL = "vss:executions:control"
+
+
+class ExecutionCancelled(Exception):
+    """执行已被取消"""
+
+
+def _signal_group(pid: int, sig: int) -> None:
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def terminate_process_group(process, grace: float) -> None:
+    """终止脚本进程所在的进程组（脚本进程为组长）并等待脚本进程被回收"""
+    _signal_group(process.pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        _signal_group(process.pid, signal.SIGKILL)
+        await process.wait()
+    # 脚本进程退出后组内可能仍有残留的子进程
+    _signal_group(process.pid, signal.SIGKILL)
+
+
+class RunningExecution:
+    """本进程中运行的一个执行"""
+
+    def __init__(self, execution_id: str):
+        self.execution_id = execution_id
+        self.process = None
+        self.cancelled = asyncio.Event()
+
+
+class ExecutionControl:
+    """运行中执行的登记表"""
+
+    def __init__(self, grace: float):
+        self.grace = grace
+        self._running: Dict[str, RunningExecution] = {}
+        self._terminations: Set[asyncio.Task] = set()
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def track(self, execution_id: str) -> RunningExecution:
+        """登记开始运行的执行"""
+        running = self._running[execution_id] = RunningExecution(execution_id)
+        return running
+
+    def untrack(self, execution_id: str) -> None:
+        self._running.pop(execution_id, None)
+
+    def attach(self, execution_id: str, process) -> None:
+        """登记执行的脚本进程，执行已被取消时立即终止"""
+        running = self._running.get(execution_id)
+        if running is None:
+            return
+        running.process = process
+        if running.cancelled.is_set():
+            self._terminate(process)
+
+    def is_cancelled(self, execution_id: str) -> bool:
+        running = self._running.get(execution_id)
+        return running is not None and running.cancelled.is_set()
+
+    def _terminate(self, process) -> None:
+        task = asyncio.create_task(terminate_process_group(process, self.grace))
+        self._terminations.add(task)
+        task.add_done_callback(self._terminations.discard)
+
+    def cancel_local(self, execution_id: str) -> bool:
+        """取消本进程中运行的执行，执行不在本进程时返回False"""
+        running = self._running.get(execution_id)
+        if running is None:
+            return False
+        if not running.cancelled.is_set():
+            running.cancelled.set()
+            if running.process is not None:
+                self._terminate(running.process)
+            logger.info(f"终止运行中的执行: {execution_id}")
+        return True
+
+    async def cancel(self, execution_id: str) -> None:
+        """取消执行，不在本进程运行时转发给其他副本/工作进程"""
+        if self.cancel_local(execution_id) or not settings.EXECUTION_CONTROL_REDIS_ENABLED:
+            return
+        try:
+            await get_redis().publish(
+                CONTROL_CHANNEL,
+                json.dumps({"action": "cancel", "execution_id": execution_id})
+            )
+        except Exception as e:
+            logger.warning(f"转发执行取消请求失败: {execution_id} - {str(e)}")
+
+    async def wait(self, execution_id: str, awaitable: Awaitable[Any], timeout: Optional[float]) -> Any:
+        """
+        等待执行的处理完成。超时抛出 asyncio.TimeoutError；执行被取消时
+        停止等待（取消 awaitable）并抛出 ExecutionCancelled。
+        """
+        task = asyncio.ensure_future(awaitable)
+        running = self._running.get(execution_id)
+        if running is None:
+            return await asyncio.wait_for(task, timeout=timeout)
+
+        cancelled = asyncio.ensure_future(running.cancelled.wait())
+        try:
+            done, _ = await asyncio.wait({task, cancelled}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+        if task in done:
+            return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if not done:
+            raise asyncio.TimeoutError()
+        raise ExecutionCancelled("执行已取消")
+
+    # 跨副本转发 -------------------------------------------------------------
+
+    async def start(self) -> None:
+        """订阅取消请求频道"""
+        if not settings.EXECUTION_CONTROL_REDIS_ENABLED or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = get_redis().pubsub()
+                    await self._pubsub.subscribe(CONTROL_CHANNEL)
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"读取执行控制消息失败: {str(e)}")
+                self._pubsub = None
+                await asyncio.sleep(1)
+                continue
+            if not message or message["type"] != "message":
+                continue
+            try:
+                request = json.loads(message["data"])
+            except ValueError:
+                continue
+            if request.get("action") == "cancel":
+                self.cancel_local(request["execution_id"])
+
+    async def shutdown(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.close()
+            except Exception:
+                pass
+            self._pubsub = None
+        if self._terminations:
+            await asyncio.gather(*self._terminations, return_exceptions=True)
+
+
+execution_control = ExecutionControl(settings.EXECUTION_CANCEL_GRACE_SECONDS)
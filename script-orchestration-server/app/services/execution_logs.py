@@ -0,0 +1,238 @@
+"""
+执行输出日志存储
+
+脚本运行期间输出按块追加写入 `SCRIPT_STORAGE_PATH/logs`，
+每个执行的 stdout/stderr 各对应一个文件，保存完整输出。
+文件在第一次写入时创建，没有输出的流不产生文件；
+执行记录被删除或归档后，对应的日志文件随之删除（见 execution_archive.purge_orphan_logs）。
+"""
+
+import logging
+import os
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Tuple
+
+import aiofiles
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LOG_STREAMS = ("stdout", "stderr")
+
+# 读取日志文件的块大小
+READ_CHUNK_SIZE = 64 * 1024
+
+# 数据落盘后的回调，参数为(写入前的文件偏移, 数据)
+FlushListener = Callable[[int, bytes], Awaitable[None]]
+
+
+class ExecutionLogWriter:
+    """单个输出流的分块写入器"""
+
+    def __init__(
+        self,
+        path: Path,
+        flush_bytes: int,
+        flush_interval: float,
+        listener: Optional[FlushListener] = None
+    ):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.listener = listener
+        self.bytes_written = 0
+        self._pending = bytearray()
+        self._last_flush = time.monotonic()
+        self._file = None
+
+    async def __aenter__(self) -> "ExecutionLogWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def write(self, data: bytes) -> None:
+        """追加数据，达到块大小或刷新间隔时写入存储"""
+        self._pending += data
+        if (
+            len(self._pending) >= self.flush_bytes
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._pending:
+            if self._file is None:
+                # 第一次写入时才创建文件
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = await aiofiles.open(self.path, "ab")
+            data = bytes(self._pending)
+            self._pending.clear()
+            await self._file.write(data)
+            await self._file.flush()
+            offset = self.bytes_written
+            self.bytes_written += len(data)
+            if self.listener is not None:
+                await self.listener(offset, data)
+        self._last_flush = time.monotonic()
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            if self._file is not None:
+                await self._file.close()
+                self._file = None
+
+
+class ExecutionLogStore:
+    """执行输出日志存储"""
+
+    def __init__(self, root: str):
+        self.root = Path(root) / "logs"
+
+    def get_path(self, execution_id: str, stream: str) -> Path:
+        """获取执行输出日志文件路径"""
+        if stream not in LOG_STREAMS:
+            raise ValueError(f"无效的输出流: {stream}")
+        return self.root / execution_id[:2] / f"{execution_id}.{stream}.log"
+
+    def open_writer(
+        self,
+        execution_id: str,
+        stream: str,
+        listener: Optional[FlushListener] = None
+    ) -> ExecutionLogWriter:
+        """打开输出流写入器"""
+        return ExecutionLogWriter(
+            self.get_path(execution_id, stream),
+            flush_bytes=settings.SCRIPT_OUTPUT_FLUSH_BYTES,
+            flush_interval=settings.SCRIPT_OUTPUT_FLUSH_INTERVAL,
+            listener=listener
+        )
+
+    async def read_range(
+        self,
+        execution_id: str,
+        stream: str,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, bytes]]:
+        """按块读取 [start, end) 范围的输出，返回(偏移, 数据)"""
+        path = self.get_path(execution_id, stream)
+        if not path.exists():
+            return
+
+        async with aiofiles.open(path, "rb") as f:
+            await f.seek(start)
+            offset = start
+            while end is None or offset < end:
+                size = READ_CHUNK_SIZE if end is None else min(READ_CHUNK_SIZE, end - offset)
+                data = await f.read(size)
+                if not data:
+                    break
+                yield offset, data
+                offset += len(data)
+
+    def remove(self, execution_ids: Iterable[str]) -> int:
+        """删除执行的输出日志文件，返回删除的文件数"""
+        removed = 0
+        for execution_id in execution_ids:
+            for stream in LOG_STREAMS:
+                try:
+                    self.get_path(execution_id, stream).unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def iter_execution_ids(self, modified_before: float) -> Iterator[str]:
+        """遍历日志文件最后修改时间早于 modified_before 的执行ID"""
+        if not self.root.exists():
+            return
+        for directory in self.root.iterdir():
+            if not directory.is_dir():
+                continue
+            execution_ids = set()
+            for path in directory.glob("*.log"):
+                try:
+                    if path.stat().st_mtime < modified_before:
+                        execution_ids.add(path.name.split(".", 1)[0])
+                except FileNotFoundError:
+                    continue
+            yield from sorted(execution_ids)
+
+    def get_size(self, execution_id: str, stream: str) -> int:
+        """获取已写入存储的字节数"""
+        try:
+            return os.path.getsize(self.get_path(execution_id, stream))
+        except FileNotFoundError:
+            return 0
+
+
+execution_log_store = ExecutionLogStore(settings.SCRIPT_STORAGE_PATH)
+
+
+class ExecutionOutputReader:
+    """
+    按字节范围读取一个输出流：日志文件存在时从文件读取，
+    否则读取内存中的输出（数据库或归档中保存的 output / error_message）。
+    大小在创建时确定，执行仍在运行时之后追加的输出不在读取范围内。
+    """
+
+    def __init__(self, execution_id: Optional[str], stream: str, data: Optional[bytes] = None):
+        self.execution_id = execution_id
+        self.stream = stream
+        self.data = data
+        self.size = len(data) if data is not None else execution_log_store.get_size(execution_id, stream)
+
+    async def iter_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """按块读取 [start, end)"""
+        if self.data is not None:
+            for offset in range(start, end, READ_CHUNK_SIZE):
+                yield self.data[offset:min(offset + READ_CHUNK_SIZE, end)]
+            return
+        async for _, data in execution_log_store.read_range(self.execution_id, self.stream, start, end):
+            yield data
+
+    async def read(self, start: int, end: int) -> bytes:
+        return b"".join([data async for data in self.iter_range(start, end)])
+
+    async def tail_offset(self, lines: int) -> int:
+        """最后 lines 行的起始偏移，从末尾按块向前查找换行符"""
+        if self.size == 0:
+            return 0
+        # 以换行结尾时最后一个换行符不算作一行的开始
+        remaining = lines + (1 if await self.read(self.size - 1, self.size) == b"\n" else 0)
+        end = self.size
+        while end > 0:
+            start = max(0, end - READ_CHUNK_SIZE)
+            data = await self.read(start, end)
+            index = len(data)
+            while True:
+                index = data.rfind(b"\n", 0, index)
+                if index < 0:
+                    break
+                remaining -= 1
+                if remaining == 0:
+                    return start + index + 1
+            end = start
+        return 0
+
+    async def head_end(self, lines: int) -> int:
+        """前 lines 行的结束偏移（含换行符），从开头按块查找换行符"""
+        remaining = lines
+        start = 0
+        async for data in self.iter_range(0, self.size):
+            index = -1
+            while True:
+                index = data.find(b"\n", index + 1)
+                if index < 0:
+                    break
+                remaining -= 1
+                if remaining == 0:
+                    return start + index + 1
+            start += len(data)
+        return self.size
@@ -0,0 +1,56 @@
+"""
+执行输出存储
+
+执行的 output / error_message 以gzip压缩后保存在 execution_outputs 表，与执行记录一对一。
+列表查询只读取 script_executions，不加载输出；详情查询通过 OUTPUT_LOAD_OPTIONS 显式加载。
+此前版本写在 script_executions.output / error_message 中的输出仍按原样读取。
+"""
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, undefer
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.script import ScriptExecution, ExecutionOutput
+from app.utils.compression import compress_text
+
+# 加载执行输出的查询选项
+OUTPUT_LOAD_OPTIONS = (
+    selectinload(ScriptExecution.output_record),
+    undefer(ScriptExecution.legacy_output),
+    undefer(ScriptExecution.legacy_error_message),
+)
+
+
+async def save_execution_output(
+    db: AsyncSession,
+    execution: ScriptExecution,
+    output: Optional[str] = None,
+    error_message: Optional[str] = None
+) -> None:
+    """保存（覆盖）执行输出，随调用方的事务提交"""
+    if execution.id is None:
+        await db.flush()
+    record = await db.merge(ExecutionOutput(
+        id=execution.id,
+        output=compress_text(output),
+        error_message=compress_text(error_message)
+    ))
+    # 关联到执行对象，之后读取 execution.output 无需再查询
+    set_committed_value(execution, "output_record", record)
+
+
+async def insert_execution_outputs(db: AsyncSession, outputs: List[Dict[str, Any]]) -> None:
+    """批量写入新执行的输出，outputs 每项包含 id / output / error_message"""
+    if not outputs:
+        return
+    await db.execute(insert(ExecutionOutput), [
+        {
+            "id": item["id"],
+            "output": compress_text(item.get("output")),
+            "error_message": compress_text(item.get("error_message")),
+        }
+        for item in outputs
+    ])
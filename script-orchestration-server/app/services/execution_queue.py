@@ -0,0 +1,176 @@
+"""
+执行准入队列
+
+所有脚本执行先进入按优先级排序的等待队列，同时运行的执行数不超过
+`MAX_CONCURRENT_SCRIPTS`。队列已满时拒绝新的执行并给出建议的重试时间。
+执行在获得运行槽位前保持 PENDING 状态。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 用于统计等待时间分位数的最近样本数
+WAIT_TIME_SAMPLES = 1000
+
+
+class QueueFullError(Exception):
+    """执行队列已满"""
+
+    def __init__(self, depth: int, retry_after: int):
+        self.depth = depth
+        self.retry_after = retry_after
+        super().__init__(f"执行队列已满(当前排队: {depth})，请在 {retry_after} 秒后重试")
+
+
+class _QueuedExecution:
+    """队列中的一个执行"""
+
+    __slots__ = ("execution_id", "priority", "runner", "enqueued_at")
+
+    def __init__(self, execution_id: int, priority: int, runner: Callable[[], Awaitable[Any]]):
+        self.execution_id = execution_id
+        self.priority = priority
+        self.runner = runner
+        self.enqueued_at = time.monotonic()
+
+
+class ExecutionQueue:
+    """带优先级和容量限制的执行队列"""
+
+    def __init__(self, max_concurrency: int, max_depth: int):
+        self.max_concurrency = max_concurrency
+        self.max_depth = max_depth
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._removed: Set[int] = set()
+        self._reserved = 0
+        self._running: Dict[int, asyncio.Task] = {}
+        self._wait_times: deque = deque(maxlen=WAIT_TIME_SAMPLES)
+        self._avg_runtime = 0.0
+        self.total_submitted = 0
+        self.total_rejected = 0
+        self.total_completed = 0
+
+    @property
+    def depth(self) -> int:
+        """排队中（含已预留）的执行数"""
+        return len(self._heap) - len(self._removed) + self._reserved
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    @property
+    def capacity(self) -> int:
+        """还能排队的执行数"""
+        return max(0, self.max_depth - self.depth)
+
+    def _retry_after(self) -> int:
+        """按平均运行时间估算队列腾出位置所需的秒数"""
+        runtime = self._avg_runtime or 1.0
+        return max(1, math.ceil(runtime * (self.depth - self.max_depth + 1) / self.max_concurrency))
+
+    def reserve(self) -> None:
+        """预留一个排队位置，队列已满时抛出 QueueFullError"""
+        if self.depth >= self.max_depth:
+            self.total_rejected += 1
+            raise QueueFullError(self.depth, self._retry_after())
+        self._reserved += 1
+
+    def release_reservation(self) -> None:
+        """释放未使用的预留位置"""
+        self._reserved = max(0, self._reserved - 1)
+
+    def submit(
+        self,
+        execution_id: int,
+        priority: int,
+        runner: Callable[[], Awaitable[Any]],
+        reserved: bool = False
+    ) -> None:
+        """提交执行，优先级数值越大越先执行"""
+        if reserved:
+            self.release_reservation()
+        elif self.depth >= self.max_depth:
+            self.total_rejected += 1
+            raise QueueFullError(self.depth, self._retry_after())
+
+        item = _QueuedExecution(execution_id, priority, runner)
+        heapq.heappush(self._heap, (-priority, next(self._sequence), item))
+        self.total_submitted += 1
+        self._dispatch()
+
+    def remove(self, execution_id: int) -> bool:
+        """从等待队列中移除尚未开始的执行"""
+        if execution_id in self._running or execution_id in self._removed:
+            return False
+        if any(entry[2].execution_id == execution_id for entry in self._heap):
+            self._removed.add(execution_id)
+            return True
+        return False
+
+    def _dispatch(self) -> None:
+        while self._heap and len(self._running) < self.max_concurrency:
+            _, _, item = heapq.heappop(self._heap)
+            if item.execution_id in self._removed:
+                self._removed.discard(item.execution_id)
+                continue
+            self._wait_times.append(time.monotonic() - item.enqueued_at)
+            task = asyncio.create_task(self._run(item))
+            self._running[item.execution_id] = task
+
+    async def _run(self, item: _QueuedExecution) -> None:
+        started_at = time.monotonic()
+        try:
+            await item.runner()
+        except Exception as e:
+            logger.error(f"执行任务异常: {item.execution_id} - {str(e)}")
+        finally:
+            runtime = time.monotonic() - started_at
+            self._avg_runtime = runtime if not self._avg_runtime else self._avg_runtime * 0.9 + runtime * 0.1
+            self.total_completed += 1
+            self._running.pop(item.execution_id, None)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """队列统计信息"""
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3)
+
+        return {
+            "depth": self.depth,
+            "running": self.running,
+            "max_concurrency": self.max_concurrency,
+            "max_depth": self.max_depth,
+            "total_submitted": self.total_submitted,
+            "total_rejected": self.total_rejected,
+            "total_completed": self.total_completed,
+            "avg_runtime": round(self._avg_runtime, 3),
+            "wait_time": {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 3) if waits else None,
+            },
+        }
+
+
+execution_queue = ExecutionQueue(
+    max_concurrency=settings.MAX_CONCURRENT_SCRIPTS,
+    max_depth=settings.EXECUTION_QUEUE_MAX_DEPTH
+)
@@ -0,0 +1,217 @@
+"""
+失败执行的自动重试
+
+失败(FAILED)的执行按脚本的 max_retries / retry_delay 创建新的重试执行（retry_of 指向最初的执行，
+attempt 为重试次数），等待时间按指数退避并加随机抖动。重试执行在到期前保持 PENDING 且不进入执行队列，
+不占用运行槽位；到期后由 RetryScheduler 提交到执行队列。超出资源限制(oom / cpu_limit / file_limit)
+和取消的执行不重试。
+
+每个脚本在 RETRY_BUDGET_WINDOW 秒内最多创建 RETRY_BUDGET 个重试（Script.config.retry_budget 覆盖），
+防止下游故障时重试挤满执行队列。
+
+等待中的重试保存在数据库中（retry_at），RetryScheduler 在本进程内按到期时间提交，
+并定期检查所有到期的重试，因此创建重试的进程退出后仍会被其他进程提交；
+提交前以条件更新认领，多个进程不会重复提交同一重试。
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ExecutionStatus
+from app.services.execution_queue import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# 一次兜底检查最多提交的到期重试数
+RETRY_POLL_BATCH_SIZE = 100
+
+
+def compute_retry_delay(retry_delay: int, attempt: int) -> float:
+    """第 attempt 次重试的等待秒数: retry_delay * 2^(attempt-1)，不超过 RETRY_MAX_DELAY，加 ±RETRY_JITTER 抖动"""
+    delay = min(settings.RETRY_MAX_DELAY, retry_delay * 2 ** (attempt - 1))
+    return max(0.0, delay * random.uniform(1 - settings.RETRY_JITTER, 1 + settings.RETRY_JITTER))
+
+
+def get_retry_budget(script: Script) -> int:
+    """脚本在 RETRY_BUDGET_WINDOW 内最多创建的重试数"""
+    return int((script.config or {}).get("retry_budget", settings.RETRY_BUDGET))
+
+
+async def _retry_budget_available(db: AsyncSession, script: Script) -> bool:
+    since = datetime.utcnow() - timedelta(seconds=settings.RETRY_BUDGET_WINDOW)
+    used = await db.scalar(
+        select(func.count())
+        .select_from(ScriptExecution)
+        .where(
+            ScriptExecution.script_id == script.id,
+            ScriptExecution.created_at >= since,
+            ScriptExecution.retry_of.isnot(None)
+        )
+    )
+    return used < get_retry_budget(script)
+
+
+async def create_retry(db: AsyncSession, script: Script, execution: ScriptExecution) -> Optional[ScriptExecution]:
+    """为失败的执行创建等待中的重试执行，不需要重试时返回None"""
+    attempt = (execution.attempt or 0) + 1
+    if execution.status != ExecutionStatus.FAILED or attempt > (script.max_retries or 0):
+        return None
+    if not await _retry_budget_available(db, script):
+        logger.warning(f"脚本重试次数超出预算，不再重试: {script.name} (执行ID: {execution.execution_id})")
+        return None
+
+    retry_at = datetime.utcnow() + timedelta(seconds=compute_retry_delay(script.retry_delay or 0, attempt))
+    retry = ScriptExecution(
+        script_id=execution.script_id,
+        execution_id=str(uuid.uuid4()),
+        input_parameters=execution.input_parameters,
+        environment_vars=execution.environment_vars,
+        triggered_by=execution.triggered_by,
+        trigger_source="retry",
+        priority=execution.priority,
+        status=ExecutionStatus.PENDING,
+        retry_of=execution.retry_of or execution.execution_id,
+        attempt=attempt,
+        retry_at=retry_at
+    )
+    db.add(retry)
+    await db.commit()
+    logger.info(
+        f"脚本执行失败，{retry_at:%H:%M:%S} 后第 {attempt} 次重试: {script.name} "
+        f"(执行ID: {retry.execution_id}, 原执行ID: {retry.retry_of})"
+    )
+    return retry
+
+
+class RetryScheduler:
+    """按到期时间提交等待中的重试执行"""
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, execution: ScriptExecution) -> None:
+        """登记本进程创建的重试执行"""
+        heapq.heappush(self._heap, (execution.retry_at, execution.id))
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while True:
+            if loop.time() >= next_poll:
+                await self._poll_due()
+                next_poll = loop.time() + self.poll_interval
+
+            now = datetime.utcnow()
+            while self._heap and self._heap[0][0] <= now:
+                _, execution_id = heapq.heappop(self._heap)
+                await self._submit(execution_id)
+
+            timeout = next_poll - loop.time()
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_due(self) -> None:
+        """提交所有到期的重试（包括其他进程创建后未能提交的）"""
+        try:
+            async with SessionLocal() as db:
+                due = (await db.scalars(
+                    select(ScriptExecution.id)
+                    .where(
+                        ScriptExecution.status == ExecutionStatus.PENDING,
+                        ScriptExecution.retry_at <= datetime.utcnow()
+                    )
+                    .order_by(ScriptExecution.retry_at)
+                    .limit(RETRY_POLL_BATCH_SIZE)
+                )).all()
+        except Exception as e:
+            logger.error(f"查询到期重试失败: {str(e)}")
+            return
+        for execution_id in due:
+            await self._submit(execution_id)
+
+    async def _submit(self, execution_id: int) -> None:
+        # 避免循环导入
+        from app.services.script_service import ScriptService
+
+        try:
+            async with SessionLocal() as db:
+                # 认领：只有一个进程能把 retry_at 置空；已取消的重试不再提交
+                claimed = await db.execute(
+                    update(ScriptExecution)
+                    .where(
+                        ScriptExecution.id == execution_id,
+                        ScriptExecution.status == ExecutionStatus.PENDING,
+                        ScriptExecution.retry_at.isnot(None)
+                    )
+                    .values(retry_at=None)
+                )
+                if claimed.rowcount == 0:
+                    await db.rollback()
+                    return
+                await db.commit()
+
+                try:
+                    execution = await db.get(ScriptExecution, execution_id)
+                    await ScriptService(db).submit_execution(execution)
+                except QueueFullError as e:
+                    # 队列已满时推迟提交
+                    await self._defer(execution_id, e.retry_after)
+                except Exception as e:
+                    # 提交失败时恢复 retry_at，稍后再次提交（分发失败已被标记为失败的执行除外）
+                    logger.error(f"提交重试执行失败: {execution_id} - {str(e)}")
+                    await self._defer(execution_id, self.poll_interval)
+        except Exception as e:
+            logger.error(f"提交重试执行失败: {execution_id} - {str(e)}")
+
+    async def _defer(self, execution_id: int, delay: float) -> None:
+        """把已认领但未能提交的重试恢复为等待状态"""
+        retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        async with SessionLocal() as db:
+            restored = await db.execute(
+                update(ScriptExecution)
+                .where(
+                    ScriptExecution.id == execution_id,
+                    ScriptExecution.status == ExecutionStatus.PENDING,
+                    ScriptExecution.retry_at.is_(None)
+                )
+                .values(retry_at=retry_at)
+            )
+            await db.commit()
+        if restored.rowcount:
+            heapq.heappush(self._heap, (retry_at, execution_id))
+            self._wakeup.set()
+
+
+retry_scheduler = RetryScheduler(settings.RETRY_POLL_INTERVAL)
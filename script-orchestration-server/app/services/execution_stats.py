@@ -0,0 +1,408 @@
+"""
+执行统计汇总
+
+执行结束时按小时和天两种粒度、按脚本和全局(script_id=0)累加计数，
+统计接口读取汇总表而不是扫描 script_executions。
+执行按结束时间分桶；时间窗口按桶边界对齐，因此是近似窗口。
+
+从原始执行记录重建汇总:
+
+    python -m app.services.execution_stats rebuild
+
+已归档的执行不在 script_executions 中，重建时保留各脚本最后归档日之前的汇总行，
+只重新计算之后的桶；全局汇总由各脚本的汇总行合并得到。跨越归档边界的执行
+（归档日创建、之后结束）不会被重新计入。
+"""
+
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.script import Script, ScriptExecution, ExecutionArchive, ExecutionStatsRollup
+from app.schemas.script import ExecutionStatus, FAILED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCRIPT_ID = 0
+
+GRANULARITIES = ("hour", "day")
+
+# 时间窗口 -> (时长, 使用的分桶粒度)
+WINDOWS = {
+    "1h": (timedelta(hours=1), "hour"),
+    "24h": (timedelta(hours=24), "hour"),
+    "7d": (timedelta(days=7), "day"),
+}
+
+FINISHED_STATUSES = [
+    ExecutionStatus.SUCCESS,
+    *FAILED_STATUSES,
+    ExecutionStatus.CANCELLED,
+]
+
+COUNTER_COLUMNS = (
+    "total", "success", "failed", "cancelled", "duration_sum", "duration_ms_sum", "duration_count",
+    "resource_count", "cpu_ms_sum", "io_blocks_sum",
+)
+# 按最大值合并的列
+MAX_COLUMNS = ("max_rss_kb",)
+
+# 资源排行的排序字段 -> 汇总表达式
+RESOURCE_ORDERINGS = {
+    "cpu": func.sum(ExecutionStatsRollup.cpu_ms_sum),
+    "io": func.sum(ExecutionStatsRollup.io_blocks_sum),
+    "rss": func.max(ExecutionStatsRollup.max_rss_kb),
+    "executions": func.sum(ExecutionStatsRollup.total),
+}
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """时间所在桶的起始时间"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _duration_ms(execution: ScriptExecution) -> int:
+    # 旧版本的执行只记录了秒
+    return execution.duration_ms if execution.duration_ms is not None else execution.duration * 1000
+
+
+def execution_counters(execution: ScriptExecution) -> Dict[str, int]:
+    """单个已结束执行对各计数列的增量（max_rss_kb 为取最大值）"""
+    success = execution.status == ExecutionStatus.SUCCESS
+    # 命中结果缓存的执行没有实际运行，不计入平均耗时
+    has_duration = success and execution.duration is not None and not execution.cached_from
+    has_resources = execution.cpu_user_ms is not None
+    return {
+        "total": 1,
+        "success": int(success),
+        "failed": int(execution.status in FAILED_STATUSES),
+        "cancelled": int(execution.status == ExecutionStatus.CANCELLED),
+        "duration_sum": execution.duration if has_duration else 0,
+        "duration_ms_sum": _duration_ms(execution) if has_duration else 0,
+        "duration_count": int(has_duration),
+        "resource_count": int(has_resources),
+        "cpu_ms_sum": (execution.cpu_user_ms + (execution.cpu_system_ms or 0)) if has_resources else 0,
+        "io_blocks_sum": ((execution.io_read_blocks or 0) + (execution.io_write_blocks or 0)) if has_resources else 0,
+        "max_rss_kb": execution.max_rss_kb or 0,
+    }
+
+
+def _insert(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(ExecutionStatsRollup)
+    return sqlite.insert(ExecutionStatsRollup)
+
+
+def _greatest(db: AsyncSession, *values):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.greatest(*values)
+    return func.max(*values)
+
+
+async def record_execution(db: AsyncSession, execution: ScriptExecution) -> None:
+    """把已结束的执行累加到汇总表，失败只记录日志，不影响执行本身"""
+    await record_executions(db, [execution])
+
+
+async def record_executions(db: AsyncSession, executions: List[ScriptExecution]) -> None:
+    """批量累加已结束的执行，同一汇总行的增量先合并，只执行一次写入"""
+    merged: Dict[tuple, Dict[str, int]] = {}
+    for execution in executions:
+        if execution.status not in FINISHED_STATUSES:
+            continue
+        counters = execution_counters(execution)
+        finished_at = execution.end_time or datetime.utcnow()
+        for granularity in GRANULARITIES:
+            for script_id in (execution.script_id, GLOBAL_SCRIPT_ID):
+                key = (granularity, script_id, bucket_start(finished_at, granularity))
+                totals = merged.setdefault(key, dict.fromkeys(COUNTER_COLUMNS + MAX_COLUMNS, 0))
+                for column in COUNTER_COLUMNS:
+                    totals[column] += counters[column]
+                for column in MAX_COLUMNS:
+                    totals[column] = max(totals[column], counters[column])
+    if not merged:
+        return
+
+    try:
+        rows = [
+            {
+                "granularity": granularity,
+                "script_id": script_id,
+                "bucket_start": start,
+                "updated_at": datetime.utcnow(),
+                **totals,
+            }
+            for (granularity, script_id, start), totals in merged.items()
+        ]
+
+        stmt = _insert(db).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "script_id", "bucket_start"],
+            set_={
+                **{column: getattr(ExecutionStatsRollup, column) + getattr(stmt.excluded, column)
+                   for column in COUNTER_COLUMNS},
+                **{column: _greatest(db, getattr(ExecutionStatsRollup, column), getattr(stmt.excluded, column))
+                   for column in MAX_COLUMNS},
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+        await db.execute(stmt)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        ids = ", ".join(execution.execution_id for execution in executions[:3])
+        logger.warning(f"更新执行统计失败: {ids}{' 等' if len(executions) > 3 else ''} - {str(e)}")
+
+
+async def get_rollup_summary(
+    db: AsyncSession,
+    window: Optional[str] = None,
+    script_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """读取汇总统计，window 为空时统计全部历史"""
+    duration, granularity = WINDOWS.get(window, (None, "day"))
+    conditions = [
+        ExecutionStatsRollup.granularity == granularity,
+        ExecutionStatsRollup.script_id == (script_id or GLOBAL_SCRIPT_ID),
+    ]
+    since = None
+    if duration is not None:
+        since = bucket_start(datetime.utcnow() - duration, granularity)
+        conditions.append(ExecutionStatsRollup.bucket_start >= since)
+
+    totals = (await db.execute(
+        select(
+            *[func.coalesce(func.sum(getattr(ExecutionStatsRollup, column)), 0) for column in COUNTER_COLUMNS],
+            *[func.coalesce(func.max(getattr(ExecutionStatsRollup, column)), 0) for column in MAX_COLUMNS]
+        )
+        .where(*conditions)
+    )).one()
+    summary = dict(zip(COUNTER_COLUMNS + MAX_COLUMNS, (int(value) for value in totals)))
+    summary["since"] = since
+
+    if window:
+        rows = (await db.execute(
+            select(ExecutionStatsRollup).where(*conditions).order_by(ExecutionStatsRollup.bucket_start)
+        )).scalars().all()
+        summary["timeline"] = [
+            {
+                "bucket_start": row.bucket_start,
+                "total": row.total,
+                "success": row.success,
+                "failed": row.failed,
+                "cancelled": row.cancelled,
+            }
+            for row in rows
+        ]
+    return summary
+
+
+async def get_resource_ranking(
+    db: AsyncSession,
+    window: Optional[str] = None,
+    order_by: str = "cpu",
+    limit: int = 10
+) -> List[Dict[str, Any]]:
+    """按资源使用排序的脚本排行，window 为空时统计全部历史"""
+    duration, granularity = WINDOWS.get(window, (None, "day"))
+    conditions = [
+        ExecutionStatsRollup.granularity == granularity,
+        ExecutionStatsRollup.script_id != GLOBAL_SCRIPT_ID,
+    ]
+    if duration is not None:
+        conditions.append(ExecutionStatsRollup.bucket_start >= bucket_start(datetime.utcnow() - duration, granularity))
+
+    rows = await db.execute(
+        select(
+            ExecutionStatsRollup.script_id,
+            Script.name,
+            RESOURCE_ORDERINGS["executions"],
+            func.sum(ExecutionStatsRollup.resource_count),
+            RESOURCE_ORDERINGS["cpu"],
+            RESOURCE_ORDERINGS["io"],
+            RESOURCE_ORDERINGS["rss"],
+        )
+        .outerjoin(Script, Script.id == ExecutionStatsRollup.script_id)
+        .where(*conditions)
+        .group_by(ExecutionStatsRollup.script_id, Script.name)
+        .order_by(RESOURCE_ORDERINGS[order_by].desc(), ExecutionStatsRollup.script_id)
+        .limit(limit)
+    )
+    ranking = []
+    for script_id, name, total, measured, cpu_ms, io_blocks, max_rss_kb in rows.all():
+        measured = int(measured or 0)
+        ranking.append({
+            "script_id": script_id,
+            "script_name": name,
+            "executions": int(total or 0),
+            "measured_executions": measured,
+            "cpu_ms": int(cpu_ms or 0),
+            "avg_cpu_ms": round(int(cpu_ms or 0) / measured, 2) if measured else 0,
+            "io_blocks": int(io_blocks or 0),
+            "max_rss_kb": int(max_rss_kb or 0),
+        })
+    return ranking
+
+
+def _bucket_expression(db: AsyncSession, granularity: str):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(granularity, ScriptExecution.end_time)
+    fmt = "%Y-%m-%d %H:00:00" if granularity == "hour" else "%Y-%m-%d 00:00:00"
+    return func.strftime(fmt, ScriptExecution.end_time)
+
+
+async def _archived_until(db: AsyncSession) -> Dict[int, datetime]:
+    """各脚本归档覆盖的截止时间（最后归档日的次日零点）"""
+    result = await db.execute(
+        select(ExecutionArchive.script_id, func.max(ExecutionArchive.day)).group_by(ExecutionArchive.script_id)
+    )
+    archived_until = {}
+    for script_id, day in result.all():
+        if isinstance(day, str):
+            day = datetime.fromisoformat(day)
+        archived_until[script_id] = bucket_start(day, "day") + timedelta(days=1)
+    return archived_until
+
+
+async def _archived_rollups(db: AsyncSession, archived_until: Dict[int, datetime]) -> List[Dict[str, Any]]:
+    """归档截止时间之前的脚本汇总行，重建时原样保留"""
+    if not archived_until:
+        return []
+    columns = COUNTER_COLUMNS + MAX_COLUMNS
+    result = await db.execute(
+        select(
+            ExecutionStatsRollup.granularity,
+            ExecutionStatsRollup.script_id,
+            ExecutionStatsRollup.bucket_start,
+            *(getattr(ExecutionStatsRollup, column) for column in columns)
+        )
+        .where(ExecutionStatsRollup.script_id.in_(list(archived_until)))
+    )
+    rows = []
+    for granularity, script_id, start, *counters in result.all():
+        if start < archived_until[script_id]:
+            rows.append({
+                "granularity": granularity,
+                "script_id": script_id,
+                "bucket_start": start,
+                "updated_at": datetime.utcnow(),
+                **dict(zip(columns, (int(value or 0) for value in counters))),
+            })
+    return rows
+
+
+def _global_rollups(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """合并脚本汇总行得到全局汇总行"""
+    merged: Dict[tuple, Dict[str, int]] = {}
+    for row in rows:
+        totals = merged.setdefault(
+            (row["granularity"], row["bucket_start"]), dict.fromkeys(COUNTER_COLUMNS + MAX_COLUMNS, 0)
+        )
+        for column in COUNTER_COLUMNS:
+            totals[column] += row[column]
+        for column in MAX_COLUMNS:
+            totals[column] = max(totals[column], row[column])
+    return [
+        {
+            "granularity": granularity,
+            "script_id": GLOBAL_SCRIPT_ID,
+            "bucket_start": start,
+            "updated_at": datetime.utcnow(),
+            **totals,
+        }
+        for (granularity, start), totals in merged.items()
+    ]
+
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """按原始执行记录重新计算全部汇总，返回写入的汇总行数"""
+    success = ExecutionStatus.SUCCESS
+    has_duration = (
+        (ScriptExecution.status == success)
+        & ScriptExecution.duration.isnot(None)
+        & ScriptExecution.cached_from.is_(None)
+    )
+    has_resources = ScriptExecution.cpu_user_ms.isnot(None)
+    aggregates = [
+        func.count(),
+        func.sum(case((ScriptExecution.status == success, 1), else_=0)),
+        func.sum(case((ScriptExecution.status.in_(FAILED_STATUSES), 1), else_=0)),
+        func.sum(case((ScriptExecution.status == ExecutionStatus.CANCELLED, 1), else_=0)),
+        func.sum(case((has_duration, ScriptExecution.duration), else_=0)),
+        func.sum(case(
+            (has_duration, func.coalesce(ScriptExecution.duration_ms, ScriptExecution.duration * 1000)),
+            else_=0
+        )),
+        func.sum(case((has_duration, 1), else_=0)),
+        func.sum(case((has_resources, 1), else_=0)),
+        func.sum(case(
+            (has_resources, ScriptExecution.cpu_user_ms + func.coalesce(ScriptExecution.cpu_system_ms, 0)),
+            else_=0
+        )),
+        func.sum(case(
+            (has_resources, func.coalesce(ScriptExecution.io_read_blocks, 0)
+             + func.coalesce(ScriptExecution.io_write_blocks, 0)),
+            else_=0
+        )),
+        func.max(func.coalesce(ScriptExecution.max_rss_kb, 0)),
+    ]
+    finished = [
+        ScriptExecution.status.in_(FINISHED_STATUSES),
+        ScriptExecution.end_time.isnot(None),
+    ]
+
+    archived_until = await _archived_until(db)
+    rows = await _archived_rollups(db, archived_until)
+    for granularity in GRANULARITIES:
+        bucket = _bucket_expression(db, granularity).label("bucket")
+        result = await db.execute(
+            select(ScriptExecution.script_id, bucket, *aggregates)
+            .where(*finished)
+            .group_by(ScriptExecution.script_id, bucket)
+        )
+        for script_id, start, *counters in result.all():
+            if isinstance(start, str):
+                start = datetime.fromisoformat(start)
+            if script_id in archived_until and start < archived_until[script_id]:
+                continue
+            rows.append({
+                "granularity": granularity,
+                "script_id": script_id,
+                "bucket_start": start,
+                "updated_at": datetime.utcnow(),
+                **dict(zip(COUNTER_COLUMNS + MAX_COLUMNS, (int(value or 0) for value in counters))),
+            })
+    rows += _global_rollups(rows)
+
+    await db.execute(delete(ExecutionStatsRollup))
+    if rows:
+        await db.execute(_insert(db), rows)
+    await db.commit()
+    return len(rows)
+
+
+async def _main(command: str) -> None:
+    from app.core.database import SessionLocal, engine
+
+    if command != "rebuild":
+        raise SystemExit(f"未知命令: {command}")
+    try:
+        async with SessionLocal() as db:
+            count = await rebuild_rollups(db)
+        logger.info(f"执行统计汇总已重建: {count} 行")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "rebuild"))
@@ -0,0 +1,464 @@
+"""
+Python脚本 fork-server 执行后端
+
+每种语言运行时常驻一个zygote进程，启动时预先导入常用模块；
+每次执行由zygote fork出独立子进程运行脚本，省去解释器冷启动和重复导入的开销。
+
+子进程拥有独立PID、独立会话(setsid)和独立环境变量，超时/终止语义与
+asyncio.subprocess.Process保持一致。
+"""
+
+import asyncio
+import errno
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.child_process import rusage_to_dict
+from app.services.resource_limits import apply_limits
+
+logger = logging.getLogger(__name__)
+
+# 服务根目录，zygote以 `python -m app.services.forkserver` 方式启动
+APP_ROOT = Path(__file__).resolve().parents[2]
+
+# 各语言运行时对应的解释器
+RUNTIME_INTERPRETERS = {
+    "python": sys.executable,
+}
+
+_HEADER = struct.Struct("!I")
+_READY = b"READY\n"
+
+
+def _read_exact(conn: socket.socket, size: int) -> bytes:
+    """从阻塞套接字读取指定长度的数据"""
+    chunks = []
+    while size > 0:
+        chunk = conn.recv(size)
+        if not chunk:
+            raise ConnectionError("连接在请求读取完成前关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send_message(conn: socket.socket, message: Dict[str, Any]) -> None:
+    """发送一行JSON消息，对端已断开时忽略"""
+    try:
+        conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# zygote 进程
+# ---------------------------------------------------------------------------
+
+def _run_child(request: Dict[str, Any], stdout_fd: int, stderr_fd: int) -> int:
+    """在fork出的子进程中运行脚本，返回退出码"""
+    import runpy
+
+    os.setsid()
+    for failure in apply_limits(request.get("limits")):
+        # zygote为单线程进程，此时标准错误仍为zygote的标准错误
+        print(f"[forkserver] 设置进程调度优先级失败: {failure}", file=sys.stderr)
+
+    # 恢复zygote修改过的信号处理
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    for fd in (devnull, stdout_fd, stderr_fd):
+        os.close(fd)
+
+    os.environ.clear()
+    os.environ.update(request.get("env") or {})
+
+    script_path = request["script_path"]
+    if request.get("cwd"):
+        os.chdir(request["cwd"])
+    sys.argv = [script_path, *request.get("args", [])]
+    sys.path[0] = os.path.dirname(os.path.abspath(script_path))
+
+    exit_code = 0
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+
+    return exit_code & 0xFF
+
+
+def _zygote_main(socket_path: str, preload_modules: Sequence[str]) -> None:
+    """zygote主循环：接收执行请求、fork子进程并回收退出状态"""
+    import importlib
+
+    for module_name in preload_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            print(f"[forkserver] 预加载模块失败: {module_name} - {e}", file=sys.stderr)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    # 通过wakeup fd把SIGCHLD转换为可select的事件
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, "accept")
+    selector.register(wakeup_r, selectors.EVENT_READ, "sigchld")
+    # 父进程持有stdin写端，父进程退出时zygote随之退出
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ, "parent")
+
+    children: Dict[int, socket.socket] = {}
+
+    sys.stdout.buffer.write(_READY)
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    def handle_request(conn: socket.socket) -> None:
+        conn.settimeout(5)
+        fds: List[int] = []
+        try:
+            header, fds, _, _ = socket.recv_fds(conn, _HEADER.size, 2)
+            if len(header) != _HEADER.size or len(fds) != 2:
+                raise ValueError("无效的执行请求")
+            (length,) = _HEADER.unpack(header)
+            request = json.loads(_read_exact(conn, length).decode("utf-8"))
+        except Exception as e:
+            for fd in fds:
+                os.close(fd)
+            _send_message(conn, {"error": str(e)})
+            conn.close()
+            return
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                selector.close()
+                listener.close()
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                for child_conn in children.values():
+                    child_conn.close()
+                conn.close()
+                exit_code = _run_child(request, fds[0], fds[1])
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+
+        for fd in fds:
+            os.close(fd)
+        children[pid] = conn
+        _send_message(conn, {"pid": pid})
+
+    def reap_children() -> None:
+        while children:
+            try:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            conn = children.pop(pid, None)
+            if conn is not None:
+                _send_message(conn, {
+                    "pid": pid,
+                    "returncode": os.waitstatus_to_exitcode(status),
+                    "rusage": rusage_to_dict(usage),
+                })
+                conn.close()
+
+    running = True
+    while running:
+        try:
+            events = selector.select()
+        except InterruptedError:
+            continue
+        for key, _ in events:
+            if key.data == "accept":
+                try:
+                    conn, _ = listener.accept()
+                except OSError as e:
+                    if e.errno in (errno.EAGAIN, errno.EINTR):
+                        continue
+                    raise
+                handle_request(conn)
+            elif key.data == "sigchld":
+                try:
+                    while os.read(wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                reap_children()
+            elif key.data == "parent":
+                if not os.read(sys.stdin.fileno(), 512):
+                    running = False
+
+    for pid in list(children):
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    listener.close()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+
+# ---------------------------------------------------------------------------
+# 服务进程侧客户端
+# ---------------------------------------------------------------------------
+
+async def _open_pipe_reader(fd: int) -> Tuple[asyncio.StreamReader, asyncio.ReadTransport]:
+    """把管道读端包装为StreamReader，同时返回管道transport以便关闭"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    transport, _ = await loop.connect_read_pipe(lambda: protocol, os.fdopen(fd, "rb", 0))
+    return reader, transport
+
+
+class ForkedProcess:
+    """由zygote fork出的脚本进程，接口与asyncio.subprocess.Process保持一致，退出后 rusage 为资源统计"""
+
+    def __init__(
+        self,
+        pid: int,
+        stdout: asyncio.StreamReader,
+        stderr: asyncio.StreamReader,
+        control_reader: asyncio.StreamReader,
+        control_writer: asyncio.StreamWriter,
+        pipes: List[asyncio.ReadTransport]
+    ):
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self._pipes = pipes
+        self.returncode: Optional[int] = None
+        self.rusage: Optional[Dict[str, Any]] = None
+        self._control_reader = control_reader
+        self._control_writer = control_writer
+        self._waiter: Optional[asyncio.Task] = None
+
+    async def _wait_exit(self) -> int:
+        line = await self._control_reader.readline()
+        self._control_writer.close()
+        if not line:
+            # zygote异常退出，无法获得真实退出码
+            self.returncode = -signal.SIGKILL
+        else:
+            message = json.loads(line)
+            self.returncode = message["returncode"]
+            self.rusage = message.get("rusage")
+        return self.returncode
+
+    async def wait(self) -> int:
+        """等待进程退出并返回退出码"""
+        if self._waiter is None:
+            self._waiter = asyncio.ensure_future(self._wait_exit())
+        return await asyncio.shield(self._waiter)
+
+    def send_signal(self, sig: int) -> None:
+        """向脚本进程发送信号"""
+        if self.returncode is not None:
+            return
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def close_pipes(self) -> None:
+        """关闭输出管道（进程组内残留的进程可能仍持有写端，管道不会自行结束）"""
+        for pipe in self._pipes:
+            pipe.close()
+
+    async def communicate(self):
+        """读取全部输出并等待进程退出"""
+        stdout, stderr, _ = await asyncio.gather(
+            self.stdout.read(),
+            self.stderr.read(),
+            self.wait()
+        )
+        return stdout, stderr
+
+
+class ForkServer:
+    """单个语言运行时的zygote管理器"""
+
+    def __init__(self, runtime: str, preload_modules: Sequence[str]):
+        if runtime not in RUNTIME_INTERPRETERS:
+            raise ValueError(f"fork-server不支持的运行时: {runtime}")
+        self.runtime = runtime
+        self.preload_modules = list(preload_modules)
+        self.socket_path = os.path.join(
+            tempfile.gettempdir(),
+            f"vss-forkserver-{runtime}-{os.getpid()}.sock"
+        )
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        """启动zygote进程（已运行时直接返回）"""
+        async with self._lock:
+            if self.is_running:
+                return
+
+            env = {**os.environ, "PYTHONIOENCODING": "utf-8"}
+            self._process = await asyncio.create_subprocess_exec(
+                RUNTIME_INTERPRETERS[self.runtime], "-m", "app.services.forkserver",
+                self.socket_path, ",".join(self.preload_modules),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=str(APP_ROOT),
+                env=env
+            )
+            ready = await self._process.stdout.readline()
+            if ready != _READY:
+                await self._stop_process()
+                raise RuntimeError(f"fork-server启动失败: {self.runtime}")
+
+            logger.info(
+                f"fork-server已启动: {self.runtime} (PID: {self._process.pid}, "
+                f"预加载模块: {', '.join(self.preload_modules) or '无'})"
+            )
+
+    async def spawn(
+        self,
+        script_path: str,
+        env: Dict[str, Any],
+        cwd: Optional[str] = None,
+        args: Sequence[str] = (),
+        limits: Optional[Dict[str, Any]] = None
+    ) -> ForkedProcess:
+        """fork一个子进程执行脚本，limits 为资源档案（见 app.services.resource_limits）"""
+        if not self.is_running:
+            await self.start()
+
+        request = json.dumps({
+            "script_path": script_path,
+            "env": {str(k): str(v) for k, v in env.items()},
+            "cwd": cwd,
+            "args": list(args),
+            "limits": limits,
+        }).encode("utf-8")
+
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            socket.send_fds(sock, [_HEADER.pack(len(request))], [stdout_w, stderr_w])
+            sock.sendall(request)
+        except Exception:
+            sock.close()
+            os.close(stdout_r)
+            os.close(stderr_r)
+            raise
+        finally:
+            os.close(stdout_w)
+            os.close(stderr_w)
+
+        sock.setblocking(False)
+        control_reader, control_writer = await asyncio.open_unix_connection(sock=sock)
+        stdout, stdout_pipe = await _open_pipe_reader(stdout_r)
+        stderr, stderr_pipe = await _open_pipe_reader(stderr_r)
+
+        line = await control_reader.readline()
+        reply = json.loads(line) if line else {"error": "fork-server连接中断"}
+        if "pid" not in reply:
+            control_writer.close()
+            raise RuntimeError(f"fork-server创建进程失败: {reply.get('error')}")
+
+        return ForkedProcess(reply["pid"], stdout, stderr, control_reader, control_writer, [stdout_pipe, stderr_pipe])
+
+    async def _stop_process(self) -> None:
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+        self._process = None
+
+    async def shutdown(self) -> None:
+        """关闭zygote，正在运行的子进程会被一并终止"""
+        async with self._lock:
+            await self._stop_process()
+
+
+_forkservers: Dict[str, ForkServer] = {}
+
+
+def get_forkserver(runtime: str = "python") -> ForkServer:
+    """获取指定运行时的fork-server实例"""
+    if runtime not in _forkservers:
+        modules = [m.strip() for m in settings.FORKSERVER_PRELOAD_MODULES.split(",") if m.strip()]
+        _forkservers[runtime] = ForkServer(runtime, modules)
+    return _forkservers[runtime]
+
+
+async def shutdown_forkservers() -> None:
+    """关闭所有fork-server"""
+    for forkserver in _forkservers.values():
+        await forkserver.shutdown()
+    _forkservers.clear()
+
+
+if __name__ == "__main__":
+    _zygote_main(sys.argv[1], [m for m in sys.argv[2].split(",") if m])
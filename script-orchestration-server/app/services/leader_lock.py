@@ -0,0 +1,77 @@
+"""
+基于Redis的主节点锁
+
+多个副本中只需一个运行的后台引擎（定时触发、事件触发）用该锁选出主节点：
+SET NX PX 获取锁，每 ttl/3 秒续期一次；续期和释放前以 WATCH 确认锁仍属于本副本，
+不会延长或删除其他副本已获得的锁。主节点退出后其他副本在锁过期后接管。
+"""
+
+import logging
+import time
+import uuid
+
+from redis.exceptions import WatchError
+
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """主节点锁"""
+
+    def __init__(self, key: str, ttl: float, name: str):
+        self.key = key
+        self.ttl = ttl
+        self.name = name
+        self.token = uuid.uuid4().hex
+        self.is_leader = False
+        self._renewed_at = 0.0
+
+    async def hold(self) -> bool:
+        """获取或续期锁，返回本副本是否为主节点；失去锁时 is_leader 变为False"""
+        redis = get_redis()
+        ttl_ms = int(self.ttl * 1000)
+        if not self.is_leader:
+            if await redis.set(self.key, self.token, nx=True, px=ttl_ms):
+                self.is_leader = True
+                self._renewed_at = time.monotonic()
+                logger.info(f"成为{self.name}主节点")
+            return self.is_leader
+
+        if time.monotonic() - self._renewed_at < self.ttl / 3:
+            return True
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(self.key)
+                if not await self._owned(pipe):
+                    await pipe.unwatch()
+                    renewed = False
+                else:
+                    pipe.multi()
+                    pipe.pexpire(self.key, ttl_ms)
+                    await pipe.execute()
+                    renewed = True
+            except WatchError:
+                renewed = False
+        if renewed:
+            self._renewed_at = time.monotonic()
+        else:
+            logger.warning(f"{self.name}主节点锁已失效")
+            self.is_leader = False
+        return renewed
+
+    async def release(self) -> None:
+        self.is_leader = False
+        async with get_redis().pipeline(transaction=True) as pipe:
+            await pipe.watch(self.key)
+            if await self._owned(pipe):
+                pipe.multi()
+                pipe.delete(self.key)
+                await pipe.execute()
+            else:
+                await pipe.unwatch()
+
+    async def _owned(self, pipe) -> bool:
+        owner = await pipe.get(self.key)
+        return owner is not None and owner.decode("utf-8") == self.token
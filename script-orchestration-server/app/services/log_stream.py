@@ -0,0 +1,374 @@
+"""
+执行输出实时推送
+
+运行中的执行在输出落盘后把数据块发布到本进程的主题(topic)，
+同时通过Redis发布给其他副本。每个执行在每个副本上只有一个主题和一个Redis订阅，
+所有观看者共享主题中预先编码好的SSE帧，不会为每个观看者复制数据块。
+观看者可从任意字节偏移续传：落后于内存窗口的部分从日志存储补读，
+日志存储中也没有的部分（副本间未共享存储时）被跳过，推送从下一个数据块继续。
+
+主题只在有观看者时缓存数据块：本副本没有观看者时不缓存，最后一个观看者离开时清空缓存；
+频道没有其他副本订阅时（PUBSUB NUMSUB，每 REMOTE_VIEWERS_CHECK_INTERVAL 秒检查一次）
+不发布到Redis。观看者开始观看前的输出以及订阅生效前未发布的输出都从日志存储补读。
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.execution_logs import execution_log_store, ExecutionLogWriter, LOG_STREAMS
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "vss:executions:logs:"
+
+# 观看者无新数据时的心跳间隔(秒)，同时用于兜底检查执行状态
+HEARTBEAT_INTERVAL = 15
+
+# 检查其他副本是否订阅了执行输出的间隔(秒)
+REMOTE_VIEWERS_CHECK_INTERVAL = 1.0
+
+StatusLoader = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+    """编码一条SSE事件"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def format_event_id(positions: Dict[str, int]) -> str:
+    """续传标识: "<stdout偏移>,<stderr偏移>" """
+    return f"{positions['stdout']},{positions['stderr']}"
+
+
+def parse_event_id(event_id: str) -> Dict[str, int]:
+    """解析续传标识"""
+    stdout_offset, stderr_offset = event_id.split(",")
+    return {"stdout": int(stdout_offset), "stderr": int(stderr_offset)}
+
+
+class _Chunk:
+    """主题中的一个输出块，SSE帧只编码一次，由所有观看者共享"""
+
+    __slots__ = ("stream", "offset", "data", "frame")
+
+    def __init__(self, stream: str, offset: int, data: bytes, frame: bytes):
+        self.stream = stream
+        self.offset = offset
+        self.data = data
+        self.frame = frame
+
+    @property
+    def end(self) -> int:
+        return self.offset + len(self.data)
+
+
+class _Topic:
+    """单个执行的输出主题"""
+
+    def __init__(self, execution_id: str, local: bool):
+        self.execution_id = execution_id
+        self.local = local
+        self.chunks: List[_Chunk] = []
+        self.first_index = 0
+        self.buffered_bytes = 0
+        self.positions = {stream: 0 for stream in LOG_STREAMS}
+        self.decoders = {stream: codecs.getincrementaldecoder("utf-8")("replace") for stream in LOG_STREAMS}
+        self.status: Optional[Dict[str, Any]] = None
+        self.viewers = 0
+        self.subscribed = False
+        self.remote_viewers = 0
+        self.remote_checked_at = 0.0
+        self.changed = asyncio.Condition()
+
+    @property
+    def next_index(self) -> int:
+        return self.first_index + len(self.chunks)
+
+    def get(self, index: int) -> _Chunk:
+        return self.chunks[index - self.first_index]
+
+    async def append(self, stream: str, offset: int, data: bytes) -> None:
+        if offset + len(data) <= self.positions[stream]:
+            return
+        if offset != self.positions[stream]:
+            # 中间有缺口（如副本晚订阅），重置解码器避免拼接出错误字符
+            self.decoders[stream].reset()
+        self.positions[stream] = offset + len(data)
+        frame = format_event(
+            stream,
+            {"offset": offset, "text": self.decoders[stream].decode(data)},
+            format_event_id(self.positions)
+        )
+        self.chunks.append(_Chunk(stream, offset, data, frame))
+        self.buffered_bytes += len(data)
+        while self.buffered_bytes > settings.LOG_STREAM_BUFFER_BYTES and len(self.chunks) > 1:
+            self.buffered_bytes -= len(self.chunks.pop(0).data)
+            self.first_index += 1
+        async with self.changed:
+            self.changed.notify_all()
+
+    def clear(self) -> None:
+        """丢弃缓存的数据块，之后的观看者从日志存储补读"""
+        self.first_index = self.next_index
+        self.chunks = []
+        self.buffered_bytes = 0
+
+    async def finish(self, status: Dict[str, Any]) -> None:
+        self.status = status
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def wait(self, index: int, timeout: float) -> None:
+        async with self.changed:
+            if index < self.next_index or self.status is not None:
+                return
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class LogBroker:
+    """执行输出推送中心"""
+
+    def __init__(self):
+        self._topics: Dict[str, _Topic] = {}
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    # 发布端 -----------------------------------------------------------------
+
+    def open_writer(self, execution_id: str, stream: str) -> ExecutionLogWriter:
+        """打开输出写入器，落盘后的数据块同时推送给观看者"""
+        topic = self._topics.get(execution_id)
+        if topic is None:
+            topic = self._topics[execution_id] = _Topic(execution_id, local=True)
+        topic.local = True
+
+        async def listener(offset: int, data: bytes) -> None:
+            if topic.viewers > 0:
+                await topic.append(stream, offset, data)
+            if await self._has_remote_viewers(topic):
+                await self._publish(execution_id, {"type": "chunk", "stream": stream, "offset": offset}, data)
+
+        return execution_log_store.open_writer(execution_id, stream, listener=listener)
+
+    async def finish(self, execution_id: str, status: Dict[str, Any]) -> None:
+        """发布执行结束状态"""
+        topic = self._topics.get(execution_id)
+        if topic is not None:
+            await topic.finish(status)
+            if topic.viewers == 0:
+                self._topics.pop(execution_id, None)
+        await self._publish(execution_id, {"type": "status", "status": status})
+
+    async def _has_remote_viewers(self, topic: _Topic) -> bool:
+        """其他副本是否订阅了该执行的输出，结果缓存 REMOTE_VIEWERS_CHECK_INTERVAL 秒"""
+        if not settings.LOG_STREAM_REDIS_ENABLED:
+            return False
+        now = time.monotonic()
+        if now - topic.remote_checked_at >= REMOTE_VIEWERS_CHECK_INTERVAL:
+            topic.remote_checked_at = now
+            try:
+                counts = await get_redis().pubsub_numsub(CHANNEL_PREFIX + topic.execution_id)
+                topic.remote_viewers = counts[0][1] if counts else 0
+            except Exception as e:
+                logger.debug(f"查询执行输出订阅数失败: {topic.execution_id} - {str(e)}")
+                topic.remote_viewers = 0
+        return topic.remote_viewers > 0
+
+    async def _publish(self, execution_id: str, header: Dict[str, Any], data: bytes = b"") -> None:
+        if not settings.LOG_STREAM_REDIS_ENABLED:
+            return
+        try:
+            await get_redis().publish(
+                CHANNEL_PREFIX + execution_id,
+                json.dumps(header).encode("utf-8") + b"\n" + data
+            )
+        except Exception as e:
+            logger.debug(f"发布执行输出到Redis失败: {execution_id} - {str(e)}")
+
+    # 跨副本订阅 -------------------------------------------------------------
+
+    async def _subscribe_remote(self, topic: _Topic) -> None:
+        if not settings.LOG_STREAM_REDIS_ENABLED:
+            return
+        try:
+            if self._pubsub is None:
+                self._pubsub = get_redis().pubsub()
+            await self._pubsub.subscribe(CHANNEL_PREFIX + topic.execution_id)
+            topic.subscribed = True
+            if self._reader_task is None or self._reader_task.done():
+                self._reader_task = asyncio.create_task(self._read_remote())
+        except Exception as e:
+            logger.warning(f"订阅执行输出失败: {topic.execution_id} - {str(e)}")
+
+    async def _unsubscribe_remote(self, execution_id: str) -> None:
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(CHANNEL_PREFIX + execution_id)
+        except Exception as e:
+            logger.debug(f"取消订阅执行输出失败: {execution_id} - {str(e)}")
+
+    async def _read_remote(self) -> None:
+        """把其他副本发布的输出分发到本地主题"""
+        while any(topic.subscribed for topic in self._topics.values()):
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                logger.warning(f"读取Redis执行输出失败: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if not message or message["type"] != "message":
+                continue
+
+            execution_id = message["channel"].decode("utf-8")[len(CHANNEL_PREFIX):]
+            topic = self._topics.get(execution_id)
+            if topic is None or topic.local:
+                continue
+
+            header, _, data = message["data"].partition(b"\n")
+            header = json.loads(header)
+            if header["type"] == "chunk":
+                await topic.append(header["stream"], header["offset"], data)
+            else:
+                await topic.finish(header["status"])
+
+    # 观看端 -----------------------------------------------------------------
+
+    async def _acquire(self, execution_id: str) -> _Topic:
+        topic = self._topics.get(execution_id)
+        if topic is None:
+            topic = self._topics[execution_id] = _Topic(execution_id, local=False)
+            await self._subscribe_remote(topic)
+        topic.viewers += 1
+        return topic
+
+    async def _release(self, topic: _Topic) -> None:
+        topic.viewers -= 1
+        if topic.viewers > 0:
+            return
+        if topic.subscribed:
+            topic.subscribed = False
+            await self._unsubscribe_remote(topic.execution_id)
+        if not topic.local or topic.status is not None:
+            self._topics.pop(topic.execution_id, None)
+        else:
+            topic.clear()
+
+    async def _backfill(
+        self,
+        execution_id: str,
+        stream: str,
+        positions: Dict[str, int],
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """从日志存储补读观看者缺失的输出"""
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        async for offset, data in execution_log_store.read_range(execution_id, stream, positions[stream], end):
+            positions[stream] = offset + len(data)
+            yield format_event(
+                stream,
+                {"offset": offset, "text": decoder.decode(data)},
+                format_event_id(positions)
+            )
+
+    async def stream(
+        self,
+        execution_id: str,
+        offsets: Dict[str, int],
+        status_loader: StatusLoader,
+        final_status: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[bytes]:
+        """推送执行输出，从指定偏移开始，以status事件结束"""
+        positions = dict(offsets)
+
+        # 已结束的执行直接从存储读取
+        if final_status is not None:
+            for stream in LOG_STREAMS:
+                async for frame in self._backfill(execution_id, stream, positions):
+                    yield frame
+            yield format_event("status", final_status, format_event_id(positions))
+            return
+
+        topic = await self._acquire(execution_id)
+        try:
+            index = topic.first_index
+            for stream in LOG_STREAMS:
+                async for frame in self._backfill(execution_id, stream, positions):
+                    yield frame
+
+            while True:
+                while index < topic.next_index:
+                    if index < topic.first_index:
+                        index = topic.first_index
+                    chunk = topic.get(index)
+                    index += 1
+
+                    position = positions[chunk.stream]
+                    if chunk.end <= position:
+                        continue
+                    if chunk.offset > position:
+                        async for frame in self._backfill(execution_id, chunk.stream, positions, chunk.offset):
+                            yield frame
+                        position = positions[chunk.stream]
+                        if position < chunk.offset:
+                            # 日志存储中没有缺失的部分（副本间未共享存储或尚未落盘），跳过缺口从该块继续推送；
+                            # 事件中的 offset 表明缺口位置
+                            logger.debug(
+                                f"执行输出缺口无法补读: {execution_id} {chunk.stream} {position}-{chunk.offset}"
+                            )
+                            position = positions[chunk.stream] = chunk.offset
+
+                    if chunk.offset == position:
+                        positions[chunk.stream] = chunk.end
+                        yield chunk.frame
+                    elif chunk.offset < position < chunk.end:
+                        data = chunk.data[position - chunk.offset:]
+                        positions[chunk.stream] = chunk.end
+                        yield format_event(
+                            chunk.stream,
+                            {"offset": position, "text": data.decode("utf-8", errors="replace")},
+                            format_event_id(positions)
+                        )
+
+                status = topic.status
+                if status is None:
+                    await topic.wait(index, HEARTBEAT_INTERVAL)
+                    if index < topic.next_index or topic.status is not None:
+                        continue
+                    # 兜底：订阅前执行可能已结束而错过状态消息
+                    status = await status_loader()
+                    if status is None:
+                        yield b": keepalive\n\n"
+                        continue
+
+                for stream in LOG_STREAMS:
+                    async for frame in self._backfill(execution_id, stream, positions):
+                        yield frame
+                yield format_event("status", status, format_event_id(positions))
+                return
+        finally:
+            await self._release(topic)
+
+    async def shutdown(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+
+
+log_broker = LogBroker()
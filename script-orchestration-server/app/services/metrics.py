@@ -0,0 +1,245 @@
+"""
+Prometheus指标
+
+执行路径上只做直方图计数（进程内、无I/O）；未结束执行数、连接池、调度器作业等
+状态类指标在 /metrics 被抓取时才读取。数据库查询耗时通过引擎游标事件采集，
+按发起查询的 ScriptService 方法分类（其他调用方归为 "other"）。
+
+工作进程(worker.py)在 WORKER_METRICS_PORT 上单独暴露自身的指标。
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, start_http_server
+from sqlalchemy import event, func, select
+
+from app.core.config import settings
+from app.core.database import engine, SessionLocal
+from app.core.scheduler import scheduler
+from app.models.script import ScriptExecution, ExecutionStatus
+from app.services.execution_queue import execution_queue
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_QUEUE_WAIT = Histogram(
+    "vss_execution_queue_wait_seconds",
+    "执行从创建到开始运行的等待时间",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+PROCESS_SPAWN = Histogram(
+    "vss_process_spawn_seconds",
+    "启动脚本进程的耗时",
+    ["backend"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+EXECUTION_RUNTIME = Histogram(
+    "vss_execution_runtime_seconds",
+    "脚本运行时间",
+    ["language", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+DB_QUERY_DURATION = Histogram(
+    "vss_db_query_duration_seconds",
+    "数据库查询耗时",
+    ["method"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_LAG = Histogram(
+    "vss_event_loop_lag_seconds",
+    "事件循环调度延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+EXECUTIONS = Gauge("vss_executions", "未结束的执行数（所有副本和工作进程）", ["status"])
+QUEUE_DEPTH = Gauge("vss_execution_queue_depth", "本进程执行队列中等待的执行数")
+QUEUE_RUNNING = Gauge("vss_execution_queue_running", "本进程正在运行的执行数")
+DB_POOL = Gauge("vss_db_pool_connections", "数据库连接池连接数", ["state"])
+SCHEDULER_JOBS = Gauge("vss_scheduler_jobs", "APScheduler作业数", ["state"])
+CRON_FIRES = Counter(
+    "vss_cron_fires",
+    "定时触发次数（fired / skipped_overlap / skipped_misfire / rejected）",
+    ["result"]
+)
+CRON_JOBS = Gauge("vss_cron_jobs", "本进程定时触发引擎中的脚本数（非主节点为0）")
+TRIGGER_EVENTS = Counter("vss_trigger_events", "事件触发引擎读取的事件数（matched / unmatched / invalid）", ["result"])
+EVENT_FIRES = Counter("vss_event_fires", "事件触发的批次数（fired / deferred）", ["result"])
+EVENT_BATCH_SIZE = Histogram(
+    "vss_event_batch_size",
+    "事件触发的一次执行合并的事件数",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+EVENT_TRIGGERS = Gauge("vss_event_triggers", "本进程事件触发引擎中的脚本数（非主节点为0）")
+
+
+# 当前发起数据库查询的 ScriptService 方法
+_db_method: ContextVar[str] = ContextVar("vss_db_method", default="other")
+
+
+def _track_method(name: str, method):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = _db_method.set(name)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _db_method.reset(token)
+    return wrapper
+
+
+def instrument_db_operations(cls):
+    """类装饰器：类中协程方法执行的数据库查询按方法名统计耗时"""
+    for name, value in list(vars(cls).items()):
+        is_static = isinstance(value, staticmethod)
+        method = value.__func__ if is_static else value
+        if inspect.iscoroutinefunction(method):
+            wrapped = _track_method(name, method)
+            setattr(cls, name, staticmethod(wrapped) if is_static else wrapped)
+    return cls
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._vss_query_start = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_vss_query_start", None)
+    if started is not None:
+        DB_QUERY_DURATION.labels(_db_method.get()).observe(time.perf_counter() - started)
+
+
+def observe_queue_wait(execution: ScriptExecution) -> None:
+    if execution.created_at and execution.start_time:
+        EXECUTION_QUEUE_WAIT.observe(max(0.0, (execution.start_time - execution.created_at).total_seconds()))
+
+
+def observe_spawn(backend: str, started: float) -> None:
+    """started 为 time.perf_counter() 的值"""
+    PROCESS_SPAWN.labels(backend).observe(time.perf_counter() - started)
+
+
+def observe_cron_fires(result: str, count: int = 1) -> None:
+    if count:
+        CRON_FIRES.labels(result).inc(count)
+
+
+def set_cron_jobs(count: int) -> None:
+    CRON_JOBS.set(count)
+
+
+def observe_trigger_events(result: str, count: int = 1) -> None:
+    TRIGGER_EVENTS.labels(result).inc(count)
+
+
+def observe_event_fires(result: str, count: int = 1) -> None:
+    if count:
+        EVENT_FIRES.labels(result).inc(count)
+
+
+def observe_event_batches(sizes: Iterable[int]) -> None:
+    for size in sizes:
+        EVENT_BATCH_SIZE.observe(size)
+
+
+def set_event_triggers(count: int) -> None:
+    EVENT_TRIGGERS.set(count)
+
+
+def observe_runtime(language: str, execution: ScriptExecution) -> None:
+    if execution.start_time and execution.end_time:
+        EXECUTION_RUNTIME.labels(language, execution.status.value).observe(
+            (execution.end_time - execution.start_time).total_seconds()
+        )
+
+
+class EventLoopMonitor:
+    """定期测量 asyncio.sleep 的实际唤醒延迟"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+
+loop_monitor = EventLoopMonitor(settings.METRICS_LOOP_LAG_INTERVAL)
+
+
+async def _refresh_execution_counts() -> None:
+    try:
+        async with SessionLocal() as db:
+            rows = await db.execute(
+                select(ScriptExecution.status, func.count())
+                .where(ScriptExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING]))
+                .group_by(ScriptExecution.status)
+            )
+            counts = dict(rows.all())
+    except Exception as e:
+        logger.warning(f"读取执行数失败: {str(e)}")
+        return
+    for status in (ExecutionStatus.PENDING, ExecutionStatus.RUNNING):
+        EXECUTIONS.labels(status.value).set(counts.get(status, 0))
+
+
+def _refresh_pool() -> None:
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL.labels("size").set(pool.size())
+    DB_POOL.labels("checked_out").set(pool.checkedout())
+    DB_POOL.labels("checked_in").set(pool.checkedin())
+    DB_POOL.labels("overflow").set(max(0, pool.overflow()))
+
+
+async def _refresh_scheduler_jobs() -> None:
+    try:
+        # 作业存储在Redis中，get_jobs 为同步调用
+        jobs = await asyncio.to_thread(scheduler.get_jobs)
+    except Exception as e:
+        logger.warning(f"读取调度作业失败: {str(e)}")
+        return
+    paused = sum(1 for job in jobs if job.next_run_time is None)
+    SCHEDULER_JOBS.labels("scheduled").set(len(jobs) - paused)
+    SCHEDULER_JOBS.labels("paused").set(paused)
+
+
+async def render_metrics() -> bytes:
+    """刷新状态类指标并输出Prometheus文本格式"""
+    await asyncio.gather(_refresh_execution_counts(), _refresh_scheduler_jobs())
+    _refresh_pool()
+    QUEUE_DEPTH.set(execution_queue.depth)
+    QUEUE_RUNNING.set(execution_queue.running)
+    return generate_latest()
+
+
+def start_worker_metrics_server() -> None:
+    """工作进程启动指标HTTP服务（WORKER_METRICS_PORT 为0时不启动）"""
+    if settings.WORKER_METRICS_PORT > 0:
+        start_http_server(settings.WORKER_METRICS_PORT)
+        logger.info(f"工作进程指标服务运行在端口: {settings.WORKER_METRICS_PORT}")
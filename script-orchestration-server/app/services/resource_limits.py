@@ -0,0 +1,186 @@
+"""
+脚本进程资源限制
+
+脚本进程按资源档案限制：内存(RLIMIT_AS)、CPU时间(RLIMIT_CPU)、打开文件数(RLIMIT_NOFILE)、
+nice值和I/O调度类别。档案选择优先级: Script.config.resource_profile > 按执行优先级
+(RESOURCE_PROFILE_BY_PRIORITY) > "default"；Script.config.resource_limits 中的字段覆盖档案中的同名字段。
+自定义档案通过 RESOURCE_PROFILES(JSON) 配置，与内置档案合并。
+
+fork-server 后端在子进程内设置限制；subprocess 后端在子进程exec之前(preexec_fn)设置。
+preexec_fn 在多线程进程fork出的子进程中运行，apply_limits 只调用 prlimit、setpriority
+和导入时已解析的 syscall，不加载动态库、不记录日志，未能设置的项返回给调用方。
+超出限制的执行记为 oom / cpu_limit / file_limit 状态。
+"""
+
+import ctypes
+import json
+import logging
+import os
+import platform
+import resource
+import signal
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.script import ExecutionStatus
+
+logger = logging.getLogger(__name__)
+
+LIMIT_FIELDS = ("memory_mb", "cpu_seconds", "open_files", "nice", "io_class", "io_priority")
+
+# I/O调度类别（realtime 需要特权，不开放）
+IO_CLASSES = {"best-effort": 2, "idle": 3}
+
+BUILTIN_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "memory_mb": None, "cpu_seconds": None, "open_files": None,
+        "nice": 0, "io_class": None, "io_priority": None,
+    },
+    "background": {"nice": 10, "io_class": "idle"},
+    "restricted": {
+        "memory_mb": 512, "cpu_seconds": 60, "open_files": 256,
+        "nice": 5, "io_class": "best-effort", "io_priority": 7,
+    },
+}
+
+# 内存峰值达到限制的该比例后被SIGKILL，视为内核因内存不足终止
+OOM_KILL_RSS_RATIO = 0.9
+# 错误输出中表示内存分配失败的内容（Python / C / C++）
+OOM_MARKERS = ("MemoryError", "cannot allocate memory", "out of memory", "bad_alloc")
+
+# ioprio_set 系统调用号
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "aarch64": 30}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_SET = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+
+# 导入时解析，fork出的子进程中调用 dlopen 可能死锁
+_SYSCALL = ctypes.CDLL(None, use_errno=True).syscall
+
+
+def _load_profiles(value: str) -> Dict[str, Dict[str, Any]]:
+    profiles = {name: dict(profile) for name, profile in BUILTIN_PROFILES.items()}
+    for name, profile in (json.loads(value) if value else {}).items():
+        profiles.setdefault(name, {}).update(profile)
+    return profiles
+
+
+def _parse_priority_profiles(value: str) -> List[Tuple[int, str]]:
+    """解析按优先级选择档案的配置，格式: "-100=background,10=interactive"（优先级下限=档案）"""
+    thresholds = []
+    for item in value.split(","):
+        if "=" in item:
+            threshold, name = item.split("=", 1)
+            thresholds.append((int(threshold), name.strip()))
+    return sorted(thresholds, reverse=True)
+
+
+PROFILES = _load_profiles(settings.RESOURCE_PROFILES)
+PRIORITY_PROFILES = _parse_priority_profiles(settings.RESOURCE_PROFILE_BY_PRIORITY)
+
+
+def profile_for_priority(priority: Optional[int]) -> str:
+    """下限不超过执行优先级的最大阈值对应的档案"""
+    for threshold, name in PRIORITY_PROFILES:
+        if (priority or 0) >= threshold:
+            return name
+    return "default"
+
+
+def resolve_profile(config: Optional[Dict[str, Any]], priority: Optional[int]) -> Dict[str, Any]:
+    """确定执行使用的资源档案（含档案名）"""
+    config = config or {}
+    name = config.get("resource_profile") or profile_for_priority(priority)
+    if name not in PROFILES:
+        logger.warning(f"资源档案不存在，使用默认档案: {name}")
+        name = "default"
+    profile = {**PROFILES["default"], **PROFILES[name]}
+    profile.update({key: value for key, value in (config.get("resource_limits") or {}).items() if key in LIMIT_FIELDS})
+    return {"name": name, **profile}
+
+
+def _rlimits(profile: Dict[str, Any]) -> List[Tuple[int, Tuple[int, int]]]:
+    limits = []
+    if profile.get("memory_mb"):
+        size = int(profile["memory_mb"]) * 1024 * 1024
+        limits.append((resource.RLIMIT_AS, (size, size)))
+    if profile.get("cpu_seconds"):
+        # 到达软限制时收到SIGXCPU，1秒后到达硬限制被SIGKILL
+        seconds = int(profile["cpu_seconds"])
+        limits.append((resource.RLIMIT_CPU, (seconds, seconds + 1)))
+    if profile.get("open_files"):
+        count = int(profile["open_files"])
+        limits.append((resource.RLIMIT_NOFILE, (count, count)))
+    return limits
+
+
+def _set_io_priority(pid: int, io_class: str, level: Optional[int]) -> None:
+    if _IOPRIO_SET is None or io_class not in IO_CLASSES:
+        return
+    value = IO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT
+    if io_class == "best-effort":
+        value |= min(7, max(0, int(level if level is not None else 4)))
+    if _SYSCALL(_IOPRIO_SET, _IOPRIO_WHO_PROCESS, pid, value) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def has_limits(profile: Optional[Dict[str, Any]]) -> bool:
+    """档案是否包含需要应用的限制（默认档案不需要）"""
+    return bool(profile) and (bool(_rlimits(profile)) or bool(profile.get("nice")) or bool(profile.get("io_class")))
+
+
+def apply_limits(profile: Optional[Dict[str, Any]], pid: int = 0) -> List[str]:
+    """
+    对进程（pid 为0时为当前进程）应用资源档案，资源限制设置失败时抛出异常。
+    调度优先级需要特权，设置失败不影响执行，返回失败原因由调用方记录。
+    """
+    failures: List[str] = []
+    if not profile:
+        return failures
+    for limit, values in _rlimits(profile):
+        resource.prlimit(pid, limit, values)
+    if profile.get("nice"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, int(profile["nice"]))
+        except PermissionError as e:
+            failures.append(f"nice: {e.strerror}")
+    if profile.get("io_class"):
+        try:
+            _set_io_priority(pid, profile["io_class"], profile.get("io_priority"))
+        except PermissionError as e:
+            failures.append(f"io_class: {e.strerror}")
+    return failures
+
+
+def classify_limit_violation(
+    profile: Optional[Dict[str, Any]],
+    returncode: int,
+    cpu_ms: Optional[int],
+    stderr: str,
+    max_rss_kb: Optional[int] = None
+) -> Optional[ExecutionStatus]:
+    """
+    根据退出状态、资源统计和错误输出判断是否因超出资源限制而结束，不是时返回None。
+    只有设置了对应限制且有超限迹象时才返回超限状态；来源不明的SIGKILL（人工终止、
+    fork-server异常、无法回收等）按普通失败处理，可以重试。
+    """
+    if returncode == 0:
+        return None
+    profile = profile or {}
+    cpu_seconds = profile.get("cpu_seconds")
+    if cpu_seconds and (
+        returncode == -signal.SIGXCPU
+        or (returncode == -signal.SIGKILL and (cpu_ms or 0) >= int(cpu_seconds) * 1000)
+    ):
+        return ExecutionStatus.CPU_LIMIT
+    memory_mb = profile.get("memory_mb")
+    if memory_mb:
+        lowered = stderr.lower()
+        if any(marker.lower() in lowered for marker in OOM_MARKERS):
+            return ExecutionStatus.OOM
+        if returncode == -signal.SIGKILL and (max_rss_kb or 0) >= int(memory_mb) * 1024 * OOM_KILL_RSS_RATIO:
+            return ExecutionStatus.OOM
+    if profile.get("open_files") and "Too many open files" in stderr:
+        return ExecutionStatus.FILE_LIMIT
+    return None
@@ -0,0 +1,183 @@
+"""
+脚本结果缓存
+
+对声明为确定性的脚本（Script.config.cache_ttl > 0），按脚本内容哈希、输入参数和相关环境变量
+缓存成功执行的结果。命中时直接生成引用缓存输出的执行记录，不启动进程。
+相关环境变量默认是全部合并后的环境，可通过 Script.config.cache_env_keys 限定。
+
+缓存保存在数据库中，多个API副本和工作进程共享。过期条目不会命中，由每小时的清理任务删除；
+条目数超过上限时，清理任务按最近使用时间淘汰，写入缓存时不统计条目数。
+"""
+
+import hashlib
+import json
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ScriptResultCache
+from app.utils.script_utils import ScriptExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """脚本结果缓存"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_ttl(script: Script) -> int:
+        """脚本缓存有效期(秒)，0 表示不缓存"""
+        return int((script.config or {}).get("cache_ttl", 0) or 0)
+
+    @staticmethod
+    def cache_key(script: Script, input_parameters: Dict[str, Any], env_vars: Dict[str, Any]) -> str:
+        """缓存键: 脚本内容哈希 + 输入参数 + 相关环境变量"""
+        env_keys = (script.config or {}).get("cache_env_keys")
+        if env_keys is not None:
+            env_vars = {key: env_vars[key] for key in env_keys if key in env_vars}
+        payload = json.dumps(
+            {
+                "content": ScriptExecutor.content_hash(script.content),
+                "language": script.language,
+                "parameters": input_parameters or {},
+                "environment": env_vars,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def lookup(self, db: AsyncSession, key: str) -> Optional[ScriptResultCache]:
+        """查找未过期的缓存条目并记录命中"""
+        now = datetime.utcnow()
+        entry = await db.scalar(
+            select(ScriptResultCache).where(
+                ScriptResultCache.cache_key == key,
+                ScriptResultCache.expires_at > now
+            )
+        )
+        if entry is not None:
+            await db.execute(
+                update(ScriptResultCache)
+                .where(ScriptResultCache.id == entry.id)
+                .values(hit_count=ScriptResultCache.hit_count + 1, last_used_at=now)
+            )
+        return entry
+
+    async def lookup_many(self, db: AsyncSession, keys: List[str]) -> Dict[str, ScriptResultCache]:
+        """批量查找未过期的缓存条目并记录命中，返回 缓存键 -> 条目"""
+        if not keys:
+            return {}
+        now = datetime.utcnow()
+        entries = (await db.execute(
+            select(ScriptResultCache).where(
+                ScriptResultCache.cache_key.in_(set(keys)),
+                ScriptResultCache.expires_at > now
+            )
+        )).scalars().all()
+        hits = Counter(keys)
+        for entry in entries:
+            await db.execute(
+                update(ScriptResultCache)
+                .where(ScriptResultCache.id == entry.id)
+                .values(hit_count=ScriptResultCache.hit_count + hits[entry.cache_key], last_used_at=now)
+            )
+        return {entry.cache_key: entry for entry in entries}
+
+    async def store(self, db: AsyncSession, script: Script, execution: ScriptExecution, key: str) -> None:
+        """缓存成功执行的结果，失败只记录日志"""
+        try:
+            now = datetime.utcnow()
+            values = {
+                "cache_key": key,
+                "script_id": script.id,
+                "source_execution_id": execution.execution_id,
+                "output": execution.output,
+                "error_message": execution.error_message,
+                "exit_code": execution.exit_code,
+                "output_bytes": execution.output_bytes,
+                "error_bytes": execution.error_bytes,
+                "hit_count": 0,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=self.get_ttl(script)),
+            }
+            insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+            stmt = insert(ScriptResultCache).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["cache_key"],
+                set_={name: value for name, value in values.items() if name not in ("cache_key", "hit_count")}
+            )
+            await db.execute(stmt)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"缓存脚本结果失败: {execution.execution_id} - {str(e)}")
+
+    async def invalidate(self, db: AsyncSession, script_id: Optional[int] = None) -> int:
+        """使缓存失效，script_id 为空时清空全部，返回删除的条目数"""
+        stmt = delete(ScriptResultCache)
+        if script_id is not None:
+            stmt = stmt.where(ScriptResultCache.script_id == script_id)
+        result = await db.execute(stmt)
+        await db.commit()
+        return result.rowcount
+
+    async def invalidate_scripts(self, db: AsyncSession, script_ids: List[int]) -> int:
+        """使多个脚本的缓存失效，返回删除的条目数"""
+        result = await db.execute(delete(ScriptResultCache).where(ScriptResultCache.script_id.in_(script_ids)))
+        await db.commit()
+        return result.rowcount
+
+    async def purge_expired(self, db: AsyncSession) -> int:
+        """删除过期条目，条目数超过上限时淘汰最久未使用的条目，返回删除的条目数"""
+        result = await db.execute(
+            delete(ScriptResultCache).where(ScriptResultCache.expires_at <= datetime.utcnow())
+        )
+        removed = result.rowcount
+        overflow = await db.scalar(select(func.count()).select_from(ScriptResultCache)) - self.max_entries
+        if overflow > 0:
+            oldest = select(ScriptResultCache.id).order_by(ScriptResultCache.last_used_at).limit(overflow)
+            result = await db.execute(delete(ScriptResultCache).where(ScriptResultCache.id.in_(oldest)))
+            removed += result.rowcount
+        await db.commit()
+        return removed
+
+    async def stats(self, db: AsyncSession, script_id: Optional[int] = None) -> Dict[str, Any]:
+        """缓存统计"""
+        query = select(
+            func.count(),
+            func.coalesce(func.sum(ScriptResultCache.hit_count), 0),
+            func.coalesce(func.sum(ScriptResultCache.output_bytes), 0)
+        )
+        if script_id is not None:
+            query = query.where(ScriptResultCache.script_id == script_id)
+        entries, hits, output_bytes = (await db.execute(query)).one()
+        return {
+            "entries": entries,
+            "hits": int(hits),
+            "output_bytes": int(output_bytes),
+            "max_entries": self.max_entries,
+        }
+
+
+result_cache = ResultCache(max_entries=settings.RESULT_CACHE_MAX_ENTRIES)
+
+
+async def purge_result_cache():
+    """定时清理过期和超出上限的结果缓存"""
+    async with SessionLocal() as db:
+        removed = await result_cache.purge_expired(db)
+    if removed:
+        logger.info(f"清理结果缓存: {removed} 条")
@@ -1,31 +1,78 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
-from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, desc, func, insert, select, update
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 import uuid
-import subprocess
 import asyncio
+import time
 import json
 import logging
+import sys
 
 from app.models.script import Script, ScriptExecution, ScriptTemplate, ScriptStatus, ExecutionStatus
 from app.schemas.script import (
-    ScriptCreate, ScriptUpdate, ScriptExecutionCreate,
-    ScriptTemplateCreate, ScriptTemplateUpdate
+    ScriptCreate, ScriptUpdate, ScriptExecutionCreate, ScriptBatchExecutionCreate,
+    ScriptTemplateCreate, ScriptTemplateUpdate, FAILED_STATUSES, TriggerType
 )
-from app.core.scheduler import get_scheduler
+from app.core.database import SessionLocal
+from app.core.config import settings
+from app.services.forkserver import get_forkserver
+from app.services.worker_pool import worker_pool_manager
+from app.services.script_store import script_store
+from app.services.child_process import RESOURCE_FIELDS, create_child_process
+from app.services.resource_limits import classify_limit_violation, resolve_profile
+from app.services.execution_logs import ExecutionLogWriter, ExecutionOutputReader, execution_log_store
+from app.services.log_stream import log_broker
+from app.services.execution_queue import execution_queue
+from app.services.distributed_queue import distributed_queue
+from app.services.execution_control import execution_control, ExecutionCancelled, terminate_process_group
+from app.services.execution_retry import create_retry, retry_scheduler
+from app.services.batch_feeder import batch_feeder
+from app.services.cron_engine import cron_engine, parse_cron_config
+from app.services.event_engine import event_engine, parse_event_config
+from app.services.execution_stats import record_execution, record_executions, get_rollup_summary, get_resource_ranking
+from app.services.result_cache import result_cache
+from app.services.execution_archive import load_archived_execution
+from app.services.execution_output import OUTPUT_LOAD_OPTIONS, save_execution_output, insert_execution_outputs
+from app.utils.script_utils import ScriptExecutor, BoundedOutputBuffer
+from app.utils.pagination import apply_cursor, order_by_recent, count_rows
+from app.services.search_index import apply_search
+from app.services.metrics import instrument_db_operations, observe_queue_wait, observe_spawn, observe_runtime
 
 logger = logging.getLogger(__name__)
 
+# 输出流单次读取大小
+OUTPUT_READ_SIZE = 64 * 1024
+
+# 未结束的执行状态
+ACTIVE_STATUSES = [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]
+
+
+def set_execution_finished(execution: ScriptExecution) -> None:
+    """记录结束时间和耗时（duration 为秒，duration_ms 为毫秒）"""
+    execution.end_time = datetime.utcnow()
+    if execution.start_time:
+        elapsed = (execution.end_time - execution.start_time).total_seconds()
+        execution.duration = int(elapsed)
+        execution.duration_ms = int(elapsed * 1000)
+
+
+def apply_rusage(execution: ScriptExecution, rusage: Optional[Dict[str, Any]]) -> None:
+    """把进程资源统计写入执行记录"""
+    for name in RESOURCE_FIELDS:
+        if rusage and name in rusage:
+            setattr(execution, name, rusage[name])
+
+
+@instrument_db_operations
 class ScriptService:
     """脚本服务类"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
-        self.scheduler = get_scheduler()
     
     # 脚本管理
-    def create_script(self, script_data: ScriptCreate, created_by: str = None) -> Script:
+    async def create_script(self, script_data: ScriptCreate, created_by: str = None) -> Script:
         """创建脚本"""
         try:
             # 转换数据，确保枚举值为字符串
@@ -36,124 +83,156 @@ class ScriptService:
                 script_dict['status'] = script_dict['status'].value
             if 'trigger_type' in script_dict and hasattr(script_dict['trigger_type'], 'value'):
                 script_dict['trigger_type'] = script_dict['trigger_type'].value
+            if script_dict.get('trigger_type') == TriggerType.CRON.value:
+                parse_cron_config(script_dict.get('trigger_config'))
+            elif script_dict.get('trigger_type') == TriggerType.EVENT.value:
+                parse_event_config(script_dict.get('trigger_config'))
             
             script = Script(
                 **script_dict,
                 created_by=created_by
             )
             self.db.add(script)
-            self.db.commit()
-            self.db.refresh(script)
+            await self.db.commit()
+            await self.db.refresh(script)
+            cron_engine.update_script(script)
+            event_engine.update_script(script)
             
             logger.info(f"创建脚本成功: {script.name} (ID: {script.id})")
             return script
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"创建脚本失败: {str(e)}")
             raise
     
-    def get_script(self, script_id: int) -> Optional[Script]:
+    async def get_script(self, script_id: int) -> Optional[Script]:
         """获取脚本"""
-        return self.db.query(Script).filter(Script.id == script_id).first()
+        return await self.db.get(Script, script_id)
     
-    def get_scripts(
-        self, 
-        skip: int = 0, 
-        limit: int = 100,
+    def _scripts_query(
+        self,
         status: Optional[ScriptStatus] = None,
         category: Optional[str] = None,
         search: Optional[str] = None
-    ) -> List[Script]:
-        """获取脚本列表"""
-        query = self.db.query(Script)
+    ):
+        """构建带筛选条件的脚本查询，返回(查询, 检索相关度排序表达式)"""
+        query = select(Script)
         
         if status:
-            query = query.filter(Script.status == status)
+            query = query.where(Script.status == status)
         
         if category:
-            query = query.filter(Script.category == category)
+            query = query.where(Script.category == category)
         
+        rank = None
         if search:
-            query = query.filter(
-                or_(
-                    Script.name.ilike(f"%{search}%"),
-                    Script.description.ilike(f"%{search}%")
-                )
-            )
+            query, rank = apply_search(query, Script, search, self.db.get_bind().dialect.name)
         
-        return query.order_by(desc(Script.created_at)).offset(skip).limit(limit).all()
+        return query, rank
     
-    def get_scripts_count(
-        self,
+    async def get_scripts(
+        self, 
+        skip: int = 0, 
+        limit: int = 100,
         status: Optional[ScriptStatus] = None,
         category: Optional[str] = None,
-        search: Optional[str] = None
-    ) -> int:
-        """获取脚本总数"""
-        query = self.db.query(Script)
-        
-        if status:
-            query = query.filter(Script.status == status)
-        
-        if category:
-            query = query.filter(Script.category == category)
+        search: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> List[Script]:
+        """获取脚本列表，指定游标时按游标分页并忽略skip；检索时按相关度排序"""
+        query, rank = self._scripts_query(status, category, search)
+        query = self._order_list_query(query, Script, rank, search, cursor)
+        if cursor:
+            skip = 0
         
+        result = await self.db.execute(query.offset(skip).limit(limit))
+        return result.scalars().all()
+    
+    @staticmethod
+    def _order_list_query(query, model, rank, search: Optional[str], cursor: Optional[str]):
+        """列表排序：检索结果按相关度，其余按创建时间倒序（支持游标）"""
         if search:
-            query = query.filter(
-                or_(
-                    Script.name.ilike(f"%{search}%"),
-                    Script.description.ilike(f"%{search}%")
-                )
-            )
-        
-        return query.count()
+            if cursor:
+                raise ValueError("检索结果按相关度排序，不支持游标分页")
+            if rank is not None:
+                return query.order_by(rank, desc(model.id))
+            return order_by_recent(query, model)
+        return order_by_recent(apply_cursor(query, model, cursor), model)
+    
+    async def get_scripts_count(
+        self,
+        status: Optional[ScriptStatus] = None,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        count_mode: str = "exact"
+    ) -> Optional[int]:
+        """获取脚本总数"""
+        query, _ = self._scripts_query(status, category, search)
+        return await count_rows(self.db, query, count_mode)
     
-    def update_script(self, script_id: int, script_data: ScriptUpdate) -> Optional[Script]:
+    async def update_script(self, script_id: int, script_data: ScriptUpdate) -> Optional[Script]:
         """更新脚本"""
         try:
-            script = self.get_script(script_id)
+            script = await self.get_script(script_id)
             if not script:
                 return None
             
             update_data = script_data.dict(exclude_unset=True)
             for field, value in update_data.items():
                 setattr(script, field, value)
+            if script.trigger_type == TriggerType.CRON:
+                parse_cron_config(script.trigger_config)
+            elif script.trigger_type == TriggerType.EVENT:
+                parse_event_config(script.trigger_config)
             
             script.updated_at = datetime.utcnow()
-            self.db.commit()
-            self.db.refresh(script)
+            await self.db.commit()
+            await self.db.refresh(script)
+            cron_engine.update_script(script)
+            event_engine.update_script(script)
+            
+            # 内容变化后旧的缓存结果不会再被命中，直接清理
+            if "content" in update_data or "language" in update_data:
+                await result_cache.invalidate(self.db, script.id)
             
             logger.info(f"更新脚本成功: {script.name} (ID: {script.id})")
             return script
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"更新脚本失败: {str(e)}")
             raise
     
-    def delete_script(self, script_id: int) -> bool:
+    async def delete_script(self, script_id: int) -> bool:
         """删除脚本"""
         try:
-            script = self.get_script(script_id)
+            script = await self.get_script(script_id)
             if not script:
                 return False
             
-            # 取消相关的定时任务
-            if script.trigger_type.value == "cron":
-                try:
-                    self.scheduler.remove_job(f"script_{script_id}")
-                except:
-                    pass
+            # 取消相关的定时触发和事件触发
+            cron_engine.remove_script(script_id)
+            event_engine.remove_script(script_id)
+            
+            # 释放函数式脚本的常驻进程池
+            worker_pool_manager.discard(script_id)
+            
+            execution_ids = list(await self.db.scalars(
+                select(ScriptExecution.execution_id).where(ScriptExecution.script_id == script_id)
+            ))
+            await result_cache.invalidate(self.db, script_id)
+            await self.db.delete(script)
+            await self.db.commit()
             
-            self.db.delete(script)
-            self.db.commit()
+            # 执行记录随脚本级联删除，同时删除其输出日志文件
+            await asyncio.to_thread(execution_log_store.remove, execution_ids)
             
             logger.info(f"删除脚本成功: {script.name} (ID: {script.id})")
             return True
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"删除脚本失败: {str(e)}")
             raise
     
@@ -165,125 +244,369 @@ class ScriptService:
     ) -> ScriptExecution:
         """执行脚本"""
         try:
-            script = self.get_script(execution_data.script_id)
+            script = await self.get_script(execution_data.script_id)
             if not script:
                 raise ValueError(f"脚本不存在: {execution_data.script_id}")
             
             if script.status != ScriptStatus.ACTIVE:
                 raise ValueError(f"脚本状态不允许执行: {script.status}")
             
-            # 创建执行记录
-            execution = ScriptExecution(
-                script_id=script.id,
-                execution_id=str(uuid.uuid4()),
-                input_parameters=execution_data.input_parameters,
-                environment_vars=execution_data.environment_vars,
-                triggered_by=triggered_by or execution_data.triggered_by,
-                trigger_source=execution_data.trigger_source,
-                status=ExecutionStatus.PENDING
-            )
+            # 确定性脚本命中结果缓存时直接返回缓存结果，不进入执行队列
+            if execution_data.use_cache and result_cache.get_ttl(script) > 0:
+                execution = await self._execute_from_cache(script, execution_data, triggered_by)
+                if execution is not None:
+                    return execution
             
-            self.db.add(execution)
-            self.db.commit()
-            self.db.refresh(execution)
+            # 预留排队位置，队列已满时直接拒绝
+            distributed = settings.EXECUTION_MODE == "distributed"
+            if distributed:
+                await distributed_queue.check_capacity()
+            else:
+                execution_queue.reserve()
+            try:
+                # 创建执行记录
+                execution = ScriptExecution(
+                    script_id=script.id,
+                    execution_id=str(uuid.uuid4()),
+                    input_parameters=execution_data.input_parameters,
+                    environment_vars=execution_data.environment_vars,
+                    triggered_by=triggered_by or execution_data.triggered_by,
+                    trigger_source=execution_data.trigger_source,
+                    priority=self._get_execution_priority(script, execution_data),
+                    status=ExecutionStatus.PENDING
+                )
+                
+                self.db.add(execution)
+                await self.db.commit()
+                await self.db.refresh(execution)
+            except Exception:
+                if not distributed:
+                    execution_queue.release_reservation()
+                raise
             
-            # 异步执行脚本
-            asyncio.create_task(self._run_script_async(execution.id, script))
+            if distributed:
+                # 写入Redis Stream，由工作进程拉取执行
+                await self._dispatch_execution(execution)
+            else:
+                # 进入执行队列，获得运行槽位后才开始执行（使用独立的数据库会话）
+                self._enqueue_execution(execution.id, execution.priority, reserved=True)
             
-            logger.info(f"开始执行脚本: {script.name} (执行ID: {execution.execution_id})")
+            logger.info(f"脚本进入执行队列: {script.name} (执行ID: {execution.execution_id})")
             return execution
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"执行脚本失败: {str(e)}")
             raise
     
-    async def _run_script_async(self, execution_id: int, script: Script):
-        """异步运行脚本"""
-        execution = self.db.query(ScriptExecution).filter(
-            ScriptExecution.id == execution_id
-        ).first()
+    async def _execute_from_cache(
+        self,
+        script: Script,
+        execution_data: ScriptExecutionCreate,
+        triggered_by: str = None
+    ) -> Optional[ScriptExecution]:
+        """按缓存结果生成已完成的执行记录，未命中时返回None"""
+        env_vars = {**script.environment, **execution_data.environment_vars}
+        entry = await result_cache.lookup(
+            self.db,
+            result_cache.cache_key(script, execution_data.input_parameters, env_vars)
+        )
+        if entry is None:
+            return None
         
-        if not execution:
-            return
+        now = datetime.utcnow()
+        execution = ScriptExecution(
+            script_id=script.id,
+            execution_id=str(uuid.uuid4()),
+            input_parameters=execution_data.input_parameters,
+            environment_vars=execution_data.environment_vars,
+            triggered_by=triggered_by or execution_data.triggered_by,
+            trigger_source=execution_data.trigger_source,
+            priority=self._get_execution_priority(script, execution_data),
+            status=ExecutionStatus.SUCCESS,
+            output_bytes=entry.output_bytes,
+            error_bytes=entry.error_bytes,
+            exit_code=entry.exit_code,
+            start_time=now,
+            end_time=now,
+            duration=0,
+            duration_ms=0,
+            cached_from=entry.source_execution_id
+        )
+        self.db.add(execution)
+        await save_execution_output(self.db, execution, entry.output, entry.error_message)
+        await self.db.commit()
+        await record_execution(self.db, execution)
         
-        try:
-            # 更新状态为运行中
-            execution.status = ExecutionStatus.RUNNING
-            execution.start_time = datetime.utcnow()
-            self.db.commit()
-            
-            # 准备执行环境
-            env_vars = {**script.environment, **execution.environment_vars}
-            
-            # 根据脚本语言执行
-            if script.language == "python":
-                result = await self._execute_python_script(script, execution, env_vars)
-            elif script.language == "bash":
-                result = await self._execute_bash_script(script, execution, env_vars)
-            else:
-                raise ValueError(f"不支持的脚本语言: {script.language}")
-            
-            # 更新执行结果
-            execution.status = ExecutionStatus.SUCCESS if result["exit_code"] == 0 else ExecutionStatus.FAILED
-            execution.output = result["output"]
-            execution.error_message = result["error"]
-            execution.exit_code = result["exit_code"]
+        logger.info(f"脚本命中结果缓存: {script.name} (执行ID: {execution.execution_id}, 来源: {entry.source_execution_id})")
+        return execution
+    
+    def _get_execution_priority(self, script: Script, execution_data: ScriptExecutionCreate) -> int:
+        """获取执行优先级，请求参数优先于脚本配置"""
+        if execution_data.priority is not None:
+            return execution_data.priority
+        return int((script.config or {}).get("priority", 0))
+    
+    def _enqueue_execution(self, execution_id: int, priority: int, reserved: bool = False):
+        """提交执行到准入队列"""
+        execution_queue.submit(
+            execution_id,
+            priority,
+            lambda: self._run_script_async(execution_id),
+            reserved=reserved
+        )
+    
+    async def clear_result_cache(self, script_id: Optional[int] = None) -> int:
+        """清除结果缓存，script_id 为空时清空全部"""
+        removed = await result_cache.invalidate(self.db, script_id)
+        logger.info(f"清除结果缓存: {removed} 条 (脚本ID: {script_id or '全部'})")
+        return removed
+    
+    async def get_result_cache_stats(self, script_id: Optional[int] = None) -> Dict[str, Any]:
+        """获取结果缓存统计"""
+        return await result_cache.stats(self.db, script_id)
+    
+    async def submit_execution(self, execution: ScriptExecution):
+        """提交已创建的待执行记录，队列已满时抛出 QueueFullError"""
+        if settings.EXECUTION_MODE == "distributed":
+            await distributed_queue.check_capacity()
+            await self._dispatch_execution(execution)
+        else:
+            self._enqueue_execution(execution.id, execution.priority)
+    
+    async def submit_executions(self, executions: List[Tuple[int, int]]):
+        """批量提交已创建的待执行记录 (执行ID, 优先级)，调用方需先确认队列容量"""
+        if settings.EXECUTION_MODE == "distributed":
+            try:
+                await distributed_queue.enqueue_many(executions)
+            except Exception as e:
+                logger.error(f"批量分发执行失败: {str(e)}")
+                await self._fail_executions([execution_id for execution_id, _ in executions], f"分发执行失败: {str(e)}")
+        else:
+            for execution_id, priority in executions:
+                self._enqueue_execution(execution_id, priority)
+    
+    async def _fail_executions(self, execution_ids: List[int], reason: str):
+        """把未能提交的执行标记为失败"""
+        executions = (await self.db.execute(
+            select(ScriptExecution).where(ScriptExecution.id.in_(execution_ids))
+        )).scalars().all()
+        for execution in executions:
+            execution.status = ExecutionStatus.FAILED
             execution.end_time = datetime.utcnow()
-            execution.duration = int((execution.end_time - execution.start_time).total_seconds())
-            
-            self.db.commit()
-            
-            logger.info(f"脚本执行完成: {script.name} (状态: {execution.status.value})")
-            
+            await save_execution_output(self.db, execution, error_message=reason)
+        await self.db.commit()
+        await record_executions(self.db, executions)
+    
+    async def _dispatch_execution(self, execution: ScriptExecution):
+        """把执行分发到分布式队列，写入失败时标记执行失败"""
+        try:
+            await distributed_queue.enqueue(execution.id, execution.priority)
         except Exception as e:
-            # 更新状态为失败
             execution.status = ExecutionStatus.FAILED
-            execution.error_message = str(e)
             execution.end_time = datetime.utcnow()
-            if execution.start_time:
-                execution.duration = int((execution.end_time - execution.start_time).total_seconds())
+            await save_execution_output(self.db, execution, error_message=f"分发执行失败: {str(e)}")
+            await self.db.commit()
+            await record_execution(self.db, execution)
+            raise
+    
+    async def run_execution(self, execution_id: int):
+        """运行已排队的执行（供分布式工作进程调用）"""
+        await self._run_script_async(execution_id)
+    
+    async def recover_execution(self, execution_id: int):
+        """把被中断的执行恢复为待执行状态，以便重新运行"""
+        execution = await self.db.get(ScriptExecution, execution_id)
+        if execution and execution.status == ExecutionStatus.RUNNING:
+            execution.status = ExecutionStatus.PENDING
+            execution.start_time = None
+            await self.db.commit()
+    
+    async def abandon_execution(self, execution_id: int, reason: str):
+        """把无法完成的执行标记为失败"""
+        execution = await self.db.get(ScriptExecution, execution_id)
+        if execution and execution.status in [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]:
+            execution.status = ExecutionStatus.FAILED
+            set_execution_finished(execution)
+            await save_execution_output(self.db, execution, error_message=reason)
+            await self.db.commit()
+            await record_execution(self.db, execution)
+            await log_broker.finish(execution.execution_id, self.get_execution_status_event(execution))
+    
+    async def _run_script_async(self, execution_id: int):
+        """异步运行脚本
+        
+        执行任务在请求结束后继续运行，因此使用独立的数据库会话，
+        且只在更新状态时短暂占用连接。
+        """
+        async with SessionLocal() as db:
+            execution = await db.get(ScriptExecution, execution_id)
+            if not execution or execution.status != ExecutionStatus.PENDING:
+                return
             
-            self.db.commit()
-            logger.error(f"脚本执行异常: {script.name} - {str(e)}")
+            script = await db.get(Script, execution.script_id)
+            running = execution_control.track(execution.execution_id)
+            
+            try:
+                # 更新状态为运行中；条件更新，排队期间已被取消的执行不再运行
+                started = await db.execute(
+                    update(ScriptExecution)
+                    .where(ScriptExecution.id == execution.id, ScriptExecution.status == ExecutionStatus.PENDING)
+                    .values(status=ExecutionStatus.RUNNING, start_time=datetime.utcnow())
+                )
+                if started.rowcount == 0:
+                    await db.rollback()
+                    return
+                await db.commit()
+                observe_queue_wait(execution)
+                
+                # 准备执行环境
+                env_vars = {**script.environment, **execution.environment_vars}
+                
+                # 根据脚本语言执行
+                if script.language == "python" and self._get_execution_mode(script) == "function":
+                    result = await self._execute_function_script(script, execution, env_vars)
+                elif script.language == "python":
+                    result = await self._execute_python_script(script, execution, env_vars)
+                elif script.language == "bash":
+                    result = await self._execute_bash_script(script, execution, env_vars)
+                else:
+                    raise ValueError(f"不支持的脚本语言: {script.language}")
+                
+                # 更新执行结果
+                if running.cancelled.is_set():
+                    execution.status = ExecutionStatus.CANCELLED
+                elif result["exit_code"] == 0:
+                    execution.status = ExecutionStatus.SUCCESS
+                else:
+                    execution.status = result.get("limit_status") or ExecutionStatus.FAILED
+                execution.output_bytes = result.get("output_bytes")
+                execution.error_bytes = result.get("error_bytes")
+                execution.exit_code = result["exit_code"]
+                set_execution_finished(execution)
+                await save_execution_output(db, execution, result["output"], result["error"])
+                
+                await db.commit()
+                observe_runtime(script.language, execution)
+                await record_execution(db, execution)
+                await self._schedule_retry(db, script, execution)
+                if execution.status == ExecutionStatus.SUCCESS and result_cache.get_ttl(script) > 0:
+                    await result_cache.store(
+                        db,
+                        script,
+                        execution,
+                        result_cache.cache_key(script, execution.input_parameters, env_vars)
+                    )
+                await log_broker.finish(execution.execution_id, self.get_execution_status_event(execution))
+                
+                logger.info(f"脚本执行完成: {script.name} (状态: {execution.status.value})")
+                
+            except Exception as e:
+                # 更新状态为失败
+                execution.status = ExecutionStatus.CANCELLED if running.cancelled.is_set() else ExecutionStatus.FAILED
+                set_execution_finished(execution)
+                await save_execution_output(db, execution, error_message=str(e))
+                
+                await db.commit()
+                observe_runtime(script.language, execution)
+                await record_execution(db, execution)
+                await self._schedule_retry(db, script, execution)
+                await log_broker.finish(execution.execution_id, self.get_execution_status_event(execution))
+                logger.error(f"脚本执行异常: {script.name} - {str(e)}")
+            finally:
+                execution_control.untrack(execution.execution_id)
     
-    async def _execute_python_script(
+    async def _schedule_retry(self, db: AsyncSession, script: Script, execution: ScriptExecution):
+        """失败的执行按脚本重试配置创建重试执行，到期后才进入执行队列"""
+        try:
+            retry = await create_retry(db, script, execution)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"创建重试执行失败: {execution.execution_id} - {str(e)}")
+            return
+        if retry is not None:
+            retry_scheduler.schedule(retry)
+    
+    def _get_execution_backend(self, script: Script) -> str:
+        """获取脚本执行后端，脚本配置优先于全局配置"""
+        return (script.config or {}).get("execution_backend", settings.SCRIPT_EXECUTION_BACKEND)
+    
+    def _get_execution_mode(self, script: Script) -> str:
+        """获取脚本执行模式: process(独立进程) / function(常驻进程池调用 main(params))"""
+        return (script.config or {}).get("execution_mode", "process")
+    
+    async def _execute_function_script(
         self, 
         script: Script, 
         execution: ScriptExecution, 
         env_vars: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """执行Python脚本"""
+        """在常驻进程池中执行函数式Python脚本"""
         try:
-            # 创建临时脚本文件
-            script_file = f"/tmp/script_{execution.execution_id}.py"
-            with open(script_file, 'w', encoding='utf-8') as f:
-                f.write(script.content)
-            
-            # 执行脚本
-            process = await asyncio.create_subprocess_exec(
-                'python', script_file,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env_vars
+            pool = worker_pool_manager.get_pool(
+                script.id,
+                ScriptExecutor.content_hash(script.content),
+                script.content,
+                script.config or {}
             )
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(), 
-                    timeout=script.timeout
+                # 取消时中断调用，工作进程随之被丢弃
+                response = await execution_control.wait(
+                    execution.execution_id,
+                    pool.call(execution.input_parameters or {}, env_vars, timeout=script.timeout),
+                    timeout=None
                 )
-                
-                return {
-                    "output": stdout.decode('utf-8'),
-                    "error": stderr.decode('utf-8'),
-                    "exit_code": process.returncode
-                }
-                
             except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
                 raise Exception("脚本执行超时")
+            
+            apply_rusage(execution, response.get("rusage"))
+            
+            # 输出已在工作进程内按 SCRIPT_OUTPUT_MEMORY_LIMIT 截断，日志文件保存的也是截断后的内容
+            result = {"exit_code": response["exit_code"]}
+            for stream, key in (("stdout", "output"), ("stderr", "error")):
+                data = response[stream]
+                async with log_broker.open_writer(execution.execution_id, stream) as log_writer:
+                    await log_writer.write(data.encode('utf-8'))
+                result[key] = data
+                result[f"{key}_bytes"] = response[f"{stream}_bytes"]
+            
+            return result
+            
+        except Exception as e:
+            return {
+                "output": "",
+                "error": str(e),
+                "exit_code": 1
+            }
+    
+    async def _execute_python_script(
+        self, 
+        script: Script, 
+        execution: ScriptExecution, 
+        env_vars: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """执行Python脚本"""
+        try:
+            # 获取内容寻址的脚本缓存文件（含预编译字节码）
+            script_file = script_store.get_path(script.content, "python")
+            
+            # 执行脚本
+            execution.resource_profile = resolve_profile(script.config, execution.priority)
+            backend = self._get_execution_backend(script)
+            started = time.perf_counter()
+            if backend == "forkserver":
+                process = await get_forkserver("python").spawn(
+                    script_file, env=env_vars, limits=execution.resource_profile
+                )
+            else:
+                # 字节码由本进程编译，用同一解释器运行才能命中 .pyc
+                process = await create_child_process(
+                    sys.executable, script_file, env=env_vars, limits=execution.resource_profile
+                )
+            observe_spawn(backend, started)
+            
+            return await self._collect_process_output(process, script, execution)
                 
         except Exception as e:
             return {
@@ -300,38 +623,18 @@ class ScriptService:
     ) -> Dict[str, Any]:
         """执行Bash脚本"""
         try:
-            # 创建临时脚本文件
-            script_file = f"/tmp/script_{execution.execution_id}.sh"
-            with open(script_file, 'w', encoding='utf-8') as f:
-                f.write(script.content)
-            
-            # 设置执行权限
-            subprocess.run(['chmod', '+x', script_file])
+            # 获取内容寻址的脚本缓存文件
+            script_file = script_store.get_path(script.content, "bash")
             
             # 执行脚本
-            process = await asyncio.create_subprocess_exec(
-                'bash', script_file,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env_vars
+            execution.resource_profile = resolve_profile(script.config, execution.priority)
+            started = time.perf_counter()
+            process = await create_child_process(
+                'bash', script_file, env=env_vars, limits=execution.resource_profile
             )
+            observe_spawn("subprocess", started)
             
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(), 
-                    timeout=script.timeout
-                )
-                
-                return {
-                    "output": stdout.decode('utf-8'),
-                    "error": stderr.decode('utf-8'),
-                    "exit_code": process.returncode
-                }
-                
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
-                raise Exception("脚本执行超时")
+            return await self._collect_process_output(process, script, execution)
                 
         except Exception as e:
             return {
@@ -340,54 +643,371 @@ class ScriptService:
                 "exit_code": 1
             }
     
-    def get_execution(self, execution_id: str) -> Optional[ScriptExecution]:
-        """获取执行记录"""
-        return self.db.query(ScriptExecution).filter(
-            ScriptExecution.execution_id == execution_id
-        ).first()
+    async def _capture_stream(
+        self,
+        reader: asyncio.StreamReader,
+        buffer: BoundedOutputBuffer,
+        log_writer: ExecutionLogWriter
+    ):
+        """增量读取输出流，写入有界缓冲区并分块落盘"""
+        async with log_writer:
+            while True:
+                chunk = await reader.read(OUTPUT_READ_SIZE)
+                if not chunk:
+                    break
+                buffer.write(chunk)
+                await log_writer.write(chunk)
     
-    def get_executions(
+    async def _collect_process_output(
+        self,
+        process,
+        script: Script,
+        execution: ScriptExecution
+    ) -> Dict[str, Any]:
+        """流式收集进程输出并等待进程结束"""
+        stdout_buffer = BoundedOutputBuffer(settings.SCRIPT_OUTPUT_MEMORY_LIMIT)
+        stderr_buffer = BoundedOutputBuffer(settings.SCRIPT_OUTPUT_MEMORY_LIMIT)
+        execution_control.attach(execution.execution_id, process)
+        
+        try:
+            await execution_control.wait(
+                execution.execution_id,
+                asyncio.gather(
+                    self._capture_stream(
+                        process.stdout, stdout_buffer,
+                        log_broker.open_writer(execution.execution_id, "stdout")
+                    ),
+                    self._capture_stream(
+                        process.stderr, stderr_buffer,
+                        log_broker.open_writer(execution.execution_id, "stderr")
+                    ),
+                    process.wait()
+                ),
+                timeout=script.timeout
+            )
+        except asyncio.TimeoutError:
+            # 与取消相同，终止整个进程组，脚本启动的子进程不会在超时后残留
+            await terminate_process_group(process, execution_control.grace)
+            raise Exception("脚本执行超时")
+        except ExecutionCancelled:
+            # 进程组在后台终止，保留取消前的输出
+            pass
+        finally:
+            process.close_pipes()
+            apply_rusage(execution, process.rusage)
+        
+        error = stderr_buffer.getvalue()
+        limit_status = None
+        if not execution_control.is_cancelled(execution.execution_id):
+            limit_status = classify_limit_violation(
+                execution.resource_profile,
+                process.returncode,
+                (execution.cpu_user_ms or 0) + (execution.cpu_system_ms or 0),
+                error,
+                execution.max_rss_kb
+            )
+        return {
+            "output": stdout_buffer.getvalue(),
+            "error": error,
+            "exit_code": process.returncode,
+            "output_bytes": stdout_buffer.total_bytes,
+            "error_bytes": stderr_buffer.total_bytes,
+            "limit_status": limit_status
+        }
+    
+    async def get_execution(self, execution_id: str, with_output: bool = True) -> Optional[ScriptExecution]:
+        """获取执行记录（with_output 时加载输出），已归档的执行从归档文件读取"""
+        query = select(ScriptExecution).where(ScriptExecution.execution_id == execution_id)
+        if with_output:
+            query = query.options(*OUTPUT_LOAD_OPTIONS)
+        execution = await self.db.scalar(query)
+        if execution is None:
+            execution = await load_archived_execution(self.db, execution_id)
+        return execution
+    
+    async def get_output_reader(self, execution_id: str, stream: str) -> Optional[ExecutionOutputReader]:
+        """
+        获取执行输出流的读取器，执行不存在时返回None。
+        优先读取完整日志（缓存命中的执行读取被引用执行的日志），
+        日志不存在时使用数据库或归档中保存的输出（可能已截断）。
+        """
+        execution = await self.get_execution(execution_id, with_output=False)
+        if execution is None:
+            return None
+        for source in (execution.execution_id, execution.cached_from):
+            if source and execution_log_store.get_path(source, stream).exists():
+                return ExecutionOutputReader(source, stream)
+        
+        if execution in self.db:
+            execution = await self.get_execution(execution_id)
+        text = execution.output if stream == "stdout" else execution.error_message
+        return ExecutionOutputReader(None, stream, (text or "").encode("utf-8"))
+    
+    @staticmethod
+    def get_execution_status_event(execution: ScriptExecution) -> Optional[Dict[str, Any]]:
+        """获取执行结束状态事件，执行未结束时返回None"""
+        if execution.status in [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]:
+            return None
+        return {
+            "execution_id": execution.execution_id,
+            "status": execution.status.value,
+            "exit_code": execution.exit_code,
+            "output_bytes": execution.output_bytes,
+            "error_bytes": execution.error_bytes,
+            "duration": execution.duration
+        }
+    
+    async def get_executions(
         self, 
         script_id: Optional[int] = None,
         status: Optional[ExecutionStatus] = None,
         skip: int = 0, 
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        retry_of: Optional[str] = None
     ) -> List[ScriptExecution]:
-        """获取执行记录列表"""
-        query = self.db.query(ScriptExecution)
+        """获取执行记录列表，指定游标时按游标分页并忽略skip"""
+        query = select(ScriptExecution)
         
         if script_id:
-            query = query.filter(ScriptExecution.script_id == script_id)
+            query = query.where(ScriptExecution.script_id == script_id)
+        
+        if batch_id:
+            query = query.where(ScriptExecution.batch_id == batch_id)
+        
+        if retry_of:
+            query = query.where(ScriptExecution.retry_of == retry_of)
         
         if status:
-            query = query.filter(ScriptExecution.status == status)
+            query = query.where(ScriptExecution.status == status)
+        
+        if cursor:
+            query = apply_cursor(query, ScriptExecution, cursor)
+            skip = 0
         
-        return query.order_by(desc(ScriptExecution.created_at)).offset(skip).limit(limit).all()
+        result = await self.db.execute(
+            order_by_recent(query, ScriptExecution).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
     
-    def cancel_execution(self, execution_id: str) -> bool:
-        """取消执行"""
+    async def cancel_execution(self, execution_id: str) -> bool:
+        """
+        取消执行：排队中的执行移出队列，运行中的执行终止其进程组（可能在其他副本/工作进程上）。
+        状态以条件更新切换，由实际被更新的原状态决定后续处理，不会与开始运行的执行任务冲突
+        """
         try:
-            execution = self.get_execution(execution_id)
-            if not execution or execution.status not in [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]:
-                return False
+            def cancel_from(status: ExecutionStatus):
+                return (
+                    update(ScriptExecution)
+                    .where(ScriptExecution.execution_id == execution_id, ScriptExecution.status == status)
+                    .values(status=ExecutionStatus.CANCELLED, end_time=datetime.utcnow())
+                    .returning(ScriptExecution)
+                )
             
-            execution.status = ExecutionStatus.CANCELLED
-            execution.end_time = datetime.utcnow()
-            if execution.start_time:
-                execution.duration = int((execution.end_time - execution.start_time).total_seconds())
+            # 尚未开始的执行：移出队列并计入统计（执行任务开始时发现已取消不会运行）
+            execution = (await self.db.scalars(cancel_from(ExecutionStatus.PENDING))).first()
+            if execution is not None:
+                await self.db.commit()
+                execution_queue.remove(execution.id)
+                await record_execution(self.db, execution)
+                logger.info(f"取消脚本执行: {execution_id}")
+                return True
             
-            self.db.commit()
+            # 运行中的执行：终止进程组，由执行任务结束时计入统计
+            execution = (await self.db.scalars(cancel_from(ExecutionStatus.RUNNING))).first()
+            if execution is None:
+                await self.db.rollback()
+                return False
+            await self.db.commit()
+            await execution_control.cancel(execution_id)
             
             logger.info(f"取消脚本执行: {execution_id}")
             return True
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"取消执行失败: {str(e)}")
             raise
     
+    # 批量执行
+    async def execute_batch(
+        self,
+        script_id: int,
+        batch_data: ScriptBatchExecutionCreate,
+        triggered_by: str = None
+    ) -> Dict[str, Any]:
+        """批量执行脚本
+        
+        所有执行记录用一条批量插入语句写入，之后由 batch_feeder 按批次并发上限
+        逐步提交到执行队列，避免一个批次占满队列。
+        """
+        try:
+            script = await self.get_script(script_id)
+            if not script:
+                raise ValueError(f"脚本不存在: {script_id}")
+            
+            if script.status != ScriptStatus.ACTIVE:
+                raise ValueError(f"脚本状态不允许执行: {script.status}")
+            
+            if len(batch_data.input_parameters) > settings.BATCH_MAX_ITEMS:
+                raise ValueError(f"批量执行最多 {settings.BATCH_MAX_ITEMS} 组参数")
+            
+            batch_id = str(uuid.uuid4())
+            priority = self._get_execution_priority(
+                script,
+                ScriptExecutionCreate(script_id=script.id, priority=batch_data.priority)
+            )
+            base = {
+                "script_id": script.id,
+                "batch_id": batch_id,
+                "batch_concurrency": batch_data.max_concurrency or settings.BATCH_MAX_CONCURRENCY,
+                "environment_vars": batch_data.environment_vars,
+                "triggered_by": triggered_by or batch_data.triggered_by,
+                "trigger_source": "batch",
+                "priority": priority,
+                "status": ExecutionStatus.PENDING,
+            }
+            rows = [
+                {**base, "execution_id": str(uuid.uuid4()), "input_parameters": parameters}
+                for parameters in batch_data.input_parameters
+            ]
+            
+            # 命中结果缓存的参数组直接写入成功结果
+            cached_outputs = {}
+            if batch_data.use_cache and result_cache.get_ttl(script) > 0:
+                env_vars = {**script.environment, **batch_data.environment_vars}
+                keys = [result_cache.cache_key(script, row["input_parameters"], env_vars) for row in rows]
+                entries = await result_cache.lookup_many(self.db, keys)
+                now = datetime.utcnow()
+                for row, key in zip(rows, keys):
+                    entry = entries.get(key)
+                    if entry is None:
+                        continue
+                    row.update(
+                        status=ExecutionStatus.SUCCESS,
+                        output_bytes=entry.output_bytes,
+                        error_bytes=entry.error_bytes,
+                        exit_code=entry.exit_code,
+                        start_time=now,
+                        end_time=now,
+                        duration=0,
+                        duration_ms=0,
+                        cached_from=entry.source_execution_id
+                    )
+                    cached_outputs[row["execution_id"]] = entry
+            cached = len(cached_outputs)
+            
+            await self.db.execute(insert(ScriptExecution), rows)
+            hits = []
+            if cached:
+                hits = (await self.db.execute(
+                    select(ScriptExecution).where(
+                        ScriptExecution.batch_id == batch_id,
+                        ScriptExecution.cached_from.isnot(None)
+                    )
+                )).scalars().all()
+                await insert_execution_outputs(self.db, [
+                    {
+                        "id": execution.id,
+                        "output": cached_outputs[execution.execution_id].output,
+                        "error_message": cached_outputs[execution.execution_id].error_message,
+                    }
+                    for execution in hits
+                ])
+            await self.db.commit()
+            await record_executions(self.db, hits)
+            
+            if cached < len(rows):
+                batch_feeder.wakeup()
+            
+            logger.info(f"批量执行脚本: {script.name} (批次ID: {batch_id}, 数量: {len(rows)}, 命中缓存: {cached})")
+            return await self.get_batch(batch_id)
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"批量执行脚本失败: {str(e)}")
+            raise
+    
+    async def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """获取批量执行进度，批次不存在时返回None"""
+        rows = (await self.db.execute(
+            select(ScriptExecution.script_id, ScriptExecution.status, func.count())
+            .where(ScriptExecution.batch_id == batch_id)
+            .group_by(ScriptExecution.script_id, ScriptExecution.status)
+        )).all()
+        if not rows:
+            return None
+        
+        counts = {status: count for _, status, count in rows}
+        pending = counts.get(ExecutionStatus.PENDING, 0)
+        running = counts.get(ExecutionStatus.RUNNING, 0)
+        success = counts.get(ExecutionStatus.SUCCESS, 0)
+        failed = sum(counts.get(status, 0) for status in FAILED_STATUSES)
+        cancelled = counts.get(ExecutionStatus.CANCELLED, 0)
+        total = sum(counts.values())
+        finished = success + failed + cancelled
+        
+        if pending or running:
+            status = ExecutionStatus.RUNNING if running or finished else ExecutionStatus.PENDING
+        elif failed:
+            status = ExecutionStatus.FAILED
+        elif cancelled:
+            status = ExecutionStatus.CANCELLED
+        else:
+            status = ExecutionStatus.SUCCESS
+        
+        return {
+            "batch_id": batch_id,
+            "script_id": rows[0][0],
+            "status": status,
+            "total": total,
+            "pending": pending,
+            "running": running,
+            "success": success,
+            "failed": failed,
+            "cancelled": cancelled,
+            "progress": round(finished * 100 / total, 1),
+        }
+    
+    async def cancel_batch(self, batch_id: str) -> bool:
+        """取消批量执行中所有未结束的执行"""
+        try:
+            # 尚未开始的执行以一条条件更新标记取消（不再被提交或开始运行），运行中的执行逐个取消
+            pending = (await self.db.scalars(
+                update(ScriptExecution)
+                .where(ScriptExecution.batch_id == batch_id, ScriptExecution.status == ExecutionStatus.PENDING)
+                .values(status=ExecutionStatus.CANCELLED, end_time=datetime.utcnow())
+                .returning(ScriptExecution)
+            )).all()
+            await self.db.commit()
+            for execution in pending:
+                execution_queue.remove(execution.id)
+            await record_executions(self.db, pending)
+            
+            running = (await self.db.scalars(
+                select(ScriptExecution.execution_id).where(
+                    ScriptExecution.batch_id == batch_id,
+                    ScriptExecution.status == ExecutionStatus.RUNNING
+                )
+            )).all()
+            cancelled = len(pending)
+            for execution_id in running:
+                if await self.cancel_execution(execution_id):
+                    cancelled += 1
+            if not cancelled:
+                return False
+            
+            logger.info(f"取消批量执行: {batch_id} (取消数量: {cancelled})")
+            return True
+            
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"取消批量执行失败: {str(e)}")
+            raise
+    
     # 脚本模板管理
-    def create_template(self, template_data: ScriptTemplateCreate, created_by: str = None) -> ScriptTemplate:
+    async def create_template(self, template_data: ScriptTemplateCreate, created_by: str = None) -> ScriptTemplate:
         """创建脚本模板"""
         try:
             template = ScriptTemplate(
@@ -395,99 +1015,123 @@ class ScriptService:
                 created_by=created_by
             )
             self.db.add(template)
-            self.db.commit()
-            self.db.refresh(template)
+            await self.db.commit()
+            await self.db.refresh(template)
             
             logger.info(f"创建脚本模板成功: {template.name} (ID: {template.id})")
             return template
             
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             logger.error(f"创建脚本模板失败: {str(e)}")
             raise
     
-    def get_templates(
-        self, 
-        skip: int = 0, 
-        limit: int = 100,
+    def _templates_query(
+        self,
         category: Optional[str] = None,
         is_public: bool = True,
         search: Optional[str] = None
-    ) -> List[ScriptTemplate]:
-        """获取脚本模板列表"""
-        query = self.db.query(ScriptTemplate)
+    ):
+        """构建带筛选条件的模板查询，返回(查询, 检索相关度排序表达式)"""
+        query = select(ScriptTemplate)
         
         if is_public is not None:
-            query = query.filter(ScriptTemplate.is_public == is_public)
+            query = query.where(ScriptTemplate.is_public == is_public)
         
         if category:
-            query = query.filter(ScriptTemplate.category == category)
+            query = query.where(ScriptTemplate.category == category)
         
+        rank = None
         if search:
-            query = query.filter(
-                or_(
-                    ScriptTemplate.name.ilike(f"%{search}%"),
-                    ScriptTemplate.description.ilike(f"%{search}%")
-                )
-            )
+            query, rank = apply_search(query, ScriptTemplate, search, self.db.get_bind().dialect.name)
         
-        return query.order_by(desc(ScriptTemplate.created_at)).offset(skip).limit(limit).all()
+        return query, rank
     
-    def get_templates_count(
+    async def get_templates(
+        self, 
+        skip: int = 0, 
+        limit: int = 100,
+        category: Optional[str] = None,
+        is_public: bool = True,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None
+    ) -> List[ScriptTemplate]:
+        """获取脚本模板列表，指定游标时按游标分页并忽略skip；检索时按相关度排序"""
+        query, rank = self._templates_query(category, is_public, search)
+        query = self._order_list_query(query, ScriptTemplate, rank, search, cursor)
+        if cursor:
+            skip = 0
+        
+        result = await self.db.execute(query.offset(skip).limit(limit))
+        return result.scalars().all()
+    
+    async def get_templates_count(
         self,
         category: Optional[str] = None,
         is_public: bool = True,
-        search: Optional[str] = None
-    ) -> int:
+        search: Optional[str] = None,
+        count_mode: str = "exact"
+    ) -> Optional[int]:
         """获取脚本模板总数"""
-        query = self.db.query(ScriptTemplate)
-        
-        if is_public is not None:
-            query = query.filter(ScriptTemplate.is_public == is_public)
-        
-        if category:
-            query = query.filter(ScriptTemplate.category == category)
-        
-        if search:
-            query = query.filter(
-                or_(
-                    ScriptTemplate.name.ilike(f"%{search}%"),
-                    ScriptTemplate.description.ilike(f"%{search}%")
-                )
-            )
-        
-        return query.count()
+        query, _ = self._templates_query(category, is_public, search)
+        return await count_rows(self.db, query, count_mode)
     
-    def get_statistics(self) -> Dict[str, Any]:
-        """获取脚本统计信息"""
+    async def get_resource_ranking(
+        self,
+        window: Optional[str] = None,
+        order_by: str = "cpu",
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """脚本资源使用排行"""
+        return await get_resource_ranking(self.db, window=window, order_by=order_by, limit=limit)
+    
+    async def get_statistics(self, window: Optional[str] = None, script_id: Optional[int] = None) -> Dict[str, Any]:
+        """获取脚本统计信息
+        
+        执行统计读取按小时/天汇总的计数，window 可选 1h / 24h / 7d，
+        为空时统计全部历史；script_id 为空时统计全部脚本。
+        """
         try:
             # 脚本统计
-            total_scripts = self.db.query(Script).count()
-            active_scripts = self.db.query(Script).filter(Script.status == ScriptStatus.ACTIVE).count()
+            total_scripts = await self.db.scalar(select(func.count()).select_from(Script))
+            active_scripts = await self.db.scalar(
+                select(func.count()).select_from(Script).where(Script.status == ScriptStatus.ACTIVE)
+            )
             
             # 执行统计
-            total_executions = self.db.query(ScriptExecution).count()
-            success_executions = self.db.query(ScriptExecution).filter(
-                ScriptExecution.status == ExecutionStatus.SUCCESS
-            ).count()
+            summary = await get_rollup_summary(self.db, window=window, script_id=script_id)
+            
+            # 排队和运行中的执行尚未计入汇总
+            active_query = select(func.count()).select_from(ScriptExecution).where(
+                ScriptExecution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING])
+            )
+            if script_id:
+                active_query = active_query.where(ScriptExecution.script_id == script_id)
+            active_executions = await self.db.scalar(active_query)
             
-            success_rate = (success_executions / total_executions * 100) if total_executions > 0 else 0
+            total_executions = summary["total"]
+            success_rate = (summary["success"] / total_executions * 100) if total_executions > 0 else 0
             
-            # 平均执行时间
-            avg_duration = self.db.query(func.avg(ScriptExecution.duration)).filter(
-                ScriptExecution.status == ExecutionStatus.SUCCESS,
-                ScriptExecution.duration.isnot(None)
-            ).scalar() or 0
+            # 平均执行时间（成功的执行，秒）
+            avg_duration = summary["duration_ms_sum"] / 1000 / summary["duration_count"] if summary["duration_count"] else 0
             
             # 最近执行记录
-            recent_executions = self.get_executions(limit=10)
+            recent_executions = await self.get_executions(script_id=script_id, limit=10)
             
             return {
                 "total_scripts": total_scripts,
                 "active_scripts": active_scripts,
-                "total_executions": total_executions,
+                "total_executions": total_executions + active_executions,
+                "finished_executions": total_executions,
+                "active_executions": active_executions,
+                "success_executions": summary["success"],
+                "failed_executions": summary["failed"],
+                "cancelled_executions": summary["cancelled"],
                 "success_rate": round(success_rate, 2),
-                "avg_execution_time": round(avg_duration, 2),
+                "avg_execution_time": round(float(avg_duration), 3),
+                "window": window,
+                "since": summary["since"],
+                "timeline": summary.get("timeline", []),
                 "recent_executions": recent_executions
             }
             
@@ -0,0 +1,138 @@
+"""
+内容寻址的脚本文件缓存
+
+脚本内容按哈希写入 `SCRIPT_STORAGE_PATH/cache`，每个脚本版本只写一次磁盘，
+Python脚本同时保存预编译字节码。长时间未使用的缓存条目由定时任务清理。
+"""
+
+import logging
+import os
+import py_compile
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from app.core.config import settings
+from app.utils.script_utils import ScriptExecutor
+
+logger = logging.getLogger(__name__)
+
+# 各语言缓存文件扩展名
+LANGUAGE_EXTENSIONS = {
+    "python": ".py",
+    "bash": ".sh",
+}
+
+# 使用时刷新mtime的最小间隔(秒)，垃圾回收依据mtime判断条目是否过期
+TOUCH_INTERVAL = 3600
+
+
+class ScriptStore:
+    """内容寻址脚本缓存"""
+
+    def __init__(self, root: str):
+        self.root = Path(root) / "cache"
+        # 摘要 -> (可执行文件路径, 最近一次刷新mtime的时间)
+        self._entries: Dict[str, tuple] = {}
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _materialize(self, digest: str, content: str, language: str) -> Path:
+        """写入脚本源文件及字节码，返回实际执行的文件路径"""
+        directory = self.root / digest[:2]
+        source_path = directory / f"{digest}{LANGUAGE_EXTENSIONS[language]}"
+        if not source_path.exists():
+            self._write_atomic(source_path, content.encode("utf-8"))
+
+        if language != "python":
+            return source_path
+
+        compiled_path = directory / f"{digest}.pyc"
+        if not compiled_path.exists():
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".pyc")
+            os.close(fd)
+            try:
+                py_compile.compile(str(source_path), cfile=tmp_path, dfile=str(source_path), doraise=True)
+                os.replace(tmp_path, compiled_path)
+            except py_compile.PyCompileError:
+                # 语法错误时直接执行源文件，由解释器报告错误
+                os.unlink(tmp_path)
+                return source_path
+        return compiled_path
+
+    def get_path(self, content: str, language: str) -> str:
+        """获取脚本内容对应的缓存文件路径，不存在时写入"""
+        if language not in LANGUAGE_EXTENSIONS:
+            raise ValueError(f"不支持的脚本语言: {language}")
+
+        digest = ScriptExecutor.content_hash(content)
+        now = time.time()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            path, touched_at = entry
+            if now - touched_at < TOUCH_INTERVAL:
+                return str(path)
+            try:
+                os.utime(path)
+                self._entries[digest] = (path, now)
+                return str(path)
+            except FileNotFoundError:
+                pass
+
+        path = self._materialize(digest, content, language)
+        os.utime(path)
+        self._entries[digest] = (path, now)
+        return str(path)
+
+    def collect_garbage(self, max_age_seconds: int) -> int:
+        """删除超过指定时间未使用的缓存条目，返回删除的文件数"""
+        if not self.root.exists():
+            return 0
+
+        # 同一摘要的源文件与字节码作为一个条目，按其中最近的mtime判断
+        groups: Dict[str, list] = {}
+        for path in self.root.glob("*/*"):
+            if not path.name.startswith(".tmp-"):
+                groups.setdefault(path.stem, []).append(path)
+
+        expire_before = time.time() - max_age_seconds
+        removed = 0
+        for paths in groups.values():
+            try:
+                if max(path.stat().st_mtime for path in paths) >= expire_before:
+                    continue
+            except FileNotFoundError:
+                pass
+            for path in paths:
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+
+        self._entries = {
+            digest: entry for digest, entry in self._entries.items()
+            if entry[0].exists()
+        }
+        return removed
+
+
+script_store = ScriptStore(settings.SCRIPT_STORAGE_PATH)
+
+
+def collect_script_cache() -> None:
+    """定时清理过期的脚本缓存"""
+    removed = script_store.collect_garbage(settings.SCRIPT_CACHE_MAX_AGE_DAYS * 86400)
+    if removed:
+        logger.info(f"清理过期脚本缓存: {removed} 个文件")
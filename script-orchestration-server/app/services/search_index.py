@@ -0,0 +1,161 @@
+"""
+脚本和模板全文检索
+
+PostgreSQL: 名称、描述、分类（可选内容）上的 tsvector 表达式GIN索引用于分词检索和排序，
+pg_trgm GIN索引服务名称/描述的子串匹配（中文等不分词的文本依赖它）。
+表达式索引由数据库随写入自动维护。
+
+SQLite: 使用 trigram 分词的 FTS5 外部内容表，通过触发器在插入/更新/删除时同步。
+检索词短于3个字符时 trigram 无法匹配，退化为 LIKE 扫描。
+"""
+
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import Select, column, desc, func, literal_column, or_, select, table
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词的最小匹配长度
+TRIGRAM_MIN_LENGTH = 3
+
+# pg_trgm 是否可用（启动时检测）
+_trigram_enabled = False
+
+
+class SearchSpec:
+    """一张表的检索配置"""
+
+    def __init__(self, table_name: str, columns: Tuple[str, ...], content_column: str):
+        self.table_name = table_name
+        self.columns = columns + ((content_column,) if settings.SEARCH_INCLUDE_CONTENT else ())
+        # 索引覆盖的列变化时使用新的索引名，避免沿用旧定义
+        self.suffix = "_content" if settings.SEARCH_INCLUDE_CONTENT else ""
+
+    @property
+    def fts_table(self) -> str:
+        return f"{self.table_name}_search{self.suffix}"
+
+    def document_sql(self) -> str:
+        """tsvector 表达式，查询与索引必须使用完全相同的表达式"""
+        text = " || ' ' || ".join(f"coalesce({name}, '')" for name in self.columns)
+        return f"to_tsvector('simple', {text})"
+
+
+SEARCH_SPECS = {
+    "scripts": SearchSpec("scripts", ("name", "description", "category"), "content"),
+    "script_templates": SearchSpec("script_templates", ("name", "description", "category"), "template_content"),
+}
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_query(term: str) -> Optional[str]:
+    """把检索词转换为FTS5查询（各词为子串且同时出现），无法使用trigram时返回None"""
+    tokens = term.split()
+    if not tokens or any(len(token) < TRIGRAM_MIN_LENGTH for token in tokens):
+        return None
+    return " ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+def apply_search(query: Select, model, term: str, dialect_name: str) -> Tuple[Select, Optional[object]]:
+    """为查询加上检索条件，返回(查询, 排序表达式)；无法排序时排序表达式为None"""
+    spec = SEARCH_SPECS[model.__tablename__]
+    term = term.strip()
+    if not term:
+        return query, None
+
+    pattern = f"%{_escape_like(term)}%"
+    if dialect_name == "postgresql":
+        document = literal_column(spec.document_sql())
+        tsquery = func.websearch_to_tsquery(literal_column("'simple'"), term)
+        query = query.where(or_(
+            document.op("@@")(tsquery),
+            model.name.ilike(pattern, escape="\\"),
+            model.description.ilike(pattern, escape="\\")
+        ))
+        rank = func.ts_rank(document, tsquery)
+        if _trigram_enabled:
+            rank = rank + func.similarity(model.name, term)
+        return query, desc(rank)
+
+    match = _fts_query(term) if dialect_name == "sqlite" else None
+    if match is not None:
+        fts = table(spec.fts_table, column("rowid"))
+        fts_ref = literal_column(spec.fts_table)
+        matches = (
+            select(fts.c.rowid.label("rowid"), func.bm25(fts_ref).label("rank"))
+            .select_from(fts)
+            .where(fts_ref.op("MATCH")(match))
+            .subquery()
+        )
+        return query.join(matches, matches.c.rowid == model.id), matches.c.rank
+
+    return query.where(or_(
+        *(getattr(model, name).ilike(pattern, escape="\\") for name in spec.columns)
+    )), None
+
+
+def _create_postgresql_indexes(connection: Connection) -> None:
+    global _trigram_enabled
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        _trigram_enabled = True
+    except Exception as e:
+        logger.warning(f"pg_trgm 扩展不可用，子串检索将不使用索引: {str(e)}")
+
+    for spec in SEARCH_SPECS.values():
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_{spec.table_name}_search{spec.suffix} "
+            f"ON {spec.table_name} USING GIN ({spec.document_sql()})"
+        )
+        if _trigram_enabled:
+            for name in ("name", "description"):
+                connection.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS ix_{spec.table_name}_{name}_trgm "
+                    f"ON {spec.table_name} USING GIN ({name} gin_trgm_ops)"
+                )
+
+
+def _create_sqlite_indexes(connection: Connection) -> None:
+    for spec in SEARCH_SPECS.values():
+        fts = spec.fts_table
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first()
+
+        columns = ", ".join(spec.columns)
+        new_values = ", ".join(f"new.{name}" for name in spec.columns)
+        old_values = ", ".join(f"old.{name}" for name in spec.columns)
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, "
+            f"content='{spec.table_name}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {spec.table_name} BEGIN "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {spec.table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {spec.table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        ]
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+
+        if not exists:
+            # 新建的索引需要从已有数据构建
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def create_search_indexes(connection: Connection) -> None:
+    """创建检索索引（幂等），在启动时通过 run_sync 调用"""
+    dialect_name = connection.dialect.name
+    if dialect_name == "postgresql":
+        _create_postgresql_indexes(connection)
+    elif dialect_name == "sqlite":
+        _create_sqlite_indexes(connection)
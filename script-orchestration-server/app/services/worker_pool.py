@@ -0,0 +1,454 @@
+"""
+函数式脚本常驻工作进程池
+
+脚本通过 `Script.config` 开启 `execution_mode = "function"` 后，需暴露 `main(params)` 函数。
+脚本只在常驻工作进程中加载一次，每次执行只是一次携带 `input_parameters` 的IPC调用，
+不再创建新进程。工作进程执行达到指定次数或内存超过上限后会被回收，
+脚本内容哈希变化时整个进程池会重新加载。
+
+脚本输出在工作进程内写入有界缓冲区（SCRIPT_OUTPUT_MEMORY_LIMIT，保留开头和结尾），
+经IPC返回的输出不超过该上限。空闲超过 FUNCTION_WORKER_IDLE_TIMEOUT 秒的工作进程被关闭；
+所有脚本的工作进程总数不超过 FUNCTION_WORKERS_MAX_TOTAL，达到上限时关闭最久未使用的
+空闲工作进程，没有空闲工作进程时等待。
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import resource
+import struct
+import sys
+import time
+import traceback
+from collections import deque
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.child_process import rusage_delta
+from app.utils.script_utils import BoundedOutputBuffer
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = Path(__file__).resolve().parents[2]
+
+_HEADER = struct.Struct("!I")
+
+
+def _current_rss_kb() -> int:
+    """获取当前进程常驻内存(KB)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _read_exact(channel, size: int) -> Optional[bytes]:
+    """从管道读取 size 字节（单次read最多返回一个管道缓冲区），遇到EOF返回None"""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = channel.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class _BoundedTextStream(io.TextIOBase):
+    """写入有界缓冲区的文本流，替代调用期间的 sys.stdout / sys.stderr"""
+
+    def __init__(self, max_bytes: int):
+        self._output = BoundedOutputBuffer(max_bytes)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self._output.write(text.encode("utf-8", errors="replace"))
+        return len(text)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._output.total_bytes
+
+    def getvalue(self) -> str:
+        return self._output.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# 工作进程
+# ---------------------------------------------------------------------------
+
+def _worker_main() -> None:
+    """工作进程主循环：加载脚本并响应调用请求"""
+    # 协议独占原始stdout，脚本直接写fd 1的输出丢弃
+    channel_in = os.fdopen(os.dup(0), "rb", 0)
+    channel_out = os.fdopen(os.dup(1), "wb", 0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    namespace: Optional[Dict[str, Any]] = None
+    base_environ = dict(os.environ)
+
+    def reply(message: Dict[str, Any]) -> None:
+        payload = json.dumps(message, ensure_ascii=False, default=str).encode("utf-8")
+        channel_out.write(_HEADER.pack(len(payload)) + payload)
+
+    while True:
+        header = _read_exact(channel_in, _HEADER.size)
+        if header is None:
+            return
+        (length,) = _HEADER.unpack(header)
+        body = _read_exact(channel_in, length)
+        if body is None:
+            return
+        request = json.loads(body.decode("utf-8"))
+
+        if request["op"] == "load":
+            try:
+                code = compile(request["source"], request["filename"], "exec")
+                namespace = {"__name__": "__vss_function__", "__file__": request["filename"]}
+                exec(code, namespace)
+                if not callable(namespace.get("main")):
+                    raise ValueError("函数模式脚本必须定义 main(params) 函数")
+                reply({"ok": True, "rss_kb": _current_rss_kb()})
+            except BaseException:
+                namespace = None
+                reply({"ok": False, "error": traceback.format_exc(), "rss_kb": _current_rss_kb()})
+            continue
+
+        stdout = _BoundedTextStream(settings.SCRIPT_OUTPUT_MEMORY_LIMIT)
+        stderr = _BoundedTextStream(settings.SCRIPT_OUTPUT_MEMORY_LIMIT)
+        response: Dict[str, Any] = {"ok": True, "exit_code": 0}
+        os.environ.clear()
+        os.environ.update(base_environ)
+        os.environ.update(request.get("env") or {})
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                if namespace is None:
+                    raise RuntimeError("脚本尚未加载")
+                result = namespace["main"](request.get("params") or {})
+                if result is not None:
+                    # 返回值作为输出的最后一行，同样受输出上限约束
+                    print(json.dumps(result, ensure_ascii=False, default=str))
+            except SystemExit as e:
+                response["exit_code"] = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                traceback.print_exc()
+                response["ok"] = False
+                response["exit_code"] = 1
+        response["stdout"] = stdout.getvalue()
+        response["stderr"] = stderr.getvalue()
+        response["stdout_bytes"] = stdout.total_bytes
+        response["stderr_bytes"] = stderr.total_bytes
+        response["rss_kb"] = _current_rss_kb()
+        response["rusage"] = rusage_delta(usage_before, resource.getrusage(resource.RUSAGE_SELF))
+        reply(response)
+
+
+# ---------------------------------------------------------------------------
+# 服务进程侧进程池
+# ---------------------------------------------------------------------------
+
+class FunctionWorker:
+    """单个常驻工作进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+        self.rss_kb = 0
+        self.idle_since = time.monotonic()
+
+    @classmethod
+    async def spawn(cls) -> "FunctionWorker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.services.worker_pool",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=str(APP_ROOT),
+            env={**os.environ, "PYTHONIOENCODING": "utf-8"}
+        )
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        payload = json.dumps(message, ensure_ascii=False, default=str).encode("utf-8")
+        self.process.stdin.write(_HEADER.pack(len(payload)) + payload)
+        await self.process.stdin.drain()
+        header = await self.process.stdout.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        response = json.loads(await self.process.stdout.readexactly(length))
+        self.rss_kb = response.get("rss_kb", self.rss_kb)
+        return response
+
+    async def close(self) -> None:
+        if not self.alive:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    async def kill(self) -> None:
+        if self.alive:
+            self.process.kill()
+            await self.process.wait()
+
+
+class FunctionWorkerPool:
+    """单个脚本版本的工作进程池"""
+
+    def __init__(
+        self,
+        manager: "WorkerPoolManager",
+        script_id: int,
+        content_hash: str,
+        source: str,
+        size: int,
+        max_runs: int,
+        max_memory_mb: int
+    ):
+        self.manager = manager
+        self.script_id = script_id
+        self.content_hash = content_hash
+        self.source = source
+        self.size = size
+        self.max_runs = max_runs
+        self.max_memory_kb = max_memory_mb * 1024
+        # 空闲工作进程，右端最近使用；取用时后进先出，让多余的进程保持空闲直至被回收
+        self._idle: Deque[FunctionWorker] = deque()
+        self._slots = asyncio.Semaphore(size)
+        self._closed = False
+
+    async def _new_worker(self) -> FunctionWorker:
+        worker = await FunctionWorker.spawn()
+        response = await worker.request({
+            "op": "load",
+            "source": self.source,
+            "filename": f"<script {self.script_id}@{self.content_hash[:12]}>"
+        })
+        if not response["ok"]:
+            await worker.kill()
+            raise RuntimeError(f"脚本加载失败:\n{response['error']}")
+        return worker
+
+    def _take_idle(self) -> Optional[FunctionWorker]:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive:
+                return worker
+            self.manager.forget(worker)
+        return None
+
+    async def _acquire(self) -> FunctionWorker:
+        while True:
+            worker = self._take_idle()
+            if worker is not None:
+                return worker
+            # 等待全局名额期间本池可能有工作进程归还，此时直接复用
+            if await self.manager.reserve(self):
+                break
+        try:
+            return await self._new_worker()
+        except BaseException:
+            await self.manager.release()
+            raise
+
+    async def _release(self, worker: FunctionWorker) -> None:
+        if self._closed or not worker.alive:
+            await self.manager.retire(worker)
+            return
+        if worker.runs >= self.max_runs or worker.rss_kb > self.max_memory_kb:
+            logger.info(
+                f"回收函数工作进程: 脚本 {self.script_id} (PID: {worker.process.pid}, "
+                f"执行次数: {worker.runs}, 内存: {worker.rss_kb // 1024}MB)"
+            )
+            await self.manager.retire(worker)
+            return
+        worker.idle_since = time.monotonic()
+        self._idle.append(worker)
+        await self.manager.notify()
+
+    async def call(self, params: Dict[str, Any], env: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+        """在空闲工作进程中调用 main(params)"""
+        async with self._slots:
+            worker = await self._acquire()
+            try:
+                response = await asyncio.wait_for(
+                    worker.request({
+                        "op": "call",
+                        "params": params,
+                        "env": {str(k): str(v) for k, v in env.items()}
+                    }),
+                    timeout=timeout
+                )
+            except BaseException:
+                # 超时或通信异常时工作进程状态未知，直接丢弃
+                await self.manager.retire(worker, kill=True)
+                raise
+            worker.runs += 1
+            await self._release(worker)
+            return response
+
+    def oldest_idle_since(self) -> Optional[float]:
+        """最久未使用的空闲工作进程开始空闲的时间"""
+        return self._idle[0].idle_since if self._idle else None
+
+    def evict_idle(self, idle_before: Optional[float] = None) -> List[FunctionWorker]:
+        """取出空闲开始时间早于 idle_before 的工作进程（未指定时取出最久未使用的一个）"""
+        evicted = []
+        while self._idle:
+            if idle_before is None:
+                if evicted:
+                    break
+            elif self._idle[0].idle_since >= idle_before:
+                break
+            evicted.append(self._idle.popleft())
+        return evicted
+
+    async def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            await self.manager.retire(self._idle.popleft())
+
+
+class WorkerPoolManager:
+    """按脚本管理函数工作进程池，并限制所有脚本的工作进程总数"""
+
+    def __init__(self):
+        self._pools: Dict[int, FunctionWorkerPool] = {}
+        self._live = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    @property
+    def changed(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def _oldest_idle_pool(self) -> Optional[FunctionWorkerPool]:
+        candidates = [
+            (since, pool) for pool in self._pools.values()
+            if (since := pool.oldest_idle_since()) is not None
+        ]
+        return min(candidates, key=lambda item: item[0])[1] if candidates else None
+
+    async def reserve(self, pool: FunctionWorkerPool) -> bool:
+        """为新工作进程占用一个全局名额
+
+        达到上限时关闭最久未使用的空闲工作进程，没有可关闭的进程时等待；
+        等待期间 pool 自身有空闲工作进程归还时返回 False，由调用方直接复用。
+        """
+        async with self.changed:
+            while self._live >= settings.FUNCTION_WORKERS_MAX_TOTAL:
+                if pool._idle:
+                    return False
+                victim = self._oldest_idle_pool()
+                if victim is None:
+                    await self.changed.wait()
+                    continue
+                for worker in victim.evict_idle():
+                    logger.info(
+                        f"函数工作进程数达到上限，关闭空闲工作进程: 脚本 {victim.script_id} "
+                        f"(PID: {worker.process.pid})"
+                    )
+                    self._live -= 1
+                    asyncio.ensure_future(worker.close())
+            self._live += 1
+            return True
+
+    async def release(self) -> None:
+        """释放一个全局名额"""
+        async with self.changed:
+            self._live -= 1
+            self.changed.notify_all()
+
+    async def notify(self) -> None:
+        """有工作进程变为空闲，唤醒等待名额的调用"""
+        async with self.changed:
+            self.changed.notify_all()
+
+    def forget(self, worker: FunctionWorker) -> None:
+        """已退出的空闲工作进程归还名额"""
+        self._live -= 1
+        asyncio.ensure_future(self.notify())
+
+    async def retire(self, worker: FunctionWorker, kill: bool = False) -> None:
+        """关闭工作进程并归还名额"""
+        try:
+            await (worker.kill() if kill else worker.close())
+        finally:
+            await self.release()
+
+    async def _reap_idle(self) -> None:
+        """定期关闭空闲超时的工作进程"""
+        timeout = settings.FUNCTION_WORKER_IDLE_TIMEOUT
+        while True:
+            await asyncio.sleep(min(60, timeout))
+            idle_before = time.monotonic() - timeout
+            for pool in list(self._pools.values()):
+                for worker in pool.evict_idle(idle_before):
+                    logger.info(f"关闭空闲函数工作进程: 脚本 {pool.script_id} (PID: {worker.process.pid})")
+                    await self.retire(worker)
+
+    def get_pool(self, script_id: int, content_hash: str, source: str, config: Dict[str, Any]) -> FunctionWorkerPool:
+        """获取脚本的进程池，内容哈希变化时重新加载"""
+        if settings.FUNCTION_WORKER_IDLE_TIMEOUT > 0 and (self._reaper is None or self._reaper.done()):
+            self._reaper = asyncio.ensure_future(self._reap_idle())
+
+        pool = self._pools.get(script_id)
+        if pool is not None and pool.content_hash == content_hash:
+            return pool
+
+        if pool is not None:
+            logger.info(f"脚本内容已变化，重新加载函数工作进程池: 脚本 {script_id}")
+            asyncio.ensure_future(pool.close())
+
+        pool = FunctionWorkerPool(
+            manager=self,
+            script_id=script_id,
+            content_hash=content_hash,
+            source=source,
+            size=int(config.get("pool_size", settings.FUNCTION_POOL_SIZE)),
+            max_runs=int(config.get("max_runs_per_worker", settings.FUNCTION_WORKER_MAX_RUNS)),
+            max_memory_mb=int(config.get("max_worker_memory_mb", settings.FUNCTION_WORKER_MAX_MEMORY_MB))
+        )
+        self._pools[script_id] = pool
+        return pool
+
+    def discard(self, script_id: int) -> None:
+        """丢弃脚本的进程池"""
+        pool = self._pools.pop(script_id, None)
+        if pool is not None:
+            asyncio.ensure_future(pool.close())
+
+    async def shutdown(self) -> None:
+        """关闭所有进程池"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for pool in self._pools.values():
+            await pool.close()
+        self._pools.clear()
+
+
+worker_pool_manager = WorkerPoolManager()
+
+
+if __name__ == "__main__":
+    _worker_main()
@@ -0,0 +1,691 @@
+"""
+工作流引擎
+
+工作流由 WorkflowNode 和 WorkflowEdge 定义为有向无环图。引擎按拓扑顺序调度节点：
+节点的所有入边结算后即可运行，相互独立的分支并发执行。脚本节点通过执行准入队列提交，
+与其他执行共享全局并发上限。连接条件针对上游节点结果求值，条件不满足的下游节点被跳过。
+
+连接条件(WorkflowEdge.condition)格式:
+    {"status": "success" | "failed" | "any",         # 上游状态，默认 success
+     "field": "result.count", "operator": "gt", "value": 0}  # 可选，比较上游结果字段
+
+节点配置(WorkflowNode.config):
+    trigger_rule: all(默认，所有入边满足) / any(任一入边满足)
+    input_parameters / environment_vars / priority: 传给脚本执行
+
+引擎只在启动运行的进程中存在。引擎每个轮询间隔更新运行的心跳，并在提交节点前确认运行
+仍处于 running 状态：运行在其他副本被取消（或被判定为中断）后，引擎停止调度并取消运行中的
+节点执行，不会覆盖已有的状态。心跳超过 WORKFLOW_HEARTBEAT_TIMEOUT 的运行由
+recover_workflow_runs 标记为失败。
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, delete, desc, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, WorkflowNode, WorkflowEdge, WorkflowRun
+from app.schemas.script import (
+    ExecutionStatus, FAILED_STATUSES, ScriptExecutionCreate,
+    WorkflowNodeCreate, WorkflowEdgeCreate, WorkflowRunCreate
+)
+from app.services.execution_queue import QueueFullError
+from app.services.script_service import ScriptService
+
+logger = logging.getLogger(__name__)
+
+# 节点状态（执行状态之外的补充状态）
+NODE_PENDING = "pending"
+NODE_SKIPPED = "skipped"
+
+# 视为失败的执行状态
+FAILURE_STATUSES = {
+    *(status.value for status in FAILED_STATUSES),
+    ExecutionStatus.CANCELLED.value,
+}
+
+OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "in": lambda a, b: a in b,
+    "contains": lambda a, b: b in a,
+}
+
+_MISSING = object()
+
+# 本进程中运行的工作流引擎任务
+_workflow_tasks: Dict[int, asyncio.Task] = {}
+
+
+class WorkflowValidationError(ValueError):
+    """工作流定义无效"""
+
+
+def resolve_field(data: Dict[str, Any], path: str) -> Any:
+    """按点分路径读取结果字段，不存在时返回 _MISSING"""
+    value: Any = data
+    for key in path.split("."):
+        if isinstance(value, dict) and key in value:
+            value = value[key]
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return _MISSING
+    return value
+
+
+def evaluate_condition(condition: Dict[str, Any], upstream: Dict[str, Any]) -> bool:
+    """针对上游节点结果求值连接条件"""
+    status = upstream.get("status")
+    if status == NODE_SKIPPED:
+        return False
+
+    expected = (condition or {}).get("status", "success")
+    if expected == "success" and status != ExecutionStatus.SUCCESS.value:
+        return False
+    if expected == "failed" and status not in FAILURE_STATUSES:
+        return False
+
+    field = (condition or {}).get("field")
+    if not field:
+        return True
+
+    value = resolve_field(upstream, field)
+    operator = condition.get("operator", "eq")
+    if operator == "exists":
+        return (value is not _MISSING) == condition.get("value", True)
+    if value is _MISSING or operator not in OPERATORS:
+        return False
+    try:
+        return bool(OPERATORS[operator](value, condition.get("value")))
+    except TypeError:
+        return False
+
+
+def parse_result(output: Optional[str]) -> Any:
+    """把输出最后一行解析为JSON结果（函数式脚本的返回值即输出在最后一行）"""
+    for line in reversed((output or "").splitlines()):
+        if line.strip():
+            try:
+                return json.loads(line)
+            except ValueError:
+                return None
+    return None
+
+
+def topological_order(nodes: List[WorkflowNode], edges: List[WorkflowEdge]) -> List[str]:
+    """校验工作流为有向无环图并返回拓扑顺序"""
+    if not nodes:
+        raise WorkflowValidationError("工作流没有节点")
+
+    node_ids = [node.node_id for node in nodes]
+    in_degree = {node_id: 0 for node_id in node_ids}
+    outgoing = defaultdict(list)
+    for edge in edges:
+        for node_id in (edge.source_node_id, edge.target_node_id):
+            if node_id not in in_degree:
+                raise WorkflowValidationError(f"连接引用了不存在的节点: {node_id}")
+        outgoing[edge.source_node_id].append(edge.target_node_id)
+        in_degree[edge.target_node_id] += 1
+
+    order = []
+    ready = [node_id for node_id in node_ids if in_degree[node_id] == 0]
+    while ready:
+        node_id = ready.pop()
+        order.append(node_id)
+        for target in outgoing[node_id]:
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                ready.append(target)
+
+    if len(order) != len(node_ids):
+        cycle = sorted(node_id for node_id, degree in in_degree.items() if degree > 0)
+        raise WorkflowValidationError(f"工作流存在环: {', '.join(cycle)}")
+    return order
+
+
+class WorkflowEngine:
+    """单次工作流运行的调度器"""
+
+    def __init__(self, run_pk: int, priority: Optional[int] = None):
+        self.run_pk = run_pk
+        self.priority = priority
+        self.run_id = ""
+        self.input_parameters: Dict[str, Any] = {}
+        self.nodes: Dict[str, WorkflowNode] = {}
+        self.incoming: Dict[str, List[WorkflowEdge]] = defaultdict(list)
+        self.outgoing: Dict[str, List[WorkflowEdge]] = defaultdict(list)
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.node_states: Dict[str, Dict[str, Any]] = {}
+        self.start_time: Optional[datetime] = None
+
+    async def run(self) -> None:
+        """运行工作流直到所有节点结束"""
+        async with SessionLocal() as db:
+            run = await db.get(WorkflowRun, self.run_pk)
+            if not run or run.status != ExecutionStatus.PENDING:
+                return
+            nodes = (await db.execute(
+                select(WorkflowNode).where(WorkflowNode.workflow_id == run.workflow_id)
+            )).scalars().all()
+            edges = (await db.execute(
+                select(WorkflowEdge).where(WorkflowEdge.workflow_id == run.workflow_id)
+            )).scalars().all()
+
+            self.run_id = run.run_id
+            self.input_parameters = run.input_parameters or {}
+            self.nodes = {node.node_id: node for node in nodes}
+            for edge in edges:
+                self.outgoing[edge.source_node_id].append(edge)
+                self.incoming[edge.target_node_id].append(edge)
+            self.node_states = {node_id: {"status": NODE_PENDING} for node_id in self.nodes}
+
+            run.status = ExecutionStatus.RUNNING
+            run.start_time = run.heartbeat_at = self.start_time = datetime.utcnow()
+            run.node_states = dict(self.node_states)
+            await db.commit()
+
+        tasks: Dict[asyncio.Task, str] = {}
+        try:
+            remaining = {node_id: len(self.incoming[node_id]) for node_id in self.nodes}
+            ready = [node_id for node_id, count in remaining.items() if count == 0]
+            stopped = False
+
+            while ready or tasks:
+                # 提交节点前确认运行未在其他副本被取消
+                if ready and not await self._heartbeat():
+                    stopped = True
+                    break
+                for node_id in ready:
+                    tasks[asyncio.create_task(self._run_node(self.nodes[node_id]))] = node_id
+                ready = []
+
+                done, _ = await asyncio.wait(
+                    tasks, timeout=settings.WORKFLOW_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if not await self._heartbeat():
+                        stopped = True
+                        break
+                    continue
+                for task in done:
+                    finished = [(tasks.pop(task), task.result())]
+                    # 跳过的节点同样视为已结束，继续结算其下游
+                    while finished:
+                        node_id, result = finished.pop()
+                        await self._set_node_state(node_id, result)
+                        for edge in self.outgoing[node_id]:
+                            target = edge.target_node_id
+                            remaining[target] -= 1
+                            if remaining[target] > 0:
+                                continue
+                            if self._should_run(self.nodes[target]):
+                                ready.append(target)
+                            else:
+                                finished.append((target, {"status": NODE_SKIPPED}))
+
+            if stopped:
+                logger.info(f"工作流运行已在其他位置结束，停止调度: {self.run_id}")
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self._finish(cancelled=True)
+            else:
+                await self._finish()
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._finish(cancelled=True)
+            raise
+        except Exception as e:
+            logger.error(f"工作流运行异常: {self.run_id} - {str(e)}")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._finish(error=str(e))
+
+    def _should_run(self, node: WorkflowNode) -> bool:
+        """根据入边条件判断节点是否运行"""
+        satisfied = [
+            evaluate_condition(edge.condition, self.results[edge.source_node_id])
+            for edge in self.incoming[node.node_id]
+        ]
+        if (node.config or {}).get("trigger_rule", "all") == "any":
+            return any(satisfied)
+        return all(satisfied)
+
+    async def _run_node(self, node: WorkflowNode) -> Dict[str, Any]:
+        """运行单个节点，返回节点结果"""
+        if node.node_type != "script" or node.script_id is None:
+            # 非脚本节点（开始/结束/汇合等）直接视为成功
+            return {"status": ExecutionStatus.SUCCESS.value, "exit_code": 0, "result": None}
+
+        config = node.config or {}
+        upstream = {
+            edge.source_node_id: {
+                key: self.results[edge.source_node_id].get(key)
+                for key in ("status", "exit_code", "result")
+            }
+            for edge in self.incoming[node.node_id]
+        }
+        execution_data = ScriptExecutionCreate(
+            script_id=node.script_id,
+            input_parameters={
+                **self.input_parameters,
+                **config.get("input_parameters", {}),
+                "upstream": upstream,
+            },
+            environment_vars=config.get("environment_vars", {}),
+            triggered_by=f"workflow:{self.run_id}",
+            trigger_source="workflow",
+            priority=config.get("priority", self.priority)
+        )
+
+        execution_id = None
+        try:
+            # 提交执行，队列已满时按建议时间重试
+            while execution_id is None:
+                try:
+                    async with SessionLocal() as db:
+                        execution = await ScriptService(db).execute_script(execution_data)
+                        execution_id = execution.execution_id
+                except QueueFullError as e:
+                    await asyncio.sleep(e.retry_after)
+
+            await self._set_node_state(node.node_id, {
+                "status": ExecutionStatus.RUNNING.value,
+                "execution_id": execution_id
+            })
+
+            # 等待执行结束（执行可能在其他工作进程上运行，因此轮询数据库，只查询状态）
+            while True:
+                await asyncio.sleep(settings.WORKFLOW_POLL_INTERVAL)
+                async with SessionLocal() as db:
+                    status = await db.scalar(
+                        select(ScriptExecution.status).where(ScriptExecution.execution_id == execution_id)
+                    )
+                if status not in [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]:
+                    break
+            
+            async with SessionLocal() as db:
+                execution = await ScriptService(db).get_execution(execution_id)
+
+            return {
+                "status": execution.status.value,
+                "execution_id": execution_id,
+                "exit_code": execution.exit_code,
+                "duration": execution.duration,
+                "error": execution.error_message if execution.status != ExecutionStatus.SUCCESS else None,
+                "result": parse_result(execution.output),
+            }
+
+        except asyncio.CancelledError:
+            if execution_id is not None:
+                async with SessionLocal() as db:
+                    await ScriptService(db).cancel_execution(execution_id)
+            raise
+        except Exception as e:
+            logger.error(f"工作流节点运行失败: {self.run_id}/{node.node_id} - {str(e)}")
+            return {
+                "status": ExecutionStatus.FAILED.value,
+                "execution_id": execution_id,
+                "error": str(e),
+            }
+
+    async def _heartbeat(self) -> bool:
+        """更新运行心跳，运行已不处于 running 状态（被取消或被判定为中断）时返回False"""
+        async with SessionLocal() as db:
+            result = await db.execute(
+                update(WorkflowRun)
+                .where(WorkflowRun.id == self.run_pk, WorkflowRun.status == ExecutionStatus.RUNNING)
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            await db.commit()
+        return result.rowcount > 0
+
+    async def _set_node_state(self, node_id: str, state: Dict[str, Any]) -> None:
+        if state["status"] not in [NODE_PENDING, ExecutionStatus.RUNNING.value]:
+            self.results[node_id] = state
+        self.node_states[node_id] = state
+        async with SessionLocal() as db:
+            await db.execute(
+                update(WorkflowRun)
+                .where(WorkflowRun.id == self.run_pk)
+                .values(node_states=dict(self.node_states))
+            )
+            await db.commit()
+
+    def _unhandled_failures(self) -> List[str]:
+        """失败且没有失败分支处理的节点"""
+        return [
+            node_id for node_id, result in self.results.items()
+            if result["status"] in FAILURE_STATUSES
+            and not any(
+                (edge.condition or {}).get("status") in ("failed", "any")
+                for edge in self.outgoing[node_id]
+            )
+        ]
+
+    async def _finish(self, cancelled: bool = False, error: Optional[str] = None) -> None:
+        failed = self._unhandled_failures()
+        if cancelled:
+            status = ExecutionStatus.CANCELLED
+        elif error or failed:
+            status = ExecutionStatus.FAILED
+            error = error or f"节点执行失败: {', '.join(failed)}"
+        else:
+            status = ExecutionStatus.SUCCESS
+
+        for node_id, state in self.node_states.items():
+            if state["status"] in [NODE_PENDING, ExecutionStatus.RUNNING.value]:
+                self.node_states[node_id] = {**state, "status": ExecutionStatus.CANCELLED.value}
+
+        end_time = datetime.utcnow()
+        async with SessionLocal() as db:
+            # 条件更新：运行已在其他副本被取消或被判定为中断时保留原状态
+            result = await db.execute(
+                update(WorkflowRun)
+                .where(
+                    WorkflowRun.id == self.run_pk,
+                    WorkflowRun.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING])
+                )
+                .values(
+                    status=status,
+                    error_message=error,
+                    end_time=end_time,
+                    duration=int((end_time - self.start_time).total_seconds()) if self.start_time else None
+                )
+            )
+            await db.execute(
+                update(WorkflowRun)
+                .where(WorkflowRun.id == self.run_pk)
+                .values(node_states=dict(self.node_states))
+            )
+            await db.commit()
+
+        if result.rowcount > 0:
+            logger.info(f"工作流运行结束: {self.run_id} (状态: {status.value})")
+
+
+async def _cancel_node_executions(db: AsyncSession, run_id: str, node_states: Dict[str, Dict[str, Any]]) -> None:
+    """取消运行中尚未结束的节点执行（执行可能在其他副本/工作进程上）"""
+    service = ScriptService(db)
+    for node_id, state in node_states.items():
+        if state.get("status") != ExecutionStatus.RUNNING.value or not state.get("execution_id"):
+            continue
+        try:
+            await service.cancel_execution(state["execution_id"])
+        except Exception as e:
+            logger.error(f"取消工作流节点执行失败: {run_id}/{node_id} - {str(e)}")
+
+
+async def recover_workflow_runs() -> int:
+    """把引擎已中断（心跳超时）的运行标记为失败并取消其节点执行，返回处理的运行数"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.WORKFLOW_HEARTBEAT_TIMEOUT)
+    async with SessionLocal() as db:
+        runs = (await db.execute(
+            update(WorkflowRun)
+            .where(or_(
+                and_(
+                    WorkflowRun.status == ExecutionStatus.RUNNING,
+                    func.coalesce(WorkflowRun.heartbeat_at, WorkflowRun.start_time, WorkflowRun.created_at) < cutoff
+                ),
+                # 已登记但引擎未启动（进程在启动引擎前退出）
+                and_(WorkflowRun.status == ExecutionStatus.PENDING, WorkflowRun.created_at < cutoff)
+            ))
+            .values(status=ExecutionStatus.FAILED, error_message="工作流引擎已中断", end_time=now)
+            .returning(WorkflowRun.id, WorkflowRun.run_id, WorkflowRun.node_states)
+        )).all()
+        await db.commit()
+
+        for run_pk, run_id, node_states in runs:
+            logger.warning(f"工作流运行引擎已中断，标记为失败: {run_id}")
+            node_states = node_states or {}
+            await _cancel_node_executions(db, run_id, node_states)
+            await db.execute(
+                update(WorkflowRun)
+                .where(WorkflowRun.id == run_pk)
+                .values(node_states={
+                    node_id: {**state, "status": ExecutionStatus.CANCELLED.value}
+                    if state.get("status") in [NODE_PENDING, ExecutionStatus.RUNNING.value] else state
+                    for node_id, state in node_states.items()
+                })
+            )
+            await db.commit()
+    return len(runs)
+
+
+class WorkflowService:
+    """工作流服务类"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # 工作流定义管理
+    async def create_node(self, node_data: WorkflowNodeCreate) -> WorkflowNode:
+        """创建工作流节点"""
+        try:
+            existing = await self.db.scalar(
+                select(WorkflowNode).where(
+                    WorkflowNode.workflow_id == node_data.workflow_id,
+                    WorkflowNode.node_id == node_data.node_id
+                )
+            )
+            if existing:
+                raise ValueError(f"节点已存在: {node_data.node_id}")
+            if node_data.node_type == "script":
+                if node_data.script_id is None:
+                    raise ValueError("脚本节点必须指定 script_id")
+                if not await self.db.get(Script, node_data.script_id):
+                    raise ValueError(f"脚本不存在: {node_data.script_id}")
+
+            node = WorkflowNode(**node_data.dict())
+            self.db.add(node)
+            await self.db.commit()
+            await self.db.refresh(node)
+
+            logger.info(f"创建工作流节点: {node.workflow_id}/{node.node_id}")
+            return node
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"创建工作流节点失败: {str(e)}")
+            raise
+
+    async def get_nodes(self, workflow_id: str) -> List[WorkflowNode]:
+        """获取工作流节点"""
+        result = await self.db.execute(
+            select(WorkflowNode).where(WorkflowNode.workflow_id == workflow_id).order_by(WorkflowNode.id)
+        )
+        return result.scalars().all()
+
+    async def delete_node(self, node_pk: int) -> bool:
+        """删除工作流节点及其连接"""
+        try:
+            node = await self.db.get(WorkflowNode, node_pk)
+            if not node:
+                return False
+
+            await self.db.execute(
+                delete(WorkflowEdge).where(
+                    WorkflowEdge.workflow_id == node.workflow_id,
+                    or_(
+                        WorkflowEdge.source_node_id == node.node_id,
+                        WorkflowEdge.target_node_id == node.node_id
+                    )
+                )
+            )
+            await self.db.delete(node)
+            await self.db.commit()
+
+            logger.info(f"删除工作流节点: {node.workflow_id}/{node.node_id}")
+            return True
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"删除工作流节点失败: {str(e)}")
+            raise
+
+    async def create_edge(self, edge_data: WorkflowEdgeCreate) -> WorkflowEdge:
+        """创建工作流连接，拒绝引入环的连接"""
+        try:
+            nodes = await self.get_nodes(edge_data.workflow_id)
+            edges = await self.get_edges(edge_data.workflow_id)
+
+            edge = WorkflowEdge(**edge_data.dict())
+            topological_order(nodes, [*edges, edge])
+
+            self.db.add(edge)
+            await self.db.commit()
+            await self.db.refresh(edge)
+
+            logger.info(f"创建工作流连接: {edge.workflow_id}/{edge.source_node_id}->{edge.target_node_id}")
+            return edge
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"创建工作流连接失败: {str(e)}")
+            raise
+
+    async def get_edges(self, workflow_id: str) -> List[WorkflowEdge]:
+        """获取工作流连接"""
+        result = await self.db.execute(
+            select(WorkflowEdge).where(WorkflowEdge.workflow_id == workflow_id).order_by(WorkflowEdge.id)
+        )
+        return result.scalars().all()
+
+    async def delete_edge(self, edge_pk: int) -> bool:
+        """删除工作流连接"""
+        try:
+            edge = await self.db.get(WorkflowEdge, edge_pk)
+            if not edge:
+                return False
+
+            await self.db.delete(edge)
+            await self.db.commit()
+            return True
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"删除工作流连接失败: {str(e)}")
+            raise
+
+    async def get_workflow(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """获取工作流定义"""
+        nodes = await self.get_nodes(workflow_id)
+        if not nodes:
+            return None
+        return {
+            "workflow_id": workflow_id,
+            "nodes": nodes,
+            "edges": await self.get_edges(workflow_id),
+        }
+
+    # 工作流运行
+    async def start_workflow(
+        self,
+        workflow_id: str,
+        run_data: WorkflowRunCreate,
+        triggered_by: str = None
+    ) -> WorkflowRun:
+        """启动工作流运行"""
+        try:
+            nodes = await self.get_nodes(workflow_id)
+            edges = await self.get_edges(workflow_id)
+            topological_order(nodes, edges)
+
+            run = WorkflowRun(
+                run_id=str(uuid.uuid4()),
+                workflow_id=workflow_id,
+                status=ExecutionStatus.PENDING,
+                input_parameters=run_data.input_parameters,
+                node_states={node.node_id: {"status": NODE_PENDING} for node in nodes},
+                triggered_by=triggered_by or run_data.triggered_by
+            )
+            self.db.add(run)
+            await self.db.commit()
+            await self.db.refresh(run)
+
+            # 引擎在后台运行，使用独立的数据库会话
+            task = asyncio.create_task(WorkflowEngine(run.id, run_data.priority).run())
+            _workflow_tasks[run.id] = task
+            task.add_done_callback(lambda _: _workflow_tasks.pop(run.id, None))
+
+            logger.info(f"启动工作流: {workflow_id} (运行ID: {run.run_id})")
+            return run
+
+        except Exception as e:
+            await self.db.rollback()
+            logger.error(f"启动工作流失败: {str(e)}")
+            raise
+
+    async def get_run(self, run_id: str) -> Optional[WorkflowRun]:
+        """获取工作流运行记录"""
+        return await self.db.scalar(select(WorkflowRun).where(WorkflowRun.run_id == run_id))
+
+    async def get_runs(
+        self,
+        workflow_id: str,
+        status: Optional[ExecutionStatus] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[WorkflowRun]:
+        """获取工作流运行记录列表"""
+        query = select(WorkflowRun).where(WorkflowRun.workflow_id == workflow_id)
+        if status:
+            query = query.where(WorkflowRun.status == status)
+
+        result = await self.db.execute(
+            query.order_by(desc(WorkflowRun.created_at)).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def cancel_run(self, run_id: str) -> bool:
+        """取消工作流运行，正在运行的节点执行一并取消"""
+        run = await self.get_run(run_id)
+        if not run or run.status not in [ExecutionStatus.PENDING, ExecutionStatus.RUNNING]:
+            return False
+
+        task = _workflow_tasks.get(run.id)
+        if task is None:
+            # 引擎不在本进程中：标记取消，运行引擎的副本在下一次心跳时停止调度；
+            # 引擎可能已中断，因此同时直接取消运行中的节点执行
+            result = await self.db.execute(
+                update(WorkflowRun)
+                .where(
+                    WorkflowRun.id == run.id,
+                    WorkflowRun.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING])
+                )
+                .values(status=ExecutionStatus.CANCELLED, end_time=datetime.utcnow())
+            )
+            await self.db.commit()
+            if result.rowcount == 0:
+                return False
+            await self.db.refresh(run)
+            await _cancel_node_executions(self.db, run.run_id, dict(run.node_states or {}))
+        else:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await self.db.refresh(run)
+            if run.status == ExecutionStatus.PENDING:
+                # 引擎尚未开始调度
+                run.status = ExecutionStatus.CANCELLED
+                run.end_time = datetime.utcnow()
+                await self.db.commit()
+
+        logger.info(f"取消工作流运行: {run_id}")
+        return True
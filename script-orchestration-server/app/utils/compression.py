@@ -0,0 +1,30 @@
+import gzip
+import zlib
+from typing import AsyncIterator, Optional
+
+# 压缩级别：执行输出以文本日志为主，中等级别已有较高压缩比
+COMPRESS_LEVEL = 6
+
+
+def compress_text(text: Optional[str]) -> Optional[bytes]:
+    """把文本压缩为gzip字节"""
+    if text is None:
+        return None
+    return gzip.compress(text.encode("utf-8"), compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def decompress_text(data: Optional[bytes]) -> Optional[str]:
+    """还原 compress_text 压缩的文本"""
+    if data is None:
+        return None
+    return gzip.decompress(data).decode("utf-8", errors="replace")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """把数据块流式压缩为gzip，不缓存全部数据"""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for data in chunks:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(ValueError):
+    """请求的字节范围超出内容长度"""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节范围的 Range 请求头，返回 [start, end)。
+
+    支持 bytes=start-end / bytes=start- / bytes=-suffix；请求头缺失、格式无效
+    或包含多个范围时返回None（按完整内容响应），范围超出内容时抛出 RangeNotSatisfiable。
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+        else:
+            start = int(first)
+            end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if not first:
+        if suffix <= 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - suffix), size
+    if start < 0 or (last and end <= start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size)
+
+
+def accepts_gzip(header: Optional[str]) -> bool:
+    """Accept-Encoding 是否接受gzip（q=0 表示拒绝）"""
+    for item in (header or "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if coding.lower() not in ("gzip", "*"):
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
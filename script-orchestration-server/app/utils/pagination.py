@@ -0,0 +1,71 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import Select, desc, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """把 (created_at, id) 编码为不透明的游标"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def next_cursor(items: List[Any], limit: int) -> Optional[str]:
+    """整页返回时生成下一页游标"""
+    if len(items) < limit or not items:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def order_by_recent(query: Select, model) -> Select:
+    """按 (created_at, id) 倒序排列，保证分页顺序稳定"""
+    return query.order_by(desc(model.created_at), desc(model.id))
+
+
+def apply_cursor(query: Select, model, cursor: Optional[str]) -> Select:
+    """只返回游标之后（更早）的记录"""
+    if not cursor:
+        return query
+    created_at, row_id = decode_cursor(cursor)
+    return query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+
+
+async def count_rows(db: AsyncSession, query: Select, mode: str = "exact") -> Optional[int]:
+    """统计查询结果总数: exact(精确count) / estimated(估算) / none(不统计)
+
+    estimated 模式在 PostgreSQL 上读取执行计划的行数估算，避免扫描大表；
+    其他数据库退化为精确统计。
+    """
+    if mode == "none":
+        return None
+
+    query = query.order_by(None)
+    if mode == "estimated" and db.get_bind().dialect.name == "postgresql":
+        try:
+            dialect = db.get_bind().dialect
+            sql = query.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+            connection = await db.connection()
+            plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"估算总数失败，改为精确统计: {str(e)}")
+
+    return await db.scalar(select(func.count()).select_from(query.subquery()))
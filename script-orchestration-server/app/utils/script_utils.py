@@ -1,8 +1,10 @@
 import os
 import json
+import hashlib
 import logging
 from typing import Dict, Any, List
 from datetime import datetime
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
@@ -310,6 +312,11 @@ class ScriptExecutor:
         
         return env
     
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """计算脚本内容哈希"""
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
     @staticmethod
     def format_output(output: str, max_length: int = 10000) -> str:
         """格式化输出内容"""
@@ -321,6 +328,68 @@ class ScriptExecutor:
         
         return output
 
+class BoundedOutputBuffer:
+    """有界输出缓冲区
+    
+    内存占用固定不超过 max_bytes：保留输出开头和结尾，超出部分从中间丢弃，
+    同时记录输出总字节数。
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail: deque = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+    
+    def write(self, data: bytes) -> None:
+        """追加输出数据"""
+        self.total_bytes += len(data)
+        
+        if len(self.head) < self.head_limit:
+            take = self.head_limit - len(self.head)
+            self.head += data[:take]
+            data = data[take:]
+        
+        if not data:
+            return
+        
+        if len(data) >= self.tail_limit:
+            self.tail.clear()
+            self.tail.append(bytes(data[-self.tail_limit:]) if self.tail_limit else b"")
+            self.tail_size = min(len(data), self.tail_limit)
+            return
+        
+        self.tail.append(bytes(data))
+        self.tail_size += len(data)
+        while self.tail_size > self.tail_limit:
+            overflow = self.tail_size - self.tail_limit
+            first = self.tail[0]
+            if len(first) <= overflow:
+                self.tail.popleft()
+                self.tail_size -= len(first)
+            else:
+                self.tail[0] = first[overflow:]
+                self.tail_size -= overflow
+    
+    @property
+    def dropped_bytes(self) -> int:
+        """被丢弃的中间部分字节数"""
+        return self.total_bytes - len(self.head) - self.tail_size
+    
+    def getvalue(self) -> str:
+        """获取保留的输出内容，中间被丢弃时插入截断说明"""
+        tail = b"".join(self.tail)
+        if not self.dropped_bytes:
+            return (bytes(self.head) + tail).decode('utf-8', errors='replace')
+        
+        return (
+            bytes(self.head).decode('utf-8', errors='replace')
+            + f"\n... (输出被截断，省略 {self.dropped_bytes} 字节，总长度: {self.total_bytes} 字节) ...\n"
+            + tail.decode('utf-8', errors='replace')
+        )
+
 class LogManager:
     """日志管理器"""
     
@@ -1,16 +1,32 @@
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 import uvicorn
 import logging
 from datetime import datetime
 import os
 
 # 导入应用模块
-from app.api.v1 import scripts
+from app.api.v1 import scripts, workflows, events
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, create_missing_columns, create_missing_enum_values, create_missing_indexes
 from app.core.scheduler import scheduler
+from app.core.redis import close_redis
+from app.services.forkserver import get_forkserver, shutdown_forkservers
+from app.services.worker_pool import worker_pool_manager
+from app.services.script_store import collect_script_cache
+from app.services.log_stream import log_broker
+from app.services.execution_control import execution_control
+from app.services.execution_retry import retry_scheduler
+from app.services.batch_feeder import batch_feeder
+from app.services.cron_engine import cron_engine
+from app.services.event_engine import event_engine
+from app.services.search_index import create_search_indexes
+from app.services.result_cache import purge_result_cache
+from app.services.execution_archive import run_retention
+from app.services.workflow_service import recover_workflow_runs
+from app.services.metrics import render_metrics, loop_monitor
 
 # 配置日志
 logging.basicConfig(
@@ -48,11 +64,75 @@ async def startup_event():
     """应用启动时的初始化操作"""
     try:
         # 创建数据库表
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_missing_columns)
+            await conn.run_sync(create_missing_enum_values)
+            await conn.run_sync(create_missing_indexes)
+            await conn.run_sync(create_search_indexes)
         
         # 启动调度器
         scheduler.start()
         
+        # 定时清理过期脚本缓存
+        scheduler.add_job(
+            collect_script_cache,
+            'interval',
+            hours=6,
+            id='script_cache_gc',
+            replace_existing=True
+        )
+        
+        # 定时清理过期结果缓存，并淘汰超出条目上限的缓存
+        scheduler.add_job(
+            purge_result_cache,
+            'interval',
+            hours=1,
+            id='result_cache_gc',
+            replace_existing=True
+        )
+        
+        # 每天凌晨归档超过保留天数的执行记录
+        scheduler.add_job(
+            run_retention,
+            'cron',
+            hour=3,
+            id='execution_retention',
+            replace_existing=True
+        )
+        
+        # 引擎所在进程退出后遗留的工作流运行标记为失败
+        await recover_workflow_runs()
+        scheduler.add_job(
+            recover_workflow_runs,
+            'interval',
+            seconds=settings.WORKFLOW_HEARTBEAT_TIMEOUT,
+            id='workflow_recovery',
+            replace_existing=True
+        )
+        
+        # 预热fork-server
+        if settings.SCRIPT_EXECUTION_BACKEND == "forkserver":
+            await get_forkserver("python").start()
+        
+        # 采样事件循环延迟
+        loop_monitor.start()
+        
+        # 接收其他副本转发的执行取消请求
+        await execution_control.start()
+        
+        # 提交到期的失败重试
+        retry_scheduler.start()
+        
+        # 按并发上限提交批量执行（多副本时只在主节点上提交）
+        batch_feeder.start()
+        
+        # 定时触发脚本（多副本时只在主节点上触发）
+        cron_engine.start()
+        
+        # 按事件触发脚本（多副本时只在主节点上合并事件）
+        event_engine.start()
+        
         logger.info("脚本编排服务启动成功")
         logger.info(f"服务运行在端口: {settings.PORT}")
         
@@ -66,6 +146,25 @@ async def shutdown_event():
     try:
         # 关闭调度器
         scheduler.shutdown()
+        await loop_monitor.stop()
+        await retry_scheduler.stop()
+        await batch_feeder.stop()
+        await cron_engine.stop()
+        await event_engine.stop()
+        
+        # 关闭fork-server
+        await shutdown_forkservers()
+        
+        # 关闭函数式脚本常驻进程池
+        await worker_pool_manager.shutdown()
+        
+        # 关闭执行输出推送、执行控制和Redis连接
+        await log_broker.shutdown()
+        await execution_control.shutdown()
+        await close_redis()
+        
+        # 释放数据库连接池
+        await engine.dispose()
         logger.info("脚本编排服务已关闭")
     except Exception as e:
         logger.error(f"服务关闭时出错: {str(e)}")
@@ -81,6 +180,12 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Prometheus指标端点
+@app.get("/metrics")
+async def metrics():
+    """Prometheus指标接口"""
+    return Response(await render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # 根路径
 @app.get("/")
 async def root():
@@ -98,6 +203,16 @@ app.include_router(
     prefix="/api/v1/scripts",
     tags=["scripts"]
 )
+app.include_router(
+    workflows.router,
+    prefix="/api/v1/workflows",
+    tags=["workflows"]
+)
+app.include_router(
+    events.router,
+    prefix="/api/v1/events",
+    tags=["events"]
+)
 
 # 全局异常处理
 @app.exception_handler(Exception)
@@ -0,0 +1,55 @@
+"""
+测试公共配置
+
+测试使用临时目录中的SQLite数据库和脚本存储，以本地执行模式运行，不依赖PostgreSQL和Redis。
+环境变量必须在导入 app 之前设置。
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_ROOT))
+
+TEMP_DIR = tempfile.mkdtemp(prefix="vss-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{TEMP_DIR}/test.db",
+    SCRIPT_STORAGE_PATH=f"{TEMP_DIR}/scripts",
+    EXECUTION_MODE="local",
+    LOG_STREAM_REDIS_ENABLED="false",
+    EXECUTION_CONTROL_REDIS_ENABLED="false",
+)
+
+import pytest
+
+from app.core.database import Base, engine
+
+
+def run_async(coro):
+    """在新的事件循环中运行协程，结束后释放数据库连接（连接不能跨事件循环复用）"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def run():
+    return run_async
+
+
+@pytest.fixture
+def database():
+    """每个测试使用重新创建的空表"""
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    run_async(reset())
@@ -0,0 +1,172 @@
+"""定时触发引擎：错过触发策略、触发堆和重叠策略"""
+
+import time
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ScriptStatus, ExecutionStatus
+from app.schemas.script import TriggerType
+from app.services.cron_engine import CronEngine, _CronJob, parse_cron_config
+from app.services.script_service import ScriptService
+
+EVERY_FIVE_MINUTES = "*/5 * * * *"
+# 2024-01-01 00:00:00 UTC，恰好是一次触发时间
+FIRE_TIME = 1704067200.0
+
+
+def make_job(misfire="run_once", overlap="skip", script_id=1, version=0, grace=60):
+    config = parse_cron_config({
+        "cron": EVERY_FIVE_MINUTES,
+        "timezone": "UTC",
+        "misfire": misfire,
+        "overlap": overlap,
+        "misfire_grace": grace,
+    })
+    return _CronJob(script_id, version, config, 0)
+
+
+def make_script(script_id, trigger_config):
+    return Script(
+        id=script_id,
+        name=f"cron-{script_id}",
+        content="print('ok')",
+        status=ScriptStatus.ACTIVE,
+        trigger_type=TriggerType.CRON,
+        trigger_config=trigger_config,
+    )
+
+
+def test_parse_cron_config_rejects_invalid_values():
+    with pytest.raises(ValueError):
+        parse_cron_config({})
+    with pytest.raises(ValueError):
+        parse_cron_config({"cron": "not a cron"})
+    with pytest.raises(ValueError):
+        parse_cron_config({"cron": EVERY_FIVE_MINUTES, "overlap": "sometimes"})
+    with pytest.raises(ValueError):
+        parse_cron_config({"cron": EVERY_FIVE_MINUTES, "misfire": "later"})
+    with pytest.raises(ValueError):
+        parse_cron_config({"cron": EVERY_FIVE_MINUTES, "timezone": "Mars/Olympus"})
+
+
+def test_on_time_fire_runs_once_and_advances():
+    job = make_job()
+    assert job.due_runs(FIRE_TIME, FIRE_TIME + 1) == (1, 0)
+    assert job.next_fire == FIRE_TIME + 300
+
+
+@pytest.mark.parametrize("misfire, expected", [
+    ("run_once", (1, 3)),
+    ("skip", (0, 4)),
+    ("run_all", (4, 0)),
+])
+def test_misfire_policies(misfire, expected):
+    # 错过了 FIRE_TIME 起的4次触发，最后一次也已超过宽限时间
+    job = make_job(misfire=misfire)
+    now = FIRE_TIME + 3 * 300 + 100
+    assert job.due_runs(FIRE_TIME, now) == expected
+    assert job.next_fire == FIRE_TIME + 4 * 300
+
+
+def test_skip_policy_runs_latest_fire_within_grace():
+    job = make_job(misfire="skip")
+    assert job.due_runs(FIRE_TIME, FIRE_TIME + 3 * 300 + 30) == (1, 3)
+
+
+def test_run_all_is_capped_by_misfire_max_runs(monkeypatch):
+    monkeypatch.setattr(settings, "CRON_MISFIRE_MAX_RUNS", 3)
+    job = make_job(misfire="run_all")
+    now = FIRE_TIME + 10 * 300 + 10
+    assert job.due_runs(FIRE_TIME, now) == (3, 0)
+    # 超出上限的触发不再补，下次触发从当前时间之后开始
+    assert job.next_fire == FIRE_TIME + 11 * 300
+
+
+def test_fire_due_pops_due_jobs_and_drops_stale_heap_entries(run):
+    engine = CronEngine()
+    fired = []
+
+    async def record(due):
+        fired.extend((job.script_id, runs) for job, runs in due)
+
+    engine._fire = record
+    now = time.time()
+    config = {"cron": EVERY_FIVE_MINUTES, "timezone": "UTC", "misfire_grace": 3600}
+    engine._load(make_script(1, config), now, persisted=now - 10)
+    # 重新登记后旧版本的堆条目作废，同一脚本只触发一次
+    engine._load(make_script(1, config), now, persisted=now - 10)
+    engine._load(make_script(2, config), now)
+    assert len(engine._heap) == 3
+
+    run(engine._fire_due())
+
+    assert fired == [(1, 1)]
+    assert engine._jobs[1].next_fire > now
+    assert [entry[1] for entry in engine._heap if entry[0] <= now] == []
+
+
+def test_inactive_or_invalid_scripts_are_not_scheduled():
+    engine = CronEngine()
+    now = time.time()
+    script = make_script(1, {"cron": EVERY_FIVE_MINUTES})
+    script.status = ScriptStatus.INACTIVE
+    engine._load(script, now)
+    engine._load(make_script(2, {"cron": "bad"}), now)
+    assert engine._jobs == {}
+
+
+async def _fire_with_running_execution(overlap, runs, monkeypatch):
+    submitted = []
+
+    async def submit_executions(self, executions):
+        submitted.extend(executions)
+
+    monkeypatch.setattr(ScriptService, "submit_executions", submit_executions)
+
+    async with SessionLocal() as db:
+        script = Script(name="cron", content="print('ok')", status=ScriptStatus.ACTIVE)
+        db.add(script)
+        await db.flush()
+        running = ScriptExecution(
+            script_id=script.id,
+            execution_id=str(uuid.uuid4()),
+            status=ExecutionStatus.RUNNING,
+            trigger_source="cron",
+        )
+        db.add(running)
+        await db.commit()
+        script_id, running_id = script.id, running.execution_id
+
+    await CronEngine()._fire([(make_job(overlap=overlap, script_id=script_id), runs)])
+
+    async with SessionLocal() as db:
+        statuses = dict((await db.execute(
+            select(ScriptExecution.execution_id, ScriptExecution.status)
+        )).all())
+    return statuses.pop(running_id), list(statuses.values()), submitted
+
+
+def test_overlap_skip_does_not_fire_while_previous_run_is_active(database, run, monkeypatch):
+    previous, created, submitted = run(_fire_with_running_execution("skip", 1, monkeypatch))
+    assert previous == ExecutionStatus.RUNNING
+    assert created == []
+    assert submitted == []
+
+
+def test_overlap_queue_fires_every_due_run(database, run, monkeypatch):
+    previous, created, submitted = run(_fire_with_running_execution("queue", 2, monkeypatch))
+    assert previous == ExecutionStatus.RUNNING
+    assert created == [ExecutionStatus.PENDING, ExecutionStatus.PENDING]
+    assert len(submitted) == 2
+
+
+def test_overlap_replace_cancels_previous_run_and_fires_once(database, run, monkeypatch):
+    previous, created, submitted = run(_fire_with_running_execution("replace", 3, monkeypatch))
+    assert previous == ExecutionStatus.CANCELLED
+    # 非 queue 策略下同一轮的多次补触发合并为一次
+    assert created == [ExecutionStatus.PENDING]
+    assert len(submitted) == 1
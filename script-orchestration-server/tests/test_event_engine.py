@@ -0,0 +1,185 @@
+"""事件触发引擎：防抖合并、批次上限和事件确认"""
+
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ScriptStatus
+from app.services import event_engine as event_engine_module
+from app.services.event_engine import EventEngine, _EventTrigger, parse_event_config
+from app.services.script_service import ScriptService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(event_engine_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def engine():
+    engine = EventEngine()
+    engine.fired = []
+
+    async def record(ready):
+        engine.fired.extend(ready)
+        for batch in ready:
+            engine._release(batch)
+
+    engine._fire = record
+    return engine
+
+
+def register(engine, script_id, **config):
+    engine._register(_EventTrigger(script_id, parse_event_config(config), 0))
+
+
+def message(sequence, event_type, **data):
+    fields = {b"type": event_type.encode(), b"data": json.dumps(data).encode()}
+    return f"1700000000000-{sequence}", fields
+
+
+def test_parse_event_config_rejects_invalid_values():
+    with pytest.raises(ValueError):
+        parse_event_config({})
+    with pytest.raises(ValueError):
+        parse_event_config({"event_types": ["a"], "filter": ["x"]})
+    with pytest.raises(ValueError):
+        parse_event_config({"event_types": ["a"], "max_batch": 0})
+    with pytest.raises(ValueError):
+        parse_event_config({"event_types": ["a"], "debounce": "soon"})
+
+
+def test_events_within_debounce_are_coalesced(engine, clock, run):
+    register(engine, 1, event_types=["camera.offline"], debounce=5, max_wait=60)
+    for sequence in range(3):
+        engine._dispatch([message(sequence, "camera.offline", camera_id="cam-01")], clock.monotonic())
+        clock.now += 1
+
+    # 最后一个事件在 t+2 到达，静默5秒后才到期
+    clock.now = 1006.9
+    run(engine._fire_due())
+    assert engine.fired == []
+
+    clock.now = 1007.0
+    run(engine._fire_due())
+    assert len(engine.fired) == 1
+    assert [event["id"] for event in engine.fired[0].events] == [
+        "1700000000000-0", "1700000000000-1", "1700000000000-2",
+    ]
+    assert engine._batches == {}
+
+
+def test_max_wait_bounds_debounce(engine, clock, run):
+    register(engine, 1, event_types=["object.detected"], debounce=5, max_wait=6)
+    for sequence in range(3):
+        engine._dispatch([message(sequence, "object.detected")], clock.monotonic())
+        clock.now += 2
+
+    # 持续有事件时防抖不会结束，批次在第一个事件后 max_wait 秒到期
+    clock.now = 1006.0
+    run(engine._fire_due())
+    assert len(engine.fired) == 1
+    assert len(engine.fired[0].events) == 3
+
+
+def test_full_batch_is_ready_immediately(engine, clock):
+    register(engine, 1, event_types=["object.detected"], max_batch=2)
+    engine._dispatch([message(sequence, "object.detected") for sequence in range(3)], clock.monotonic())
+
+    assert [len(batch.events) for batch in engine._ready] == [2]
+    # 后续事件进入新的批次
+    assert len(engine._batches[1].events) == 1
+    assert engine._next_timeout() == 0.0
+
+
+def test_matching_uses_types_patterns_and_filters(engine, clock):
+    register(engine, 1, event_types=["camera.offline"], filter={"camera_id": ["cam-01", "cam-02"]})
+    register(engine, 2, event_types=["object.*"], filter={"object.label": "person"})
+
+    engine._dispatch([
+        message(0, "camera.offline", camera_id="cam-02"),
+        message(1, "camera.offline", camera_id="cam-09"),
+        message(2, "object.detected", object={"label": "person"}),
+        message(3, "object.detected", object={"label": "car"}),
+        message(4, "door.opened"),
+    ], clock.monotonic())
+
+    assert [event["id"] for event in engine._batches[1].events] == ["1700000000000-0"]
+    assert [event["id"] for event in engine._batches[2].events] == ["1700000000000-2"]
+    # 未匹配的事件立即确认
+    assert engine._to_ack == ["1700000000000-1", "1700000000000-3", "1700000000000-4"]
+
+
+def test_event_is_acked_after_every_batch_containing_it_fired(engine, clock, run):
+    register(engine, 1, event_types=["camera.offline"], debounce=1)
+    register(engine, 2, event_types=["camera.*"], debounce=5)
+    engine._dispatch([message(0, "camera.offline")], clock.monotonic())
+    assert engine._refs == {"1700000000000-0": 2}
+
+    clock.now += 1
+    run(engine._fire_due())
+    assert [batch.trigger.script_id for batch in engine.fired] == [1]
+    assert engine._to_ack == []
+
+    clock.now += 4
+    run(engine._fire_due())
+    assert [batch.trigger.script_id for batch in engine.fired] == [1, 2]
+    assert engine._to_ack == ["1700000000000-0"]
+    assert engine._refs == {}
+
+
+def test_invalid_events_are_acked():
+    engine = EventEngine()
+    engine._dispatch([
+        ("1700000000000-0", {b"data": b"{}"}),
+        ("1700000000000-1", {b"type": b"a", b"data": b"not json"}),
+    ], 0.0)
+    assert engine._to_ack == ["1700000000000-0", "1700000000000-1"]
+
+
+def test_fire_creates_one_execution_per_batch(database, clock, run, monkeypatch):
+    submitted = []
+
+    async def submit_executions(self, executions):
+        submitted.extend(executions)
+
+    monkeypatch.setattr(ScriptService, "submit_executions", submit_executions)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            script = Script(name="events", content="print('ok')", status=ScriptStatus.ACTIVE)
+            db.add(script)
+            await db.commit()
+            script_id = script.id
+
+        engine = EventEngine()
+        register(engine, script_id, event_types=["camera.offline"], debounce=1, input_parameters={"site": "A"})
+        engine._dispatch([message(sequence, "camera.offline") for sequence in range(2)], clock.monotonic())
+        clock.now += 1
+        await engine._fire_due()
+
+        async with SessionLocal() as db:
+            executions = (await db.scalars(select(ScriptExecution))).all()
+        return engine, executions
+
+    engine, executions = run(scenario())
+    assert len(executions) == 1
+    parameters = executions[0].input_parameters
+    assert parameters["site"] == "A"
+    assert parameters["event_count"] == 2
+    assert [event["type"] for event in parameters["events"]] == ["camera.offline", "camera.offline"]
+    assert executions[0].trigger_source == "event"
+    assert len(submitted) == 1
+    assert engine._to_ack == ["1700000000000-0", "1700000000000-1"]
@@ -0,0 +1,107 @@
+"""执行准入队列：优先级顺序、预留位置和移除"""
+
+import asyncio
+
+import pytest
+
+from app.services.execution_queue import ExecutionQueue, QueueFullError
+
+
+def recorder(order, execution_id, gate=None):
+    async def runner():
+        if gate is not None:
+            await gate.wait()
+        order.append(execution_id)
+    return runner
+
+
+async def drain(queue):
+    for _ in range(1000):
+        if not queue.running and not queue.depth:
+            return
+        await asyncio.sleep(0)
+    raise AssertionError("队列中的执行未运行完成")
+
+
+def test_higher_priority_runs_first_and_equal_priority_is_fifo(run):
+    async def scenario():
+        queue = ExecutionQueue(max_concurrency=1, max_depth=10)
+        order = []
+        gate = asyncio.Event()
+        queue.submit(1, 0, recorder(order, 1, gate))
+        for execution_id, priority in [(2, 0), (3, 10), (4, 5), (5, 10)]:
+            queue.submit(execution_id, priority, recorder(order, execution_id))
+        assert queue.running == 1
+        assert queue.depth == 4
+        gate.set()
+        await drain(queue)
+        return order
+
+    assert run(scenario()) == [1, 3, 5, 4, 2]
+
+
+def test_reserve_counts_against_depth_until_submitted(run):
+    async def scenario():
+        queue = ExecutionQueue(max_concurrency=1, max_depth=2)
+        gate = asyncio.Event()
+        queue.submit(1, 0, recorder([], 1, gate))
+
+        queue.reserve()
+        queue.reserve()
+        assert queue.depth == 2
+        assert queue.capacity == 0
+        with pytest.raises(QueueFullError) as error:
+            queue.reserve()
+        assert error.value.retry_after >= 1
+        with pytest.raises(QueueFullError):
+            queue.submit(2, 0, recorder([], 2))
+        assert queue.total_rejected == 2
+
+        # 使用预留位置提交不会再次检查容量，也不会重复计数
+        queue.submit(3, 0, recorder([], 3), reserved=True)
+        assert queue.depth == 2
+        queue.release_reservation()
+        assert queue.depth == 1
+        assert queue.capacity == 1
+
+        gate.set()
+        await drain(queue)
+        return queue.total_completed
+
+    assert run(scenario()) == 2
+
+
+def test_release_reservation_never_goes_negative():
+    queue = ExecutionQueue(max_concurrency=1, max_depth=1)
+    queue.release_reservation()
+    assert queue.depth == 0
+    assert queue.capacity == 1
+
+
+def test_removed_execution_is_skipped_and_frees_its_slot(run):
+    async def scenario():
+        queue = ExecutionQueue(max_concurrency=1, max_depth=2)
+        order = []
+        gate = asyncio.Event()
+        queue.submit(1, 0, recorder(order, 1, gate))
+        queue.submit(2, 0, recorder(order, 2))
+        queue.submit(3, 0, recorder(order, 3))
+        assert queue.capacity == 0
+
+        assert queue.remove(2) is True
+        assert queue.depth == 1
+        assert queue.capacity == 1
+        # 重复移除、运行中和不存在的执行都不能移除
+        assert queue.remove(2) is False
+        assert queue.remove(1) is False
+        assert queue.remove(99) is False
+
+        gate.set()
+        await drain(queue)
+        return order, queue.stats()
+
+    order, stats = run(scenario())
+    assert order == [1, 3]
+    assert stats["depth"] == 0
+    assert stats["total_submitted"] == 3
+    assert stats["total_completed"] == 2
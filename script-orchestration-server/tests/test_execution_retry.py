@@ -0,0 +1,137 @@
+"""失败重试：指数退避、重试次数和重试预算"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ExecutionStatus
+from app.services.execution_retry import compute_retry_delay, create_retry, get_retry_budget
+
+
+@pytest.mark.parametrize("attempt, expected", [(1, 10), (2, 20), (3, 40), (4, 80)])
+def test_retry_delay_doubles_per_attempt(monkeypatch, attempt, expected):
+    monkeypatch.setattr(settings, "RETRY_JITTER", 0.0)
+    assert compute_retry_delay(10, attempt) == expected
+
+
+def test_retry_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_JITTER", 0.0)
+    monkeypatch.setattr(settings, "RETRY_MAX_DELAY", 100)
+    assert compute_retry_delay(10, 10) == 100
+
+
+def test_retry_delay_jitter_stays_within_bounds(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_JITTER", 0.2)
+    delays = [compute_retry_delay(100, 1) for _ in range(200)]
+    assert all(80 <= delay <= 120 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_budget_defaults_to_setting(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BUDGET", 7)
+    assert get_retry_budget(Script(config={})) == 7
+    assert get_retry_budget(Script(config={"retry_budget": 2})) == 2
+
+
+async def _failed_execution(db, script, status=ExecutionStatus.FAILED):
+    execution = ScriptExecution(
+        script_id=script.id,
+        execution_id=str(uuid.uuid4()),
+        status=status,
+        priority=3,
+        input_parameters={"x": 1},
+    )
+    db.add(execution)
+    await db.commit()
+    return execution
+
+
+async def _script(db, **values):
+    script = Script(name="retry", content="x", retry_delay=10, **values)
+    db.add(script)
+    await db.commit()
+    return script
+
+
+def test_failed_execution_gets_pending_retry(database, run, monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_JITTER", 0.0)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            script = await _script(db, max_retries=2)
+            original = await _failed_execution(db, script)
+            before = datetime.utcnow()
+            first = await create_retry(db, script, original)
+            created_status = first.status
+            first.status = ExecutionStatus.FAILED
+            await db.commit()
+            second = await create_retry(db, script, first)
+            second.status = ExecutionStatus.FAILED
+            await db.commit()
+            # 已达到 max_retries
+            third = await create_retry(db, script, second)
+            return created_status, original, first, second, third, before
+
+    created_status, original, first, second, third, before = run(scenario())
+    # 重试在到期前保持 PENDING
+    assert created_status == ExecutionStatus.PENDING
+    assert (first.attempt, second.attempt) == (1, 2)
+    # 重试链都指向最初的执行
+    assert first.retry_of == second.retry_of == original.execution_id
+    assert first.trigger_source == "retry"
+    assert first.priority == 3
+    assert first.input_parameters == {"x": 1}
+    assert timedelta(seconds=9) < first.retry_at - before <= timedelta(seconds=11)
+    assert timedelta(seconds=19) < second.retry_at - before <= timedelta(seconds=21)
+    assert third is None
+
+
+@pytest.mark.parametrize("status", [
+    ExecutionStatus.CANCELLED,
+    ExecutionStatus.OOM,
+    ExecutionStatus.CPU_LIMIT,
+    ExecutionStatus.FILE_LIMIT,
+    ExecutionStatus.SUCCESS,
+])
+def test_only_failed_executions_are_retried(database, run, status):
+    async def scenario():
+        async with SessionLocal() as db:
+            script = await _script(db, max_retries=3)
+            return await create_retry(db, script, await _failed_execution(db, script, status=status))
+
+    assert run(scenario()) is None
+
+
+def test_retry_budget_limits_retries_within_window(database, run):
+    async def scenario():
+        async with SessionLocal() as db:
+            script = await _script(db, max_retries=5, config={"retry_budget": 2})
+            retries = []
+            for _ in range(3):
+                retries.append(await create_retry(db, script, await _failed_execution(db, script)))
+            count = await db.scalar(
+                select(func.count()).select_from(ScriptExecution).where(ScriptExecution.retry_of.isnot(None))
+            )
+            return retries, count
+
+    retries, count = run(scenario())
+    assert [retry is not None for retry in retries] == [True, True, False]
+    assert count == 2
+
+
+def test_retries_outside_budget_window_are_not_counted(database, run, monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BUDGET_WINDOW", 60)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            script = await _script(db, max_retries=5, config={"retry_budget": 1})
+            old = await create_retry(db, script, await _failed_execution(db, script))
+            old.created_at = datetime.utcnow() - timedelta(seconds=120)
+            await db.commit()
+            return await create_retry(db, script, await _failed_execution(db, script))
+
+    assert run(scenario()) is not None
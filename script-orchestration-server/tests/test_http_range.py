@@ -0,0 +1,103 @@
+"""Range / Accept-Encoding 请求头解析和执行输出的范围响应"""
+
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.v1 import scripts
+from app.core.database import SessionLocal
+from app.models.script import Script, ScriptExecution, ExecutionStatus
+from app.services.execution_logs import execution_log_store
+from app.utils.http_range import RangeNotSatisfiable, accepts_gzip, parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=-200", (800, 1000)),
+    ("bytes=-5000", (0, 1000)),
+    ("bytes=900-5000", (900, 1000)),
+    ("bytes=999-999", (999, 1000)),
+    ("Bytes = 10-19", (10, 20)),
+])
+def test_single_range(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "items=0-10",
+    "bytes=0-10,20-30",
+    "bytes=10",
+    "bytes=a-b",
+    "bytes=20-10",
+    "bytes=-",
+])
+def test_missing_or_unsupported_range_serves_full_content(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-2000", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_range(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, size)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("deflate, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip;q=bad", False),
+    ("deflate, br", False),
+    (None, False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_output_endpoint_serves_ranges(database, run):
+    app = FastAPI()
+    app.include_router(scripts.router, prefix="/api/v1/scripts")
+    execution_id = str(uuid.uuid4())
+    path = execution_log_store.get_path(execution_id, "stdout")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"0123456789")
+
+    async def scenario():
+        async with SessionLocal() as db:
+            script = Script(name="range", content="x")
+            db.add(script)
+            await db.flush()
+            db.add(ScriptExecution(script_id=script.id, execution_id=execution_id, status=ExecutionStatus.SUCCESS))
+            await db.commit()
+
+        url = f"/api/v1/scripts/executions/{execution_id}/output"
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return [
+                await client.get(url, headers={"Range": "bytes=2-4"}),
+                await client.get(url, headers={"Range": "bytes=-3"}),
+                await client.get(url, headers={"Range": "bytes=10-"}),
+                await client.get(url, headers={"Accept-Encoding": "identity"}),
+            ]
+
+    partial, suffix, unsatisfiable, full = run(scenario())
+    path.unlink()
+    assert partial.status_code == 206
+    assert partial.content == b"234"
+    assert partial.headers["Content-Range"] == "bytes 2-4/10"
+    assert suffix.status_code == 206
+    assert suffix.content == b"789"
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["Content-Range"] == "bytes */10"
+    assert full.status_code == 200
+    assert full.content == b"0123456789"
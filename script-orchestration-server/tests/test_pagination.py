@@ -0,0 +1,58 @@
+"""游标分页：游标编码和按 (created_at, id) 的稳定翻页"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.database import SessionLocal
+from app.models.script import Script
+from app.utils.pagination import apply_cursor, decode_cursor, encode_cursor, next_cursor, order_by_recent
+
+
+def test_cursor_round_trip_is_url_safe():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    cursor = encode_cursor(created_at, 4242)
+    assert "=" not in cursor
+    assert all(char.isalnum() or char in "-_" for char in cursor)
+    assert decode_cursor(cursor) == (created_at, 4242)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime(2024, 1, 1), 1)[:-3], "WzEsMiwzXQ"])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_next_cursor_only_for_full_pages():
+    items = [SimpleNamespace(created_at=datetime(2024, 1, 1), id=row_id) for row_id in (3, 2)]
+    assert next_cursor(items, limit=3) is None
+    assert next_cursor([], limit=0) is None
+    assert decode_cursor(next_cursor(items, limit=2)) == (datetime(2024, 1, 1), 2)
+
+
+def test_pages_are_stable_when_created_at_ties(database, run):
+    async def scenario():
+        base = datetime(2024, 1, 1)
+        async with SessionLocal() as db:
+            # 每个时间戳有3行，翻页边界落在相同 created_at 的行之间
+            await db.execute(insert(Script), [
+                {"name": f"s{index}", "content": "x", "created_at": base + timedelta(minutes=index // 3)}
+                for index in range(10)
+            ])
+            await db.commit()
+
+            expected = list(await db.scalars(order_by_recent(select(Script.id), Script)))
+            pages, cursor = [], None
+            while True:
+                query = apply_cursor(order_by_recent(select(Script), Script), Script, cursor).limit(4)
+                page = (await db.scalars(query)).all()
+                pages.append([script.id for script in page])
+                cursor = next_cursor(page, 4)
+                if cursor is None:
+                    return expected, pages
+
+    expected, pages = run(scenario())
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert [row_id for page in pages for row_id in page] == expected
@@ -0,0 +1,144 @@
+"""工作流：连接条件求值、环检测和跳过状态向下游传播"""
+
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.script import WorkflowEdge, WorkflowNode, WorkflowRun, ExecutionStatus
+from app.services.workflow_service import (
+    NODE_SKIPPED,
+    WorkflowEngine,
+    WorkflowValidationError,
+    evaluate_condition,
+    topological_order,
+)
+
+SUCCESS = {"status": "success", "exit_code": 0, "result": {"count": 3, "items": [{"label": "person"}]}}
+FAILED = {"status": "failed", "exit_code": 1, "result": None}
+
+
+@pytest.mark.parametrize("condition, upstream, expected", [
+    ({}, SUCCESS, True),
+    (None, FAILED, False),
+    ({"status": "failed"}, FAILED, True),
+    ({"status": "failed"}, {"status": "timeout"}, True),
+    ({"status": "failed"}, SUCCESS, False),
+    ({"status": "any"}, FAILED, True),
+    ({"status": "any"}, {"status": NODE_SKIPPED}, False),
+    ({"field": "result.count", "operator": "gt", "value": 2}, SUCCESS, True),
+    ({"field": "result.count", "operator": "gt", "value": 3}, SUCCESS, False),
+    ({"field": "result.items.0.label", "value": "person"}, SUCCESS, True),
+    ({"field": "result.missing", "operator": "exists", "value": False}, SUCCESS, True),
+    ({"field": "result.missing", "operator": "ne", "value": 1}, SUCCESS, False),
+    ({"field": "result.count", "operator": "contains", "value": 1}, SUCCESS, False),
+    ({"field": "result.count", "operator": "unknown", "value": 1}, SUCCESS, False),
+])
+def test_evaluate_condition(condition, upstream, expected):
+    assert evaluate_condition(condition, upstream) is expected
+
+
+def test_topological_order_rejects_cycles_and_unknown_nodes():
+    nodes = [WorkflowNode(node_id=node_id) for node_id in ("a", "b", "c")]
+    order = topological_order(nodes, [
+        WorkflowEdge(source_node_id="a", target_node_id="b"),
+        WorkflowEdge(source_node_id="b", target_node_id="c"),
+    ])
+    assert order == ["a", "b", "c"]
+
+    with pytest.raises(WorkflowValidationError):
+        topological_order(nodes, [
+            WorkflowEdge(source_node_id="a", target_node_id="b"),
+            WorkflowEdge(source_node_id="b", target_node_id="a"),
+        ])
+    with pytest.raises(WorkflowValidationError):
+        topological_order(nodes, [WorkflowEdge(source_node_id="a", target_node_id="x")])
+
+
+def run_workflow(run, monkeypatch, nodes, edges, results):
+    """按给定的节点结果运行工作流，返回运行记录和实际运行的节点"""
+    monkeypatch.setattr(settings, "WORKFLOW_POLL_INTERVAL", 0.01)
+    started = []
+
+    async def fake_run_node(self, node):
+        started.append(node.node_id)
+        return results.get(node.node_id, {"status": ExecutionStatus.SUCCESS.value})
+
+    monkeypatch.setattr(WorkflowEngine, "_run_node", fake_run_node)
+
+    async def scenario():
+        async with SessionLocal() as db:
+            for node_id, config in nodes.items():
+                db.add(WorkflowNode(workflow_id="wf", node_id=node_id, node_type="task", name=node_id, config=config))
+            for source, target, condition in edges:
+                db.add(WorkflowEdge(workflow_id="wf", source_node_id=source, target_node_id=target, condition=condition))
+            workflow_run = WorkflowRun(run_id=str(uuid.uuid4()), workflow_id="wf", status=ExecutionStatus.PENDING)
+            db.add(workflow_run)
+            await db.commit()
+            run_pk = workflow_run.id
+
+        await WorkflowEngine(run_pk).run()
+
+        async with SessionLocal() as db:
+            return await db.get(WorkflowRun, run_pk)
+
+    return run(scenario()), started
+
+
+def test_skip_propagates_downstream_and_failure_branch_runs(database, run, monkeypatch):
+    workflow_run, started = run_workflow(
+        run, monkeypatch,
+        nodes={"start": {}, "a": {}, "b": {}, "c": {}, "handler": {}, "join": {"trigger_rule": "any"}},
+        edges=[
+            ("start", "a", {}),
+            ("a", "b", {"status": "success"}),
+            ("b", "c", {}),
+            ("a", "handler", {"status": "failed"}),
+            ("c", "join", {}),
+            ("handler", "join", {}),
+        ],
+        results={"a": FAILED},
+    )
+
+    states = {node_id: state["status"] for node_id, state in workflow_run.node_states.items()}
+    # b 的条件不满足被跳过，c 的唯一上游被跳过也随之跳过
+    assert states["b"] == states["c"] == NODE_SKIPPED
+    assert states["handler"] == states["join"] == "success"
+    assert sorted(started) == ["a", "handler", "join", "start"]
+    # a 的失败由失败分支处理，运行整体成功
+    assert workflow_run.status == ExecutionStatus.SUCCESS
+    assert workflow_run.end_time is not None
+
+
+def test_skipped_upstream_blocks_all_trigger_rule(database, run, monkeypatch):
+    workflow_run, started = run_workflow(
+        run, monkeypatch,
+        nodes={"a": {}, "b": {}, "c": {}, "join": {}},
+        edges=[
+            ("a", "b", {"field": "result.ok", "value": True}),
+            ("a", "c", {}),
+            ("b", "join", {}),
+            ("c", "join", {}),
+        ],
+        results={"a": {"status": "success", "result": {"ok": False}}},
+    )
+
+    states = {node_id: state["status"] for node_id, state in workflow_run.node_states.items()}
+    assert states == {"a": "success", "b": NODE_SKIPPED, "c": "success", "join": NODE_SKIPPED}
+    assert sorted(started) == ["a", "c"]
+    assert workflow_run.status == ExecutionStatus.SUCCESS
+
+
+def test_unhandled_failure_fails_run(database, run, monkeypatch):
+    workflow_run, started = run_workflow(
+        run, monkeypatch,
+        nodes={"a": {}, "b": {}},
+        edges=[("a", "b", {})],
+        results={"a": FAILED},
+    )
+
+    assert started == ["a"]
+    assert workflow_run.node_states["b"]["status"] == NODE_SKIPPED
+    assert workflow_run.status == ExecutionStatus.FAILED
+    assert "a" in workflow_run.error_message
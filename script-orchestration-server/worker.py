@@ -0,0 +1,101 @@
+"""
+脚本执行工作进程
+
+在分布式执行模式(EXECUTION_MODE=distributed)下从Redis Stream拉取执行任务并运行。
+可以在多台主机上启动任意数量的工作进程:
+
+    python worker.py
+"""
+
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.core.database import engine, SessionLocal
+from app.core.redis import close_redis
+from app.services.script_service import ScriptService
+from app.services.distributed_queue import distributed_queue, ExecutionWorker
+from app.services.forkserver import get_forkserver, shutdown_forkservers
+from app.services.worker_pool import worker_pool_manager
+from app.services.log_stream import log_broker
+from app.services.execution_control import execution_control
+from app.services.execution_retry import retry_scheduler
+from app.services.metrics import loop_monitor, start_worker_metrics_server
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def run_execution(execution_id: int):
+    async with SessionLocal() as db:
+        await ScriptService(db).run_execution(execution_id)
+
+
+async def recover_execution(execution_id: int):
+    async with SessionLocal() as db:
+        await ScriptService(db).recover_execution(execution_id)
+
+
+async def abandon_execution(execution_id: int):
+    async with SessionLocal() as db:
+        await ScriptService(db).abandon_execution(
+            execution_id,
+            f"执行在 {settings.WORKER_MAX_DELIVERIES} 次投递后仍未完成（工作进程异常退出）"
+        )
+
+
+async def main():
+    """启动工作进程，收到SIGTERM/SIGINT后等待处理中的执行完成再退出"""
+    worker = ExecutionWorker(
+        distributed_queue,
+        runner=run_execution,
+        recover=recover_execution,
+        abandon=abandon_execution,
+        max_concurrency=settings.MAX_CONCURRENT_SCRIPTS
+    )
+
+    # 预热fork-server
+    if settings.SCRIPT_EXECUTION_BACKEND == "forkserver":
+        await get_forkserver("python").start()
+
+    start_worker_metrics_server()
+    loop_monitor.start()
+    await execution_control.start()
+    retry_scheduler.start()
+
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    consumer = asyncio.create_task(worker.run())
+    stopper = asyncio.create_task(stop_event.wait())
+    try:
+        await asyncio.wait({consumer, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        if consumer.done():
+            # 消费循环异常退出
+            consumer.result()
+        logger.info("工作进程正在停止，等待处理中的执行完成")
+        await worker.stop(settings.WORKER_SHUTDOWN_TIMEOUT)
+    finally:
+        consumer.cancel()
+        stopper.cancel()
+        await loop_monitor.stop()
+        await retry_scheduler.stop()
+        await shutdown_forkservers()
+        await worker_pool_manager.shutdown()
+        await log_broker.shutdown()
+        await execution_control.shutdown()
+        await close_redis()
+        await engine.dispose()
+        logger.info("工作进程已退出")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())